@@ -158,6 +158,18 @@ export function ChatInterface() {
     console.log('NEXT_PUBLIC_API_URL:', process.env.NEXT_PUBLIC_API_URL);
   }, []);
 
+  // The trip JSON of the API is an object with an `itinerary` list, or a placeholder string like "Empty JSON".
+  function asEnhancedItinerary(value: any) {
+    if (typeof value === 'string') {
+      try {
+        value = JSON.parse(value);
+      } catch {
+        return null;
+      }
+    }
+    return value && typeof value === 'object' && Array.isArray(value.itinerary) ? value : null;
+  }
+
   // Function to extract JSON from bot's response
   function extractJSON(text: string) {
     let jsonStart = text.indexOf('{');
@@ -248,7 +260,16 @@ export function ChatInterface() {
         if (extractionResult) {
           const { json, textWithoutJson } = extractionResult;
           setItineraryData(json);
-          setEnhancedItineraryData(data.extract_trip_json)
+          if (data.extract_trip_json_pending) {
+            // The trip JSON is extracted in the background and the one in this response is stale, fetch it once it is ready
+            setEnhancedItineraryData(null);
+            fetch(`${process.env.NEXT_PUBLIC_API_URL}/chat/${session_id}/trip-json`, { headers: headers })
+              .then(tripResponse => tripResponse.ok ? tripResponse.json() : null)
+              .then(tripData => tripData && !tripData.pending && setEnhancedItineraryData(asEnhancedItinerary(tripData.extract_trip_json)))
+              .catch(error => console.error("Failed to fetch the trip JSON:", error));
+          } else {
+            setEnhancedItineraryData(asEnhancedItinerary(data.extract_trip_json));
+          }
           botMessageText = textWithoutJson;
           setActiveDay(0); // Reset active day when new itinerary is received
 
@@ -404,30 +425,30 @@ export function ChatInterface() {
   <div className="my-4 border-l-2 border-gray-300 pl-6">
     <h3 className="text-lg font-semibold mb-2">Day {itineraryData.itinerary[activeDay].day_number}</h3>
     <div className="flex flex-col space-y-4">
-      {enhancedItineraryData.itinerary[activeDay].morning_activities && (
+      {enhancedItineraryData?.itinerary?.[activeDay]?.morning_activities && (
         <div className="relative ml-4">
           <div className="absolute -left-6 top-1 w-3 h-3 rounded-full bg-blue-500"></div>
           <div className="text-sm">
             <strong className="block">Morning Activities:</strong>
-            <p>{enhancedItineraryData.itinerary[activeDay].morning_activities}</p>
+            <p>{enhancedItineraryData?.itinerary?.[activeDay]?.morning_activities}</p>
           </div>
         </div>
       )}
-      {enhancedItineraryData.itinerary[activeDay].afternoon_details && (
+      {enhancedItineraryData?.itinerary?.[activeDay]?.afternoon_details && (
         <div className="relative ml-4">
           <div className="absolute -left-6 top-1 w-3 h-3 rounded-full bg-green-500"></div>
           <div className="text-sm">
             <strong className="block">Afternoon Details:</strong>
-            <p>{enhancedItineraryData.itinerary[activeDay].afternoon_details}</p>
+            <p>{enhancedItineraryData?.itinerary?.[activeDay]?.afternoon_details}</p>
           </div>
         </div>
       )}
-      {enhancedItineraryData.itinerary[activeDay].evening_plans && (
+      {enhancedItineraryData?.itinerary?.[activeDay]?.evening_plans && (
         <div className="relative ml-4">
           <div className="absolute -left-6 top-1 w-3 h-3 rounded-full bg-yellow-500"></div>
           <div className="text-sm">
             <strong className="block">Evening Plans:</strong>
-            <p>{enhancedItineraryData.itinerary[activeDay].evening_plans}</p>
+            <p>{enhancedItineraryData?.itinerary?.[activeDay]?.evening_plans}</p>
           </div>
         </div>
       )}
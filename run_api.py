@@ -1,15 +1,26 @@
 import json
 import os
+from contextlib import asynccontextmanager
+from functools import partial
 from typing import List, Optional
 from io import BytesIO
 import uvicorn
 from dotenv import load_dotenv
 from fastapi import FastAPI, Query, Header, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 
-from salesgpt.salesgptapi import SalesGPTAPI
+from salesgpt.clients import aclose_clients
+from salesgpt.logger import get_timings, is_profiling_enabled, set_profiling_enabled
+from salesgpt.metrics import PROMETHEUS_ENABLED, prometheus_client
+from salesgpt.profiler import profile_request
+from salesgpt.salesgptapi import SalesGPTAPI, clear_agent_templates, get_agent_template
+from salesgpt.sessions import (
+    DEFAULT_SESSION_OVERHEAD_BYTES,
+    InMemorySessionStore,
+    estimate_session_size,
+)
 from fastapi import FastAPI, HTTPException, Query
 from fastapi.responses import JSONResponse
 import requests
@@ -25,8 +36,47 @@ CORS_ORIGINS = ["http://localhost:3000",
                 "https://sales-gpt-frontend.vercel.app"]
 CORS_METHODS = ["GET", "POST"]
 
+# Agent metadata served by /botname, loaded once at startup and on /reload
+bot_metadata = {}
+
+
+def get_agent_settings():
+    """
+    Returns the agent settings for the API from the environment variables.
+    """
+    return {
+        "config_path": os.getenv("CONFIG_PATH", "examples/example_agent_setup.json"),
+        "verbose": True,
+        "product_catalog": os.getenv(
+            "PRODUCT_CATALOG", "examples/sample_product_catalog.txt"
+        ),
+        "model_name": os.getenv("GPT_MODEL", "gpt-3.5-turbo-0613"),
+        "use_tools": os.getenv("USE_TOOLS_IN_API", "True").lower()
+        in ["true", "1", "t"],
+    }
+
+
+def load_bot_metadata():
+    """
+    Builds the agent template for the current settings and caches the metadata served by /botname.
+    """
+    template = get_agent_template(**get_agent_settings())
+    bot_metadata.clear()
+    bot_metadata.update(
+        {"name": template.salesperson_name, "model": template.model_name}
+    )
+    return bot_metadata
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    load_bot_metadata()
+    yield
+    await aclose_clients()
+
+
 # Initialize FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Configure CORS middleware
 app.add_middleware(
@@ -58,29 +108,47 @@ class MessageList(BaseModel):
     human_say: str
 
 
-sessions = {}
+sessions = InMemorySessionStore(
+    max_sessions=int(os.getenv("SESSION_MAX_COUNT", "1000")),
+    ttl_seconds=float(os.getenv("SESSION_TTL_SECONDS", "3600")),
+    max_bytes=int(os.getenv("SESSION_MAX_BYTES", "0")),
+    sizeof=partial(
+        estimate_session_size,
+        overhead_bytes=int(os.getenv("SESSION_OVERHEAD_BYTES", str(DEFAULT_SESSION_OVERHEAD_BYTES))),
+    ),
+)
 
 
 @app.get("/botname", response_model=None)
 async def get_bot_name(authorization: Optional[str] = Header(None)):
-    load_dotenv()
     if os.getenv("ENVIRONMENT") == "production":
         get_auth_key(authorization)
-        
-    sales_api = SalesGPTAPI(
-        config_path=os.getenv("CONFIG_PATH", "examples/example_agent_setup.json"),
-        product_catalog=os.getenv(
-            "PRODUCT_CATALOG", "examples/sample_product_catalog.txt"
-        ),
-        verbose=True,
-        model_name=os.getenv("GPT_MODEL", "gpt-3.5-turbo-0613"),
-    )
-    name = sales_api.sales_agent.salesperson_name
-    return {"name": name, "model": sales_api.sales_agent.model_name}
+    return {"name": bot_metadata.get("name"), "model": bot_metadata.get("model")}
+
+
+@app.post("/reload")
+async def reload_agent_config(authorization: Optional[str] = Header(None)):
+    """
+    Reloads the environment and the agent config, e.g. after CONFIG_PATH or the config file changed.
+
+    New sessions are spawned from the rebuilt agent template, existing sessions keep their agent.
+    """
+    if os.getenv("ENVIRONMENT") == "production":
+        get_auth_key(authorization)
+    load_dotenv(override=True)
+    clear_agent_templates()
+    return load_bot_metadata()
 
 
 @app.post("/chat")
-async def chat_with_sales_agent(req: MessageList, stream: bool = Query(False), authorization: Optional[str] = Header(None)):
+async def chat_with_sales_agent(
+    req: MessageList,
+    stream: bool = Query(False),
+    metrics: bool = Query(False),
+    profile: bool = Query(False),
+    profile_format: str = Query("json", pattern="^(json|collapsed)$"),
+    authorization: Optional[str] = Header(None),
+):
     """
     Handles chat interactions with the sales agent.
 
@@ -88,53 +156,129 @@ async def chat_with_sales_agent(req: MessageList, stream: bool = Query(False), a
 
     Args:
         req (MessageList): A request object containing the session ID and the message from the human user.
-        stream (bool, optional): A flag to indicate if the response should be streamed. Currently, streaming is not implemented.
+        stream (bool, optional): A flag to indicate if the response should be streamed.
+        metrics (bool, optional): Add the turn's token usage and latencies to the response under "metrics".
+        profile (bool, optional): Record a span tree of the turn. Always requires the AUTH_KEY bearer token.
+        profile_format (str, optional): "json" adds the tree to the response under "profile", "collapsed" returns
+            it as a flame graph file in the collapsed stack format instead of the reply.
 
     Returns:
-        If streaming is requested, it returns a StreamingResponse object (not yet implemented). Otherwise, it returns the sales agent's response to the user's message.
-
-    Note:
-        Streaming functionality is planned but not yet available. The current implementation only supports synchronous responses.
+        If streaming is requested, an NDJSON StreamingResponse with one `{"token": ...}` line per text delta and a
+        final line with `"done": true` and the complete reply. Otherwise, the sales agent's response to the user's message.
     """
     sales_api = None
-    if os.getenv("ENVIRONMENT") == "production":
+    if os.getenv("ENVIRONMENT") == "production" or profile:
         get_auth_key(authorization)
     # print(f"Received request: {req}")
-    if req.session_id in sessions:
+    sales_api = sessions.get(req.session_id)
+    if sales_api is not None:
         print("Session is found!")
-        sales_api = sessions[req.session_id]
         print(f"Are tools activated: {sales_api.sales_agent.use_tools}")
         print(f"Session id: {req.session_id}")
     else:
         print("Creating new session")
-        sales_api = SalesGPTAPI(
-            config_path=os.getenv("CONFIG_PATH", "examples/example_agent_setup.json"),
-            verbose=True,
-            product_catalog=os.getenv(
-                "PRODUCT_CATALOG", "examples/sample_product_catalog.txt"
-            ),
-            model_name=os.getenv("GPT_MODEL", "gpt-3.5-turbo-0613"),
-            use_tools=os.getenv("USE_TOOLS_IN_API", "True").lower()
-            in ["true", "1", "t"],
-        )
+        sales_api = SalesGPTAPI(**get_agent_settings())
         print(f"TOOLS?: {sales_api.sales_agent.use_tools}")
         sessions[req.session_id] = sales_api
 
-    # TODO stream not working
     if stream:
 
         async def stream_response():
-            stream_gen = sales_api.do_stream(req.conversation_history, req.human_say)
-            async for message in stream_gen:
-                data = {"token": message}
-                yield json.dumps(data).encode("utf-8") + b"\n"
-
-        return StreamingResponse(stream_response())
+            async for event in sales_api.do_stream(req.human_say):
+                yield json.dumps(event).encode("utf-8") + b"\n"
+            # Re-store the session so its memory estimate reflects the streamed turn.
+            sessions.set(req.session_id, sales_api)
+
+        return StreamingResponse(stream_response(), media_type="application/x-ndjson")
+    elif profile:
+        with profile_request("chat") as profiler:
+            response = await sales_api.do(req.human_say, include_metrics=metrics)
+            # Profile the whole turn, including the trip JSON extraction that runs after the reply.
+            await sales_api.get_trip_json(wait=True, timeout=30.0)
+        sessions.set(req.session_id, sales_api)
+        if profile_format == "collapsed":
+            return Response(
+                content=profiler.to_collapsed(),
+                media_type="text/plain",
+                headers={"Content-Disposition": f'attachment; filename="chat-{req.session_id}.folded"'},
+            )
+        if isinstance(response, dict):
+            response["profile"] = profiler.to_dict()
+        return response
     else:
-        response = await sales_api.do(req.human_say)
+        response = await sales_api.do(req.human_say, include_metrics=metrics)
+        # Re-store the session so its memory estimate reflects the new turn.
+        sessions.set(req.session_id, sales_api)
         return response
 
 
+@app.get("/chat/{session_id}/trip-json")
+async def get_trip_json(
+    session_id: str,
+    wait: bool = Query(True),
+    timeout: float = Query(30.0),
+    authorization: Optional[str] = Header(None),
+):
+    """
+    Returns the trip JSON extracted for a session.
+
+    The extraction runs in the background after each /chat reply, so clients call this endpoint when the reply
+    contained an itinerary. With `wait`, the request waits up to `timeout` seconds for a running extraction.
+    """
+    if os.getenv("ENVIRONMENT") == "production":
+        get_auth_key(authorization)
+    sales_api = sessions.get(session_id)
+    if sales_api is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return await sales_api.get_trip_json(wait=wait, timeout=timeout)
+
+
+@app.get("/metrics")
+async def get_prometheus_metrics(authorization: Optional[str] = Header(None)):
+    """
+    Exports the token, latency and cache metrics in the Prometheus text format.
+    """
+    if os.getenv("ENVIRONMENT") == "production":
+        get_auth_key(authorization)
+    if not PROMETHEUS_ENABLED:
+        raise HTTPException(
+            status_code=501,
+            detail="Prometheus export is disabled, install prometheus_client and set PROMETHEUS_METRICS_ENABLED",
+        )
+    return Response(
+        content=prometheus_client.generate_latest(),
+        media_type=prometheus_client.CONTENT_TYPE_LATEST,
+    )
+
+
+@app.get("/profiling")
+async def get_profiling(authorization: Optional[str] = Header(None)):
+    """
+    Returns the recent timings of the profiled agent functions and whether profiling is on.
+    """
+    if os.getenv("ENVIRONMENT") == "production":
+        get_auth_key(authorization)
+    return {"enabled": is_profiling_enabled(), "timings": get_timings()}
+
+
+@app.post("/profiling")
+async def set_profiling(enabled: bool = Query(...), authorization: Optional[str] = Header(None)):
+    """
+    Turns the profiling of the agent functions on or off without a restart.
+    """
+    if os.getenv("ENVIRONMENT") == "production":
+        get_auth_key(authorization)
+    set_profiling_enabled(enabled)
+    return {"enabled": is_profiling_enabled()}
+
+
+@app.get("/sessions/metrics")
+async def get_session_metrics(authorization: Optional[str] = Header(None)):
+    if os.getenv("ENVIRONMENT") == "production":
+        get_auth_key(authorization)
+    return sessions.metrics()
+
+
 @app.get("/api/place-photos")
 async def place_photos(location: str = Query(..., description="Location name to search for photos")):
     if not location:
@@ -1,5 +1,6 @@
 from copy import deepcopy
-from typing import Any, Callable, Dict, List, Union
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, Union
+import hashlib
 import os
 import glob
 from langchain.agents import (
@@ -16,6 +17,7 @@ from langchain_core.agents import (
     _convert_agent_observation_to_messages,
 )
 from langchain_core.language_models.llms import create_base_retry_decorator
+from langchain_core.messages import convert_to_messages
 from litellm import acompletion
 from pydantic import Field
 
@@ -23,13 +25,25 @@ from salesgpt.chains import SalesConversationChain,JsonExtractorChain
 
 # from salesgpt.chains import  StageAnalyzerChain
 from salesgpt.custom_invoke import CustomAgentExecutor
+from salesgpt.history import (
+    ConversationHistory,
+    extractive_summary,
+    history_window_start,
+)
+from salesgpt.itinerary import (
+    find_itinerary_block,
+    normalize_block,
+    parse_itinerary,
+    repair_json,
+)
 from salesgpt.logger import time_logger
+from salesgpt.models import BedrockCustomModel
 from salesgpt.parsers import SalesConvoOutputParser
-from salesgpt.prompts import SALES_AGENT_TOOLS_PROMPT
+from salesgpt.prompts import HISTORY_SUMMARY_PROMPT, SALES_AGENT_TOOLS_PROMPT
 from salesgpt.stages import CONVERSATION_STAGES
-from salesgpt.templates import CustomPromptTemplateForTools
+from salesgpt.templates import CustomPromptTemplateForTools, split_static_prompt
 from salesgpt.tools import get_tools, setup_knowledge_base
-import re
+
 
 def _create_retry_decorator(llm: Any) -> Callable[[Any], Any]:
     """
@@ -57,6 +71,51 @@ def _create_retry_decorator(llm: Any) -> Callable[[Any], Any]:
     return create_base_retry_decorator(error_types=errors, max_retries=llm.max_retries)
 
 
+def _as_stream_chunk(content: str) -> Dict[str, Any]:
+    """
+    Wraps a streamed text delta in the OpenAI/LiteLLM chunk shape that the streaming consumers read.
+    """
+    return {"choices": [{"delta": {"content": content}}]}
+
+
+STREAM_END_TOKENS = ("<END_OF_TURN>", "<END_OF_CALL>")
+
+
+def _stream_chunk_text(chunk: Any) -> str:
+    """
+    Returns the text delta of a streamed chunk, either a LiteLLM response object or a plain chunk dict.
+    """
+    choice = chunk["choices"][0] if isinstance(chunk, dict) else chunk.choices[0]
+    delta = choice["delta"] if isinstance(choice, dict) else choice.delta
+    content = delta.get("content") if isinstance(delta, dict) else getattr(delta, "content", None)
+    return content or ""
+
+
+def _find_end_token(text: str) -> Tuple[int, Optional[str]]:
+    """
+    Returns the position and value of the first end token in `text`, or (-1, None).
+    """
+    found = (-1, None)
+    for token in STREAM_END_TOKENS:
+        index = text.find(token)
+        if index != -1 and (found[0] == -1 or index < found[0]):
+            found = (index, token)
+    return found
+
+
+def _partial_end_token_length(text: str) -> int:
+    """
+    Returns the length of the longest suffix of `text` that could be the start of an end token.
+    """
+    longest = 0
+    for token in STREAM_END_TOKENS:
+        for size in range(min(len(token) - 1, len(text)), longest, -1):
+            if text.endswith(token[:size]):
+                longest = size
+                break
+    return longest
+
+
 class SalesGPT(Chain):
     """Controller model for the Sales Agent."""
 
@@ -66,6 +125,16 @@ class SalesGPT(Chain):
     # stage_analyzer_chain: StageAnalyzerChain = Field(...)
     json_extractor_chain: JsonExtractorChain
     extracted_trip_json_data: str = "Empty JSON"
+    extracted_itinerary_block: str = ""
+    enrich_trip_json: bool = False
+    # History policy, see `format_conversation_history`. A limit of 0 disables it.
+    history_keep_last: int = 0
+    history_max_tokens: int = 0
+    history_summary_mode: str = "extractive"
+    history_summary: str = ""
+    history_summary_upto: int = 0
+    # Hash of the turns the summary covers, so a replaced history does not reuse it.
+    history_summary_digest: str = ""
     sales_agent_executor: Union[CustomAgentExecutor, None] = Field(...)
     knowledge_base: Union[RetrievalQA, None] = Field(...)
     sales_conversation_utterance_chain: SalesConversationChain = Field(...)
@@ -134,7 +203,35 @@ class SalesGPT(Chain):
             None
         """
         self.current_conversation_stage = self.retrieve_conversation_stage("1")
-        self.conversation_history = []
+        self.conversation_history = ConversationHistory()
+
+    def spawn(self) -> "SalesGPT":
+        """
+        Creates a new conversation that shares this agent's chains, tools and agent executor.
+
+        Building a SalesGPT instance (LLM client, chains, tools, agent executor) is expensive, while the only state that
+        differs between users is the conversation itself. This method returns a shallow copy of the agent whose
+        per-conversation state (conversation history, conversation stage and extracted trip JSON) is reset, so one
+        agent built once can serve as a template for every session.
+
+        Returns:
+            SalesGPT: A seeded agent with its own conversation state.
+        """
+        # `copy()` would recursively copy the nested chains, `construct` keeps references to them.
+        values = dict(self.__dict__)
+        values.update(
+            {
+                "conversation_history": ConversationHistory(),
+                "conversation_stage_id": "1",
+                "current_conversation_stage": self.retrieve_conversation_stage("1"),
+                "extracted_trip_json_data": "Empty JSON",
+                "extracted_itinerary_block": "",
+                "history_summary": "",
+                "history_summary_upto": 0,
+                "history_summary_digest": "",
+            }
+        )
+        return self.__class__.construct(_fields_set=set(self.__fields_set__), **values)
 
 
     # @time_logger
@@ -185,12 +282,39 @@ class SalesGPT(Chain):
     @time_logger
     async def aextract_trip_json(self):
         """
-        Asynchronously extracts trip JSON data from the conversation history using the json_extractor_chain.
+        Asynchronously extracts trip JSON data from the latest agent reply.
+
+        The agent always re-sends the complete itinerary when it changes, so only the newest message is checked,
+        and nothing is done when it has no itinerary JSON or repeats the one extracted last time.
+        The itinerary is first parsed, repaired and validated locally, which needs no LLM call. The
+        json_extractor_chain is only used when that fails or `enrich_trip_json` asks for LLM-enriched
+        descriptions; it then gets just the itinerary block and the previous enriched result.
         """
-        # print("Conversation history:")
-        # print(self.conversation_history)
+        latest_message = self.conversation_history[-1] if self.conversation_history else ""
+        itinerary_block = find_itinerary_block(latest_message, include_truncated=True)
+        if itinerary_block is None:
+            print("No itinerary JSON in the latest message, skipping extraction.")
+            return None
+        if normalize_block(itinerary_block) == self.extracted_itinerary_block:
+            print("Itinerary unchanged, skipping extraction.")
+            return None
+
+        previous_trip_data = self.extracted_trip_json_data
+        itinerary = parse_itinerary(itinerary_block)
+        if itinerary is not None:
+            self.extracted_trip_json_data = itinerary
+            self.extracted_itinerary_block = normalize_block(itinerary_block)
+            if not self.enrich_trip_json:
+                return itinerary
+
+        extractor_input = f"{self.salesperson_name}: {itinerary_block}"
+        if previous_trip_data != "Empty JSON":
+            extractor_input = (
+                "Previously enriched itinerary, keep its details for the days that did not change:\n"
+                f"{json.dumps(previous_trip_data)}\n{extractor_input}"
+            )
         extraction_output = await self.json_extractor_chain.ainvoke(
-            input={"conversation_history": "\n".join(self.conversation_history).rstrip("\n")},
+            input={"conversation_history": extractor_input},
             return_only_outputs=False,
         )
         # print("JSON extraction output:")
@@ -204,24 +328,14 @@ class SalesGPT(Chain):
         else:
             # Parse the extracted JSON
             try:
-                # Remove any leading/trailing code block markers
-                extracted_text_clean = re.sub(r'^```(?:json)?\s*', '', extracted_text)
-                extracted_text_clean = re.sub(r'\s*```$', '', extracted_text_clean)
-                extracted_text_clean = extracted_text_clean.strip()
-
-                # Remove comments
-                extracted_text_clean = re.sub(r'//.*', '', extracted_text_clean)
-
-                # print("Cleaned extracted text:")
-                # print(extracted_text_clean)
-
-                # Parse the cleaned extracted_text as JSON
-                data = json.loads(extracted_text_clean)
+                # Remove code block markers and comments, and fix trailing commas or truncation
+                data = json.loads(repair_json(extracted_text))
                 # Extract the 'ex_json' key
                 trip_data = data.get('ex_json')
                 if trip_data:
                     print("Extracted JSON data:")
                     self.extracted_trip_json_data = trip_data
+                    self.extracted_itinerary_block = normalize_block(itinerary_block)
                     return trip_data
                 else:
                     print("No 'ex_json' key found in the extracted data.")
@@ -289,6 +403,101 @@ class SalesGPT(Chain):
         human_input = "User: " + human_input + " <END_OF_TURN>"
         self.conversation_history.append(human_input)
 
+    def history_buffer(self) -> ConversationHistory:
+        """
+        Returns the conversation history as a `ConversationHistory`, converting a plain list assigned to it.
+
+        The joined history text and its estimated token count are kept up to date as turns are appended, see
+        `ConversationHistory.text` and `ConversationHistory.token_count`.
+        """
+        if not isinstance(self.conversation_history, ConversationHistory):
+            self.conversation_history = ConversationHistory(self.conversation_history)
+        return self.conversation_history
+
+    def _history_digest(self, end: int) -> str:
+        """
+        Returns a hash of the first `end` turns of the history.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        for turn in self.conversation_history[:end]:
+            digest.update(turn.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _set_history_summary(self, summary: str, upto: int) -> None:
+        self.history_summary = summary
+        self.history_summary_upto = upto
+        self.history_summary_digest = self._history_digest(upto)
+
+    def _history_window(self) -> int:
+        """
+        Returns the start of the verbatim history window and drops a summary the history no longer matches.
+        """
+        start = history_window_start(
+            self.history_buffer(), self.history_keep_last, self.history_max_tokens
+        )
+        if self.history_summary_upto and (
+            self.history_summary_upto > start
+            or self.history_summary_digest != self._history_digest(self.history_summary_upto)
+        ):
+            # The history was replaced or shortened, the cached summary is about other turns.
+            self.history_summary = ""
+            self.history_summary_upto = 0
+            self.history_summary_digest = ""
+        return start
+
+    def _join_history(self, start: int) -> str:
+        history = self.history_buffer().text_from(start)
+        if start == 0 or not self.history_summary:
+            return history
+        return f"Summary of the earlier conversation:\n{self.history_summary}\n\n{history}"
+
+    def format_conversation_history(self) -> str:
+        """
+        Returns the conversation history as it is inserted into the prompts.
+
+        This is the single place where the history policy is applied. The newest turns are kept verbatim within
+        `history_keep_last` turns and `history_max_tokens` estimated tokens, and the older turns are replaced
+        by a summary cached on the agent, which is only extended with the turns that left the window since the
+        previous call. Without limits the full history is returned.
+
+        The synchronous path always summarizes extractively; with `history_summary_mode` "llm",
+        `aformat_conversation_history` writes the summary with the LLM instead.
+
+        Returns:
+            str: The history text for the `conversation_history` prompt variable.
+        """
+        start = self._history_window()
+        if start > self.history_summary_upto and self.history_summary_mode != "none":
+            summary = extractive_summary(self.conversation_history[self.history_summary_upto : start])
+            self._set_history_summary("\n".join(filter(None, [self.history_summary, summary])), start)
+        return self._join_history(start)
+
+    async def aformat_conversation_history(self) -> str:
+        """
+        Async version of `format_conversation_history` that can summarize with the LLM.
+        """
+        if self.history_summary_mode != "llm":
+            return self.format_conversation_history()
+        start = self._history_window()
+        if start > self.history_summary_upto:
+            previous_summary = (
+                f"Summary of the conversation before this part:\n{self.history_summary}\n"
+                if self.history_summary
+                else ""
+            )
+            prompt = HISTORY_SUMMARY_PROMPT.format(
+                previous_summary=previous_summary,
+                conversation="\n".join(self.conversation_history[self.history_summary_upto : start]),
+            )
+            try:
+                message = await self.sales_conversation_utterance_chain.llm.ainvoke(prompt)
+                self._set_history_summary(message.content.strip(), start)
+            except Exception as e:
+                print(f"Error summarizing conversation history: {e}")
+                return self.format_conversation_history()
+        return self._join_history(start)
+
     @time_logger
     def step(self, stream: bool = False):
         """
@@ -328,9 +537,64 @@ class SalesGPT(Chain):
         else:
             return await self._astreaming_generator()
 
+    async def astream_step(self) -> AsyncIterator[str]:
+        """
+        Streams the agent's next utterance and records it in the conversation history.
+
+        Text deltas from `_astreaming_generator` are yielded as soon as they are known not to be part of the
+        speaker prefix ("<salesperson_name>:") or of an `<END_OF_TURN>`/`<END_OF_CALL>` token, which may be
+        split across chunks. The stream stops at the first end token. Once it completes, the full utterance
+        is appended to the conversation history in the same format as `acall`, ending with the end token
+        that closed it.
+
+        Yields:
+            str: The next piece of the agent's reply.
+        """
+        stream = await self._astreaming_generator()
+        prefix = f"{self.salesperson_name}:"
+        pending = ""
+        reply = ""
+        prefix_checked = False
+        end_token = None
+        try:
+            async for chunk in stream:
+                pending += _stream_chunk_text(chunk)
+                if not prefix_checked:
+                    head = pending.lstrip()
+                    if len(head) < len(prefix) and prefix.startswith(head):
+                        continue
+                    if head.startswith(prefix):
+                        pending = head[len(prefix) :]
+                    prefix_checked = True
+                index, end_token = _find_end_token(pending)
+                if end_token is not None:
+                    text, pending = pending[:index], ""
+                else:
+                    keep = _partial_end_token_length(pending)
+                    text, pending = pending[: len(pending) - keep], pending[len(pending) - keep :]
+                if not reply:
+                    text = text.lstrip()
+                if text:
+                    reply += text
+                    yield text
+                if end_token is not None:
+                    break
+        finally:
+            if hasattr(stream, "aclose"):
+                await stream.aclose()
+
+        if end_token is None and pending:
+            text = pending if reply else pending.lstrip()
+            if text:
+                reply += text
+                yield text
+
+        self.conversation_history.append(
+            f"{self.salesperson_name}: {reply.rstrip()} {end_token or '<END_OF_TURN>'}"
+        )
+
     @time_logger
     async def acall(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
-    
         """
         Executes one step of the sales agent.
 
@@ -353,7 +617,7 @@ class SalesGPT(Chain):
         inputs = {
             "input": "",
             "conversation_stage": self.current_conversation_stage,
-            "conversation_history": "\n".join(self.conversation_history),
+            "conversation_history": await self.aformat_conversation_history(),
             "salesperson_name": self.salesperson_name,
             "salesperson_role": self.salesperson_role,
             "company_name": self.company_name,
@@ -413,7 +677,7 @@ class SalesGPT(Chain):
             [
                 dict(
                     conversation_stage=self.current_conversation_stage,
-                    conversation_history="\n".join(self.conversation_history),
+                    conversation_history=self.format_conversation_history(),
                     salesperson_name=self.salesperson_name,
                     salesperson_role=self.salesperson_role,
                     company_name=self.company_name,
@@ -427,12 +691,16 @@ class SalesGPT(Chain):
 
         inception_messages = prompt[0][0].to_messages()
 
-        message_dict = {"role": "system", "content": inception_messages[0].content}
+        # The static instructions go first in their own message so the provider can cache them between turns.
+        instructions, conversation = split_static_prompt(inception_messages[0].content)
+        messages = [{"role": "system", "content": conversation}]
+        if instructions:
+            messages.insert(0, {"role": "system", "content": instructions})
 
         if self.sales_conversation_utterance_chain.verbose:
             pass
             # print("\033[92m" + inception_messages[0].content + "\033[0m")
-        return [message_dict]
+        return messages
 
     @time_logger
     def _streaming_generator(self):
@@ -462,6 +730,13 @@ class SalesGPT(Chain):
 
         messages = self._prep_messages()
 
+        llm = self.sales_conversation_utterance_chain.llm
+        if isinstance(llm, BedrockCustomModel):
+            return (
+                _as_stream_chunk(chunk.content)
+                for chunk in llm.stream(convert_to_messages(messages))
+            )
+
         return self.sales_conversation_utterance_chain.llm.completion_with_retry(
             messages=messages,
             stop="<END_OF_TURN>",
@@ -531,6 +806,10 @@ class SalesGPT(Chain):
 
         messages = self._prep_messages()
 
+        llm = self.sales_conversation_utterance_chain.llm
+        if isinstance(llm, BedrockCustomModel):
+            return self._abedrock_stream(llm, messages)
+
         return await self.acompletion_with_retry(
             llm=self.sales_conversation_utterance_chain.llm,
             messages=messages,
@@ -539,6 +818,13 @@ class SalesGPT(Chain):
             model=self.model_name,
         )
 
+    async def _abedrock_stream(self, llm: BedrockCustomModel, messages: List[Dict[str, str]]):
+        """
+        Streams a Bedrock reply in the chunk format of the LiteLLM streaming responses.
+        """
+        async for chunk in llm.astream(convert_to_messages(messages)):
+            yield _as_stream_chunk(chunk.content)
+
     def _call(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
         """
         Executes one step of the sales agent.
@@ -562,7 +848,7 @@ class SalesGPT(Chain):
         inputs = {
             "input": "",
             "conversation_stage": self.current_conversation_stage,
-            "conversation_history": "\n".join(self.conversation_history),
+            "conversation_history": self.format_conversation_history(),
             "salesperson_name": self.salesperson_name,
             "salesperson_role": self.salesperson_role,
             "company_name": self.company_name,
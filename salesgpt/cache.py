@@ -0,0 +1,207 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from salesgpt.metrics import record_cache_lookup
+
+
+class TTLCache:
+    """
+    Thread-safe in-process LRU cache whose entries expire `ttl_seconds` after they were stored.
+
+    Args:
+        max_entries (int, optional): Maximum number of entries. `None` or `0` disables the limit.
+        ttl_seconds (float, optional): Lifetime of an entry. `None` or `0` disables expiry.
+        clock (Callable[[], float], optional): Monotonic time source, injectable for tests.
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = 1024,
+        ttl_seconds: Optional[float] = 300,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries or None
+        self.ttl_seconds = ttl_seconds or None
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Returns the value stored under `key`, or `default` if there is none or it expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, stored_at = entry
+            if self.ttl_seconds is not None and self._clock() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def get_entry(self, key: Hashable) -> Optional[Tuple[Any, float]]:
+        """
+        Returns the value stored under `key` and its age in seconds, or None if there is none or it expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, stored_at = entry
+            age = self._clock() - stored_at
+            if self.ttl_seconds is not None and age > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value, age
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (value, self._clock())
+            self._entries.move_to_end(key)
+            if self.max_entries is not None:
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> bool:
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class SingleFlightCache:
+    """
+    TTL cache for slow lookups that loads each missing key once, however many callers ask for it at once.
+
+    Concurrent callers of the same missing key wait for the one load in flight instead of starting their own.
+    Entries older than `ttl_seconds` but younger than `ttl_seconds + stale_seconds` are still returned
+    immediately while a single background load refreshes them (stale-while-revalidate). Failed loads are not
+    cached; their exception is raised to every caller waiting for them.
+
+    Args:
+        name (str): Name of the cache in the cache lookup metrics.
+        ttl_seconds (float, optional): Time an entry is served without refreshing it.
+        stale_seconds (float, optional): Additional time an expired entry is served while it is refreshed.
+        max_entries (int, optional): Maximum number of entries. `None` or `0` disables the limit.
+        clock (Callable[[], float], optional): Monotonic time source, injectable for tests.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl_seconds: float = 60,
+        stale_seconds: float = 0,
+        max_entries: Optional[int] = 1024,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds or 0
+        self._entries = TTLCache(max_entries, ttl_seconds + self.stale_seconds, clock)
+        self._loads: Dict[Hashable, Future] = {}
+        self._aloads: Dict[Hashable, asyncio.Task] = {}
+        self._lock = threading.Lock()
+
+    def _lookup(self, key: Hashable) -> Tuple[Any, bool]:
+        """
+        Returns the cached value, or None, and whether it has to be refreshed.
+        """
+        entry = self._entries.get_entry(key)
+        record_cache_lookup(self.name, entry is not None)
+        if entry is None:
+            return None, True
+        value, age = entry
+        return value, age > self.ttl_seconds
+
+    def get_or_load(self, key: Hashable, load: Callable[[], Any]) -> Any:
+        """
+        Returns the value of `key`, calling `load` to get it if it is not cached.
+        """
+        value, stale = self._lookup(key)
+        if value is None:
+            return self._load(key, load)
+        if stale:
+            with self._lock:
+                refreshing = key in self._loads
+            if not refreshing:
+                threading.Thread(target=self._refresh, args=(key, load), daemon=True).start()
+        return value
+
+    def _load(self, key: Hashable, load: Callable[[], Any]) -> Any:
+        with self._lock:
+            future = self._loads.get(key)
+            owner = future is None
+            if owner:
+                future = self._loads[key] = Future()
+        if not owner:
+            return future.result()
+        try:
+            value = load()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            self._entries.set(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                self._loads.pop(key, None)
+
+    def _refresh(self, key: Hashable, load: Callable[[], Any]) -> None:
+        try:
+            self._load(key, load)
+        except Exception as e:
+            print(f"Refreshing {self.name} cache entry failed: {e}")
+
+    async def aget_or_load(self, key: Hashable, load: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Async version of `get_or_load`, `load` returns an awaitable.
+        """
+        value, stale = self._lookup(key)
+        if value is None:
+            # Shielded, so a caller that is cancelled does not cancel the load the other callers wait for.
+            return await asyncio.shield(self._start_aload(key, load))
+        if stale:
+            self._start_aload(key, load)
+        return value
+
+    def _start_aload(self, key: Hashable, load: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        task = self._aloads.get(key)
+        if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+            return task
+        task = asyncio.ensure_future(self._aload(key, load))
+        task.add_done_callback(self._aload_done)
+        self._aloads[key] = task
+        return task
+
+    async def _aload(self, key: Hashable, load: Callable[[], Awaitable[Any]]) -> Any:
+        value = await load()
+        self._entries.set(key, value)
+        return value
+
+    def _aload_done(self, task: asyncio.Task) -> None:
+        for key, running in list(self._aloads.items()):
+            if running is task:
+                del self._aloads[key]
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Loading {self.name} cache entry failed: {task.exception()}")
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
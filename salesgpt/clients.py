@@ -0,0 +1,158 @@
+import asyncio
+import os
+import threading
+import weakref
+from contextlib import AsyncExitStack
+from functools import partial
+from typing import Any, Dict, Optional, Tuple
+
+import aioboto3
+import boto3
+import httpx
+from botocore.config import Config
+
+# The shared async HTTP client and the event loop it was created on.
+_async_http_client: Optional[Tuple[asyncio.AbstractEventLoop, httpx.AsyncClient]] = None
+
+# Bedrock runtime clients keyed by region. The async clients are bound to the event loop they were created on.
+_bedrock_clients: Dict[Optional[str], Any] = {}
+_bedrock_clients_lock = threading.Lock()
+_async_bedrock_clients: Dict[Optional[str], Tuple[asyncio.AbstractEventLoop, Any]] = {}
+# asyncio locks are bound to the loop they are first used on, so each loop gets its own.
+_async_bedrock_locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = (
+    weakref.WeakKeyDictionary()
+)
+_async_bedrock_stack: Optional[AsyncExitStack] = None
+_aioboto3_session: Optional[aioboto3.Session] = None
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    Returns the process-wide async HTTP client used by the tools, creating it on first use.
+
+    Sharing one client keeps connections to the external APIs (Liknoss, Stripe gateway, Calendly) alive
+    between tool calls instead of paying a new TCP/TLS handshake per request. Its connections are bound to
+    the running event loop, so a new client is created when it is called from another loop.
+
+    Returns:
+        httpx.AsyncClient: The shared client.
+    """
+    global _async_http_client
+    loop = asyncio.get_running_loop()
+    if _async_http_client is not None:
+        client_loop, client = _async_http_client
+        if client_loop is loop and not client.is_closed:
+            return client
+    client = httpx.AsyncClient(
+        timeout=httpx.Timeout(30.0, connect=10.0),
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+    )
+    _async_http_client = (loop, client)
+    return client
+
+
+def _bedrock_config() -> Config:
+    return Config(
+        max_pool_connections=int(os.getenv("BEDROCK_MAX_POOL_CONNECTIONS", "50")),
+        retries={"max_attempts": 3, "mode": "adaptive"},
+    )
+
+
+def get_bedrock_client(region_name: Optional[str] = None):
+    """
+    Returns the process-wide boto3 `bedrock-runtime` client for a region, creating it on first use.
+
+    boto3 clients are thread-safe, so one client per region is reused by every call. This avoids resolving
+    credentials and opening a new TLS connection for each LLM request. The size of the connection pool is
+    set with the BEDROCK_MAX_POOL_CONNECTIONS environment variable.
+
+    Args:
+        region_name (str, optional): The AWS region, defaults to the AWS_REGION_NAME environment variable.
+
+    Returns:
+        The boto3 bedrock-runtime client.
+    """
+    region_name = region_name or os.environ.get("AWS_REGION_NAME")
+    client = _bedrock_clients.get(region_name)
+    if client is not None:
+        return client
+    with _bedrock_clients_lock:
+        client = _bedrock_clients.get(region_name)
+        if client is None:
+            client = boto3.client(
+                service_name="bedrock-runtime",
+                region_name=region_name,
+                config=_bedrock_config(),
+            )
+            _bedrock_clients[region_name] = client
+    return client
+
+
+async def aget_bedrock_client(region_name: Optional[str] = None):
+    """
+    Returns the process-wide aioboto3 `bedrock-runtime` client for a region, creating it on first use.
+
+    The client context is entered once and kept open until `aclose_clients` is called on application
+    shutdown, so its connection pool is reused across requests.
+
+    Args:
+        region_name (str, optional): The AWS region, defaults to the AWS_REGION_NAME environment variable.
+
+    Returns:
+        The aioboto3 bedrock-runtime client.
+    """
+    global _async_bedrock_stack, _aioboto3_session
+    region_name = region_name or os.environ.get("AWS_REGION_NAME")
+    loop = asyncio.get_running_loop()
+    entry = _async_bedrock_clients.get(region_name)
+    if entry is not None and entry[0] is loop:
+        return entry[1]
+    lock = _async_bedrock_locks.get(loop)
+    if lock is None:
+        lock = _async_bedrock_locks[loop] = asyncio.Lock()
+    async with lock:
+        entry = _async_bedrock_clients.get(region_name)
+        if entry is not None and entry[0] is loop:
+            return entry[1]
+        if _aioboto3_session is None:
+            _aioboto3_session = aioboto3.Session()
+        if _async_bedrock_stack is None:
+            _async_bedrock_stack = AsyncExitStack()
+        client = await _async_bedrock_stack.enter_async_context(
+            _aioboto3_session.client(
+                service_name="bedrock-runtime",
+                region_name=region_name,
+                config=_bedrock_config(),
+            )
+        )
+        _async_bedrock_clients[region_name] = (loop, client)
+    return client
+
+
+async def aclose_clients():
+    """
+    Closes the shared clients, called on application shutdown.
+    """
+    global _async_http_client, _async_bedrock_stack
+    if _async_http_client is not None:
+        (client_loop, client), _async_http_client = _async_http_client, None
+        # A client of another, possibly closed, loop cannot be closed from this one.
+        if client_loop is asyncio.get_running_loop():
+            await client.aclose()
+    if _async_bedrock_stack is not None:
+        stack, _async_bedrock_stack = _async_bedrock_stack, None
+        _async_bedrock_clients.clear()
+        _async_bedrock_locks.clear()
+        await stack.aclose()
+    with _bedrock_clients_lock:
+        for client in _bedrock_clients.values():
+            client.close()
+        _bedrock_clients.clear()
+
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Runs a blocking function in the default thread pool so it does not stall the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, partial(func, *args, **kwargs))
@@ -1,17 +1,42 @@
 # Corrected import statements
 import inspect
+from functools import lru_cache
 from typing import Any, Dict, Optional
 
 # Corrected import path for RunnableConfig
 from langchain.agents import AgentExecutor
-from langchain.callbacks.manager import CallbackManager
+from langchain.callbacks.manager import AsyncCallbackManager, CallbackManager
 from langchain.chains.base import Chain
 from langchain_core.load.dump import dumpd
 from langchain_core.outputs import RunInfo
 from langchain_core.runnables import RunnableConfig, ensure_config
+from langchain_core.tracers.base import BaseTracer
+
+
+@lru_cache(maxsize=None)
+def _supports_run_manager(cls: type, method_name: str) -> bool:
+    """Checks once per class whether `_call`/`_acall` accept the 'run_manager' argument."""
+    return "run_manager" in inspect.signature(getattr(cls, method_name)).parameters
+
+
+@lru_cache(maxsize=None)
+def _lightweight_serialized(cls: type) -> Dict[str, Any]:
+    """Minimal serialized form with the fields non-tracing handlers (e.g. stdout) read from `on_chain_start`."""
+    return {
+        "lc": 1,
+        "type": "not_implemented",
+        "id": [*cls.__module__.split("."), cls.__name__],
+        "name": cls.__name__,
+    }
 
 
 class CustomAgentExecutor(AgentExecutor):
+    def _serialized(self, callback_manager: Any) -> Dict[str, Any]:
+        # `dumpd` serializes the whole agent, prompt and tools; only tracers persist it, so skip it otherwise.
+        if any(isinstance(handler, BaseTracer) for handler in callback_manager.handlers):
+            return dumpd(self)
+        return _lightweight_serialized(type(self))
+
     def invoke(
         self,
         input: Dict[str, Any],
@@ -41,10 +66,19 @@ class CustomAgentExecutor(AgentExecutor):
             self.metadata,
         )
 
+        # Fast path: without callback handlers there is nobody to notify and no run to track
+        if not callback_manager.handlers and not include_run_info:
+            outputs = self._call(inputs)
+            intermediate_steps.append({"event": "Chain Started", "details": "Inputs prepared"})
+            intermediate_steps.append({"event": "Call Successful", "outputs": outputs})
+            return self._finalize_outputs(
+                inputs, outputs, intermediate_steps, None, return_only_outputs, False
+            )
+
         # Check if the _call method supports the new argument 'run_manager'
-        new_arg_supported = inspect.signature(self._call).parameters.get("run_manager")
+        new_arg_supported = _supports_run_manager(type(self), "_call")
         run_manager = callback_manager.on_chain_start(
-            dumpd(self),
+            self._serialized(callback_manager),
             inputs,
             name=run_name,
         )
@@ -68,10 +102,102 @@ class CustomAgentExecutor(AgentExecutor):
             run_manager.on_chain_error(e)
             intermediate_steps.append({"event": "Error", "error": str(e)})
             raise e
-        finally:
-            # Mark the end of the chain execution
-            run_manager.on_chain_end(outputs)
+        # Mark the end of the chain execution
+        run_manager.on_chain_end(outputs)
+
+        return self._finalize_outputs(
+            inputs,
+            outputs,
+            intermediate_steps,
+            run_manager,
+            return_only_outputs,
+            include_run_info,
+        )
+
+    async def ainvoke(
+        self,
+        input: Dict[str, Any],
+        config: Optional[RunnableConfig] = None,
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        """
+        Async counterpart of `invoke`.
+
+        Runs the agent loop through `_acall` with the async callback manager, so tools are executed through their
+        `coroutine` and LLM calls through the async clients without hopping to a thread pool. The outputs have the
+        same shape as the ones returned by `invoke`.
+        """
+        intermediate_steps = []  # Initialize the list to capture intermediate steps
+
+        config = ensure_config(config)
+        callbacks = config.get("callbacks")
+        tags = config.get("tags")
+        metadata = config.get("metadata")
+        run_name = config.get("run_name")
+        include_run_info = kwargs.get("include_run_info", False)
+        return_only_outputs = kwargs.get("return_only_outputs", False)
+
+        inputs = self.prep_inputs(input)
+        callback_manager = AsyncCallbackManager.configure(
+            callbacks,
+            self.callbacks,
+            self.verbose,
+            tags,
+            self.tags,
+            metadata,
+            self.metadata,
+        )
+
+        if not callback_manager.handlers and not include_run_info:
+            outputs = await self._acall(inputs)
+            intermediate_steps.append({"event": "Chain Started", "details": "Inputs prepared"})
+            intermediate_steps.append({"event": "Call Successful", "outputs": outputs})
+            return self._finalize_outputs(
+                inputs, outputs, intermediate_steps, None, return_only_outputs, False
+            )
+
+        new_arg_supported = _supports_run_manager(type(self), "_acall")
+        run_manager = await callback_manager.on_chain_start(
+            self._serialized(callback_manager),
+            inputs,
+            name=run_name,
+        )
+
+        intermediate_steps.append(
+            {"event": "Chain Started", "details": "Inputs prepared"}
+        )
+
+        try:
+            outputs = (
+                await self._acall(inputs, run_manager=run_manager)
+                if new_arg_supported
+                else await self._acall(inputs)
+            )
+            intermediate_steps.append({"event": "Call Successful", "outputs": outputs})
+        except BaseException as e:
+            await run_manager.on_chain_error(e)
+            intermediate_steps.append({"event": "Error", "error": str(e)})
+            raise e
+        await run_manager.on_chain_end(outputs)
 
+        return self._finalize_outputs(
+            inputs,
+            outputs,
+            intermediate_steps,
+            run_manager,
+            return_only_outputs,
+            include_run_info,
+        )
+
+    def _finalize_outputs(
+        self,
+        inputs: Dict[str, Any],
+        outputs: Dict[str, Any],
+        execution_events: list,
+        run_manager: Any,
+        return_only_outputs: bool,
+        include_run_info: bool,
+    ) -> Dict[str, Any]:
         # Prepare the final outputs, including run information if requested
         final_outputs: Dict[str, Any] = self.prep_outputs(
             inputs, outputs, return_only_outputs
@@ -79,8 +205,11 @@ class CustomAgentExecutor(AgentExecutor):
         if include_run_info:
             final_outputs["run_info"] = RunInfo(run_id=run_manager.run_id)
 
-        # Include intermediate steps in the final outputs
-        final_outputs["intermediate_steps"] = intermediate_steps
+        # Keep the agent's (AgentAction, observation) steps, the API reads the tool calls from them.
+        # The execution events are only used as intermediate steps when the agent did not return any.
+        final_outputs["execution_events"] = execution_events
+        if "intermediate_steps" not in final_outputs:
+            final_outputs["intermediate_steps"] = execution_events
 
         return final_outputs
 
@@ -0,0 +1,182 @@
+import re
+from bisect import bisect_left
+from typing import Iterable, List
+
+from salesgpt.itinerary import find_itinerary_block
+
+# Rough characters per token of English text, used where an exact tokenizer would cost more than it saves.
+CHARS_PER_TOKEN = 4
+
+# Longest text kept per turn in an extractive summary.
+SUMMARY_TURN_CHARS = 200
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates the number of tokens of `text` without running a tokenizer.
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class ConversationHistory(list):
+    """
+    The conversation history as a list of turns that also keeps the joined history text.
+
+    Each turn is added to a running newline-joined buffer when it is appended, together with its character
+    offset and a running estimated token count. The joined text of any suffix of the history and the
+    history window are then available without joining the turns again. It is a real `list`, so code that
+    reads or appends turns keeps working; other in-place changes rebuild the buffer on the next read.
+    """
+
+    def __init__(self, turns: Iterable[str] = ()):
+        super().__init__(turns)
+        self._rebuild()
+
+    def _rebuild(self) -> None:
+        self._text = "\n".join(self)
+        self._offsets: List[int] = []
+        self._costs: List[int] = [0]
+        offset = 0
+        for turn in self:
+            self._offsets.append(offset)
+            offset += len(turn) + 1
+            self._costs.append(self._costs[-1] + estimate_tokens(turn) + 1)
+        self._dirty = False
+
+    def _synced(self) -> "ConversationHistory":
+        if self._dirty or len(self._offsets) != len(self):
+            self._rebuild()
+        return self
+
+    def append(self, turn: str) -> None:
+        self._synced()
+        super().append(turn)
+        self._offsets.append(len(self._text) + 1 if self._text or len(self) > 1 else 0)
+        self._text = f"{self._text}\n{turn}" if len(self) > 1 else turn
+        self._costs.append(self._costs[-1] + estimate_tokens(turn) + 1)
+
+    def __reduce__(self):
+        return self.__class__, (list(self),)
+
+    def __setitem__(self, index, value) -> None:
+        super().__setitem__(index, value)
+        in_sync = not self._dirty and len(self._offsets) == len(self)
+        if in_sync and isinstance(index, int) and (index == -1 or index == len(self) - 1):
+            # Replacing the newest turn, e.g. to strip an end token, only rewrites the end of the buffer.
+            start = self._offsets[-1]
+            self._text = self._text[:start] + value
+            self._costs[-1] = self._costs[-2] + estimate_tokens(value) + 1
+        else:
+            self._dirty = True
+
+    def _invalidate(method):
+        def wrapper(self, *args, **kwargs):
+            result = method(self, *args, **kwargs)
+            self._dirty = True
+            return result
+
+        wrapper.__name__ = method.__name__
+        return wrapper
+
+    extend = _invalidate(list.extend)
+    insert = _invalidate(list.insert)
+    pop = _invalidate(list.pop)
+    remove = _invalidate(list.remove)
+    clear = _invalidate(list.clear)
+    sort = _invalidate(list.sort)
+    reverse = _invalidate(list.reverse)
+    __delitem__ = _invalidate(list.__delitem__)
+    __iadd__ = _invalidate(list.__iadd__)
+    __imul__ = _invalidate(list.__imul__)
+    del _invalidate
+
+    @property
+    def text(self) -> str:
+        """The turns joined with newlines."""
+        return self._synced()._text
+
+    @property
+    def token_count(self) -> int:
+        """The estimated number of tokens of `text`."""
+        return self._synced()._costs[-1]
+
+    def text_from(self, start: int) -> str:
+        """
+        Returns the turns from index `start` on, joined with newlines.
+        """
+        self._synced()
+        if start <= 0:
+            return self._text
+        if start >= len(self):
+            return ""
+        return self._text[self._offsets[start] :]
+
+    def window_start(self, keep_last: int = 0, max_tokens: int = 0) -> int:
+        """
+        Same as `history_window_start`, in O(log n) from the running token counts.
+        """
+        self._synced()
+        if not self:
+            return 0
+        start = 0
+        if keep_last:
+            start = max(start, len(self) - keep_last)
+        if max_tokens:
+            start = max(start, bisect_left(self._costs, self._costs[-1] - max_tokens))
+        return min(start, len(self) - 1)
+
+
+def history_window_start(turns: List[str], keep_last: int = 0, max_tokens: int = 0) -> int:
+    """
+    Returns the index of the first turn that is sent to the model verbatim.
+
+    Turns are kept from the newest backwards while there are at most `keep_last` of them and their estimated
+    size stays within `max_tokens`. The newest turn is always kept. A limit of 0 disables it.
+
+    Args:
+        turns (List[str]): The conversation history.
+        keep_last (int, optional): Maximum number of verbatim turns.
+        max_tokens (int, optional): Token budget for the verbatim turns.
+
+    Returns:
+        int: The index of the oldest turn in the window.
+    """
+    if isinstance(turns, ConversationHistory):
+        return turns.window_start(keep_last, max_tokens)
+    start = len(turns)
+    used = 0
+    while start > 0:
+        if keep_last and len(turns) - start >= keep_last:
+            break
+        cost = estimate_tokens(turns[start - 1]) + 1
+        if max_tokens and used + cost > max_tokens and start < len(turns):
+            break
+        used += cost
+        start -= 1
+    return start
+
+
+def summarize_turn(turn: str) -> str:
+    """
+    Shortens a turn to its speaker and first sentence, without the end-of-turn token or itinerary JSON.
+
+    The agent re-sends the complete itinerary whenever it changes, so older copies only need a placeholder.
+    """
+    turn = turn.replace("<END_OF_TURN>", "").replace("<END_OF_CALL>", "").strip()
+    block = find_itinerary_block(turn)
+    if block is not None:
+        turn = turn.replace(block, "[itinerary]")
+    turn = " ".join(turn.split())
+    match = re.match(r"(.+?[.!?])(\s|$)", turn)
+    if match:
+        turn = match.group(1)
+    if len(turn) > SUMMARY_TURN_CHARS:
+        turn = turn[: SUMMARY_TURN_CHARS - 3].rstrip() + "..."
+    return turn
+
+
+def extractive_summary(turns: List[str]) -> str:
+    """
+    Builds a summary of `turns` from the first sentence of each turn, one line per turn.
+    """
+    return "\n".join(summarize_turn(turn) for turn in turns)
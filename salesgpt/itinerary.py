@@ -0,0 +1,233 @@
+import json
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Keys of one itinerary day, see the JSON format requested in SALES_AGENT_TOOLS_PROMPT.
+ITINERARY_DAY_KEYS = ("day_number", "morning_activities", "afternoon_details", "evening_plans")
+
+
+def _json_objects(text: str, include_unclosed: bool = False) -> Iterator[Tuple[int, int]]:
+    """
+    Yields the (start, end) spans of the outermost brace-balanced blocks in `text`.
+
+    Braces inside JSON strings are ignored. A block that is never closed is only yielded, up to the end of
+    `text`, with `include_unclosed`.
+    """
+    depth = 0
+    start = -1
+    in_string = False
+    escaped = False
+    for index, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            if depth:
+                in_string = True
+        elif char == "{":
+            if depth == 0:
+                start = index
+            depth += 1
+        elif char == "}" and depth:
+            depth -= 1
+            if depth == 0:
+                yield start, index + 1
+    if include_unclosed and depth:
+        yield start, len(text)
+
+
+def is_itinerary_text(text: str) -> bool:
+    """
+    Cheap check whether `text` can contain an itinerary, used before any parsing.
+    """
+    return "day_number" in text
+
+
+def find_itinerary_block(text: str, include_truncated: bool = False) -> Optional[str]:
+    """
+    Returns the JSON block of `text` that holds the trip itinerary, or None if there is none.
+
+    The agent presents its travel plan as a JSON object with one entry per day, so the itinerary is the largest
+    brace-balanced block that contains a `day_number` and at least one other day key.
+
+    Args:
+        text (str): A message of the conversation, normally the latest agent reply.
+        include_truncated (bool, optional): Also consider a final block that is never closed, e.g. when the
+            reply hit the token limit.
+
+    Returns:
+        Optional[str]: The raw itinerary block, not validated as JSON.
+    """
+    if not is_itinerary_text(text):
+        return None
+    best = None
+    for start, end in _json_objects(text, include_unclosed=include_truncated):
+        block = text[start:end]
+        if "day_number" not in block or not any(key in block for key in ITINERARY_DAY_KEYS[1:]):
+            continue
+        if best is None or len(block) > len(best):
+            best = block
+    return best
+
+
+def normalize_block(block: str) -> str:
+    """
+    Collapses whitespace so that re-sent itineraries that only differ in formatting compare equal.
+    """
+    return " ".join(block.split())
+
+
+_CODE_FENCE = re.compile(r"```(?:json)?")
+_TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+
+
+def _strip_comments(text: str) -> str:
+    """
+    Removes `//` and `/* */` comments outside of JSON strings.
+    """
+    result = []
+    index = 0
+    in_string = False
+    while index < len(text):
+        char = text[index]
+        if in_string:
+            result.append(char)
+            if char == "\\":
+                result.append(text[index + 1 : index + 2])
+                index += 1
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+            result.append(char)
+        elif text.startswith("//", index):
+            newline = text.find("\n", index)
+            index = len(text) if newline == -1 else newline
+            continue
+        elif text.startswith("/*", index):
+            end = text.find("*/", index + 2)
+            index = len(text) if end == -1 else end + 2
+            continue
+        else:
+            result.append(char)
+        index += 1
+    return "".join(result)
+
+
+def _close_truncated(text: str) -> str:
+    """
+    Closes an unterminated string and the brackets left open by a truncated JSON document.
+    """
+    stack = []
+    in_string = False
+    escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]" and stack:
+            stack.pop()
+    if in_string:
+        text += '"'
+    # A value cut off after its key or a dangling comma cannot be completed, drop it.
+    text = re.sub(r'(,\s*"[^"]*"\s*:?\s*|,\s*|:\s*)$', "", text.rstrip())
+    return text + "".join(reversed(stack))
+
+
+def repair_json(text: str) -> str:
+    """
+    Repairs the usual defects of LLM-written JSON: code fences, comments, trailing commas and truncation.
+
+    Args:
+        text (str): A JSON document, possibly wrapped in a code fence.
+
+    Returns:
+        str: The repaired document. It is not guaranteed to be valid JSON.
+    """
+    text = _CODE_FENCE.sub("", text).strip()
+    text = _strip_comments(text)
+    text = _close_truncated(text)
+    return _TRAILING_COMMA.sub(r"\1", text)
+
+
+def _find_days(data: Any) -> Optional[List[Any]]:
+    """
+    Returns the list of day entries of an itinerary, wherever the model nested it.
+    """
+    if isinstance(data, list):
+        if data and all(isinstance(day, dict) and "day_number" in day for day in data):
+            return data
+        candidates = data
+    elif isinstance(data, dict):
+        candidates = data.values()
+    else:
+        return None
+    for value in candidates:
+        days = _find_days(value)
+        if days is not None:
+            return days
+    return None
+
+
+def validate_itinerary(data: Any) -> List[str]:
+    """
+    Checks a parsed itinerary against the format the agent is asked to produce.
+
+    Args:
+        data (Any): The parsed JSON.
+
+    Returns:
+        List[str]: The problems found, empty if the itinerary is valid.
+    """
+    if not isinstance(data, dict):
+        return ["The itinerary must be a JSON object."]
+    days = _find_days(data)
+    if not days:
+        return ["The itinerary has no days with a day_number."]
+    errors = []
+    for position, day in enumerate(days, start=1):
+        try:
+            int(day["day_number"])
+        except (TypeError, ValueError):
+            errors.append(f"Day {position} has an invalid day_number: {day['day_number']!r}.")
+        for key in ITINERARY_DAY_KEYS[1:]:
+            if not day.get(key):
+                errors.append(f"Day {position} is missing {key}.")
+    return errors
+
+
+def parse_itinerary(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Finds, repairs and validates the itinerary JSON of an agent reply without calling an LLM.
+
+    Args:
+        text (str): A message of the conversation, normally the latest agent reply.
+
+    Returns:
+        Optional[Dict[str, Any]]: The itinerary, or None if the reply has no valid itinerary.
+    """
+    block = find_itinerary_block(text, include_truncated=True)
+    if block is None:
+        return None
+    try:
+        data = json.loads(block)
+    except json.JSONDecodeError:
+        try:
+            data = json.loads(repair_json(block))
+        except json.JSONDecodeError:
+            return None
+    if validate_itinerary(data):
+        return None
+    return data
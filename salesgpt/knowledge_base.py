@@ -0,0 +1,274 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import numpy as np
+from langchain.text_splitter import CharacterTextSplitter
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+# Where `build_index` writes and `get_index` looks for prebuilt indexes.
+DEFAULT_INDEX_DIR = os.getenv("KNOWLEDGE_BASE_INDEX_DIR", ".knowledge_base")
+
+# Same chunking as the original in-memory Chroma collection.
+CHUNK_SIZE = 3000
+CHUNK_OVERLAP = 500
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Local embedding function that hashes the words and word pairs of a text into a fixed-size vector.
+
+    It needs no model or network access, so indexes can be built and searched offline and in tests.
+    It only matches on shared vocabulary; use a real embedding model for semantic search.
+
+    Args:
+        dimensions (int, optional): Size of the vectors.
+    """
+
+    def __init__(self, dimensions: int = 512):
+        self.dimensions = dimensions
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        words = re.findall(r"\w+", text.lower())
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dimensions] += 1.0 if value >> 63 else -1.0
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+# Embedding functions selectable with KNOWLEDGE_BASE_EMBEDDINGS. Register others here.
+EMBEDDINGS: Dict[str, Callable[[], Embeddings]] = {
+    "hashing": HashingEmbeddings,
+}
+
+
+def _openai_embeddings() -> Embeddings:
+    from langchain_openai import OpenAIEmbeddings
+
+    return OpenAIEmbeddings()
+
+
+EMBEDDINGS["openai"] = _openai_embeddings
+
+
+def get_embeddings(name: Optional[str] = None) -> Embeddings:
+    """
+    Returns the embedding function registered as `name`, by default the one set in KNOWLEDGE_BASE_EMBEDDINGS.
+    """
+    name = name or os.getenv("KNOWLEDGE_BASE_EMBEDDINGS", "openai")
+    if name not in EMBEDDINGS:
+        raise ValueError(f"Unknown embeddings '{name}', expected one of {sorted(EMBEDDINGS)}.")
+    return EMBEDDINGS[name]()
+
+
+def embeddings_name(embeddings: Embeddings) -> str:
+    """
+    Identifies an embedding function, so indexes built with different functions or models are kept apart.
+    """
+    model = getattr(embeddings, "model", None)
+    dimensions = getattr(embeddings, "dimensions", None)
+    return ":".join(str(part) for part in [type(embeddings).__name__, model, dimensions] if part)
+
+
+def index_key(catalog: str, embeddings: Embeddings) -> str:
+    """
+    Returns the key of the index of `catalog`: a hash of the catalog, the chunking and the embedding function.
+    """
+    digest = hashlib.sha256()
+    for part in [catalog, str(CHUNK_SIZE), str(CHUNK_OVERLAP), embeddings_name(embeddings)]:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:32]
+
+
+def split_catalog(catalog: str) -> List[str]:
+    text_splitter = CharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    return text_splitter.split_text(catalog)
+
+
+class VectorIndex:
+    """
+    A prebuilt catalog index stored as a flat matrix of unit-length chunk vectors and the chunk texts.
+
+    The matrix is memory-mapped on the first search, so loading costs nothing until the index is used and
+    the pages are shared by every session, and by every worker process of the same host.
+
+    Args:
+        index_dir (str): Directory of the index files.
+        key (str): The `index_key` of the indexed catalog.
+    """
+
+    def __init__(self, index_dir: str, key: str):
+        self.index_dir = index_dir
+        self.key = key
+        self._matrix: Optional[np.ndarray] = None
+        self._texts: Optional[List[str]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def matrix_path(self) -> str:
+        return os.path.join(self.index_dir, f"{self.key}.npy")
+
+    @property
+    def texts_path(self) -> str:
+        return os.path.join(self.index_dir, f"{self.key}.json")
+
+    def exists(self) -> bool:
+        return os.path.exists(self.matrix_path) and os.path.exists(self.texts_path)
+
+    def save(self, texts: List[str], vectors: List[List[float]]) -> None:
+        """
+        Writes the chunk texts and their normalized vectors. Files are replaced atomically.
+        """
+        os.makedirs(self.index_dir, exist_ok=True)
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(len(texts), -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms == 0, 1, norms)
+        tmp_suffix = f".{os.getpid()}.tmp"
+        with open(self.matrix_path + tmp_suffix, "wb") as f:
+            np.save(f, matrix)
+        with open(self.texts_path + tmp_suffix, "w", encoding="utf-8") as f:
+            json.dump(texts, f)
+        os.replace(self.texts_path + tmp_suffix, self.texts_path)
+        os.replace(self.matrix_path + tmp_suffix, self.matrix_path)
+
+    def load(self) -> "VectorIndex":
+        with self._lock:
+            if self._matrix is None:
+                with open(self.texts_path, encoding="utf-8") as f:
+                    self._texts = json.load(f)
+                self._matrix = np.load(self.matrix_path, mmap_mode="r")
+        return self
+
+    def search(self, query_vector: List[float], k: int = 4) -> List[Document]:
+        """
+        Returns the `k` chunks most similar to `query_vector` by cosine similarity.
+        """
+        self.load()
+        if not self._texts:
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        scores = self._matrix @ (query / norm if norm else query)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            Document(page_content=self._texts[i], metadata={"score": float(scores[i])})
+            for i in top
+        ]
+
+
+def build_index(
+    catalog: str, embeddings: Embeddings, index_dir: str = DEFAULT_INDEX_DIR
+) -> VectorIndex:
+    """
+    Splits and embeds `catalog` and writes the index to `index_dir`, unless it was built already.
+
+    Args:
+        catalog (str): The product catalog text.
+        embeddings (Embeddings): Embedding function for the chunks.
+        index_dir (str, optional): Directory of the index files.
+
+    Returns:
+        VectorIndex: The (not yet loaded) index.
+    """
+    index = VectorIndex(index_dir, index_key(catalog, embeddings))
+    if not index.exists():
+        texts = split_catalog(catalog)
+        print(f"Embedding {len(texts)} catalog chunks into {index.matrix_path}")
+        index.save(texts, embeddings.embed_documents(texts) if texts else [])
+    return index
+
+
+_indexes: Dict[str, VectorIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(
+    catalog: str, embeddings: Embeddings, index_dir: str = DEFAULT_INDEX_DIR
+) -> VectorIndex:
+    """
+    Returns the shared index of `catalog`, building and persisting it first if there is no prebuilt one.
+    """
+    key = index_key(catalog, embeddings)
+    path = os.path.join(index_dir, key)
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = _indexes[path] = build_index(catalog, embeddings, index_dir)
+    return index
+
+
+class VectorIndexRetriever(BaseRetriever):
+    """
+    Retriever over a `VectorIndex`.
+    """
+
+    index: Any
+    embeddings: Any
+    k: int = 4
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self.index.search(self.embeddings.embed_query(query), self.k)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self.index.search(await self.embeddings.aembed_query(query), self.k)
+
+
+def read_catalog(product_files: Union[str, List[str]]) -> str:
+    """
+    Reads and concatenates the product catalog from a file, a directory of files or a list of files.
+    """
+    if isinstance(product_files, str):
+        if os.path.isdir(product_files):
+            product_files = sorted(
+                os.path.join(product_files, name) for name in os.listdir(product_files)
+            )
+        else:
+            product_files = [product_files]
+    combined_product_catalog = ""
+    for product_file in product_files:
+        if not os.path.isfile(product_file):
+            print(f"File not found: {product_file}")
+            continue
+        with open(product_file, "r", encoding="utf-8") as f:
+            combined_product_catalog += f.read() + "\n"
+    return combined_product_catalog
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the product knowledge base index offline.")
+    parser.add_argument("catalog", nargs="+", help="Product catalog files or directories")
+    parser.add_argument("--index-dir", default=DEFAULT_INDEX_DIR, help="Directory of the index files")
+    parser.add_argument(
+        "--embeddings",
+        default=None,
+        help=f"Embedding function, one of {sorted(EMBEDDINGS)} (default: KNOWLEDGE_BASE_EMBEDDINGS or openai)",
+    )
+    args = parser.parse_args()
+    catalog = "".join(read_catalog(path) for path in args.catalog)
+    index = build_index(catalog, get_embeddings(args.embeddings), args.index_dir)
+    print(f"Index ready: {index.matrix_path}")
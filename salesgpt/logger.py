@@ -1,12 +1,23 @@
+import atexit
+import inspect
 import logging
+import os
+import queue
+import threading
 import time
+from collections import deque
 from functools import wraps
+from logging.handlers import QueueHandler, QueueListener
+from typing import Deque, Dict
+
+from salesgpt.profiler import active_profiler, span
 
 logger = logging.getLogger(__name__)
 
 stream_handler = logging.StreamHandler()
 log_filename = "output.log"
-file_handler = logging.FileHandler(filename=log_filename)
+# `delay` only creates the log file once something is written to it.
+file_handler = logging.FileHandler(filename=log_filename, delay=True)
 handlers = [stream_handler, file_handler]
 
 
@@ -17,21 +28,93 @@ class TimeFilter(logging.Filter):
 
 logger.addFilter(TimeFilter())
 
-# Configure the logging module
+# Log records are put on a queue and written to the console and output.log by a background thread,
+# so logging never blocks the event loop on file or terminal I/O.
+log_queue = queue.SimpleQueue()
+queue_handler = QueueHandler(log_queue)
+queue_listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+
+# Configure the logging module. The queue handler formats the records, the listener's handlers write the
+# formatted message as is.
 logging.basicConfig(
     level=logging.INFO,
     format="%(name)s %(asctime)s - %(levelname)s - %(message)s",
-    handlers=handlers,
+    handlers=[queue_handler],
 )
+queue_listener.start()
+atexit.register(queue_listener.stop)
+
+# Number of recent timings kept per function for `get_timings`.
+TIMING_HISTORY_SIZE = 1000
+
+_profiling_enabled = os.getenv("PROFILING_ENABLED", "True").lower() in ["true", "1", "t"]
+_timings: Dict[str, Deque[float]] = {}
+_timings_lock = threading.Lock()
+
+
+def set_profiling_enabled(enabled: bool) -> None:
+    """
+    Turns the timing of functions decorated with `time_logger` on or off at runtime.
+    """
+    global _profiling_enabled
+    _profiling_enabled = enabled
+
+
+def is_profiling_enabled() -> bool:
+    return _profiling_enabled
+
+
+def record_timing(name: str, seconds: float) -> None:
+    """
+    Adds a timing to the ring buffer of `name` and logs it.
+    """
+    with _timings_lock:
+        timings = _timings.get(name)
+        if timings is None:
+            timings = _timings[name] = deque(maxlen=TIMING_HISTORY_SIZE)
+        timings.append(seconds)
+    logger.info(f"Running {name}: --- {seconds} seconds ---")
+
+
+def get_timings() -> Dict[str, Dict[str, float]]:
+    """
+    Summarizes the recent timings of every profiled function.
+
+    Returns:
+        Dict[str, Dict[str, float]]: Per function the number of recorded calls and the mean, median,
+        95th percentile and maximum duration in seconds.
+    """
+    with _timings_lock:
+        snapshot = {name: sorted(timings) for name, timings in _timings.items()}
+    stats = {}
+    for name, timings in snapshot.items():
+        if not timings:
+            continue
+        count = len(timings)
+        stats[name] = {
+            "count": count,
+            "mean": sum(timings) / count,
+            "p50": timings[(count - 1) // 2],
+            "p95": timings[min(count - 1, int(count * 0.95))],
+            "max": timings[-1],
+        }
+    return stats
+
+
+def reset_timings() -> None:
+    with _timings_lock:
+        _timings.clear()
 
 
 def time_logger(func):
     """
     Decorator function to log the time taken by any function.
 
-    This decorator logs the execution time of the decorated function. It logs the start time before the function
-    execution, the end time after the function execution, and calculates the execution time. The function name and
-    execution time are then logged at the INFO level.
+    Works for regular functions and coroutine functions; for the latter the time until the coroutine finishes
+    is measured, not the time to create it. Timings are kept in a per-function ring buffer (see `get_timings`)
+    and logged through the background log queue. When profiling is turned off with `set_profiling_enabled`
+    or the PROFILING_ENABLED environment variable, the function is called without any measurement.
+    Inside a profiled request (see `salesgpt.profiler.profile_request`) each call is also recorded as a span.
 
     Args:
         func (Callable): The function to be decorated.
@@ -39,14 +122,35 @@ def time_logger(func):
     Returns:
         Callable: The decorated function.
     """
+    name = func.__name__
+    span_name = func.__qualname__
+
+    if inspect.iscoroutinefunction(func):
+
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            if not _profiling_enabled and active_profiler() is None:
+                return await func(*args, **kwargs)
+            start_time = time.perf_counter()
+            try:
+                with span(span_name):
+                    return await func(*args, **kwargs)
+            finally:
+                if _profiling_enabled:
+                    record_timing(name, time.perf_counter() - start_time)
+
+        return async_wrapper
 
     @wraps(func)
     def wrapper(*args, **kwargs):
-        start_time = time.time()  # Start time before function execution
-        result = func(*args, **kwargs)  # Function execution
-        end_time = time.time()  # End time after function execution
-        execution_time = end_time - start_time  # Calculate execution time
-        logger.info(f"Running {func.__name__}: --- {execution_time} seconds ---")
-        return result
+        if not _profiling_enabled and active_profiler() is None:
+            return func(*args, **kwargs)
+        start_time = time.perf_counter()
+        try:
+            with span(span_name):
+                return func(*args, **kwargs)
+        finally:
+            if _profiling_enabled:
+                record_timing(name, time.perf_counter() - start_time)
 
     return wrapper
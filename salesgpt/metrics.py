@@ -0,0 +1,227 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.tracers.context import register_configure_hook
+
+try:
+    import prometheus_client
+except ImportError:  # prometheus_client is optional, metrics are then only returned in the payload
+    prometheus_client = None
+
+# Prometheus export is opt-in and needs the optional prometheus_client package (the "metrics" extra).
+PROMETHEUS_ENABLED = prometheus_client is not None and os.getenv(
+    "PROMETHEUS_METRICS_ENABLED", "False"
+).lower() in ["true", "1", "t"]
+
+
+if PROMETHEUS_ENABLED:
+    LLM_TOKENS = prometheus_client.Counter(
+        "salesgpt_llm_tokens_total", "Tokens used by LLM calls.", ["call", "kind"]
+    )
+    LLM_LATENCY = prometheus_client.Histogram(
+        "salesgpt_llm_latency_seconds", "Latency of LLM calls.", ["call"]
+    )
+    TOOL_LATENCY = prometheus_client.Histogram(
+        "salesgpt_tool_latency_seconds", "Latency of agent tool calls.", ["tool"]
+    )
+    TURN_LATENCY = prometheus_client.Histogram(
+        "salesgpt_turn_latency_seconds", "Latency of a conversation turn."
+    )
+    EXTRACTOR_LATENCY = prometheus_client.Histogram(
+        "salesgpt_trip_json_extraction_seconds", "Latency of the trip JSON extraction."
+    )
+    CACHE_LOOKUPS = prometheus_client.Counter(
+        "salesgpt_cache_lookups_total", "Cache lookups by cache and result.", ["cache", "result"]
+    )
+
+
+class TurnMetrics(BaseCallbackHandler):
+    """
+    Collects token usage and latencies of one conversation turn.
+
+    While `collect_turn_metrics` is active, the handler is added to every LangChain callback manager, so the
+    agent chains, the LLM calls and the tools report to it without passing callbacks around. Calls made outside
+    LangChain, like the LiteLLM and Bedrock helpers of the tools, report through `record_llm_call`.
+    """
+
+    # Recording is cheap, do not hand every event to a thread pool.
+    run_inline = True
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.finished_at: Optional[float] = None
+        self.llm_calls: List[Dict[str, Any]] = []
+        self.tool_calls: List[Dict[str, Any]] = []
+        self.extractor_seconds: Optional[float] = None
+        self.cache_lookups: Dict[str, Dict[str, int]] = {}
+        self._runs: Dict[UUID, tuple] = {}
+
+    def _start(self, run_id: UUID, name: str) -> None:
+        self._runs[run_id] = (name, time.perf_counter())
+
+    def _finish(self, run_id: UUID) -> tuple:
+        name, started = self._runs.pop(run_id, ("unknown", time.perf_counter()))
+        return name, time.perf_counter() - started
+
+    def on_llm_start(
+        self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        self._start(run_id, _llm_name(serialized, kwargs))
+
+    def on_chat_model_start(
+        self, serialized: Dict[str, Any], messages: List[Any], *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        self._start(run_id, _llm_name(serialized, kwargs))
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        name, seconds = self._finish(run_id)
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        self.record_llm_call(
+            name,
+            usage.get("prompt_tokens", usage.get("input_tokens")),
+            usage.get("completion_tokens", usage.get("output_tokens")),
+            seconds,
+        )
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._runs.pop(run_id, None)
+
+    def on_tool_start(
+        self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        self._start(run_id, serialized.get("name", "tool"))
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        name, seconds = self._finish(run_id)
+        self.tool_calls.append({"tool": name, "seconds": seconds})
+        if PROMETHEUS_ENABLED:
+            TOOL_LATENCY.labels(tool=name).observe(seconds)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        name, seconds = self._finish(run_id)
+        self.tool_calls.append({"tool": name, "seconds": seconds, "error": str(error)})
+
+    def record_llm_call(
+        self,
+        name: str,
+        prompt_tokens: Optional[int],
+        completion_tokens: Optional[int],
+        seconds: float,
+    ) -> None:
+        self.llm_calls.append(
+            {
+                "call": name,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "seconds": seconds,
+            }
+        )
+        _export_llm_call(name, prompt_tokens, completion_tokens, seconds)
+
+    def record_cache_lookup(self, cache: str, hit: bool) -> None:
+        counts = self.cache_lookups.setdefault(cache, {"hits": 0, "misses": 0})
+        counts["hits" if hit else "misses"] += 1
+
+    def finish(self) -> "TurnMetrics":
+        self.finished_at = time.perf_counter()
+        if PROMETHEUS_ENABLED:
+            TURN_LATENCY.observe(self.finished_at - self.started_at)
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Returns the metrics as the JSON-serializable `metrics` field of the /chat payload.
+        """
+        end = self.finished_at if self.finished_at is not None else time.perf_counter()
+        return {
+            "turn_seconds": end - self.started_at,
+            "prompt_tokens": sum(call["prompt_tokens"] or 0 for call in self.llm_calls),
+            "completion_tokens": sum(call["completion_tokens"] or 0 for call in self.llm_calls),
+            "llm_calls": list(self.llm_calls),
+            "tool_calls": list(self.tool_calls),
+            "extractor_seconds": self.extractor_seconds,
+            "cache_lookups": {cache: dict(counts) for cache, counts in self.cache_lookups.items()},
+        }
+
+
+_current_turn_metrics: ContextVar[Optional[TurnMetrics]] = ContextVar(
+    "salesgpt_turn_metrics", default=None
+)
+# Adds the active TurnMetrics handler to every callback manager LangChain configures.
+register_configure_hook(_current_turn_metrics, inheritable=True)
+
+
+def _llm_name(serialized: Dict[str, Any], kwargs: Dict[str, Any]) -> str:
+    params = kwargs.get("invocation_params") or {}
+    return params.get("model") or params.get("model_name") or serialized.get("id", ["llm"])[-1]
+
+
+def _export_llm_call(
+    name: str, prompt_tokens: Optional[int], completion_tokens: Optional[int], seconds: float
+) -> None:
+    if not PROMETHEUS_ENABLED:
+        return
+    LLM_LATENCY.labels(call=name).observe(seconds)
+    if prompt_tokens:
+        LLM_TOKENS.labels(call=name, kind="prompt").inc(prompt_tokens)
+    if completion_tokens:
+        LLM_TOKENS.labels(call=name, kind="completion").inc(completion_tokens)
+
+
+@contextmanager
+def collect_turn_metrics() -> Iterator[TurnMetrics]:
+    """
+    Collects the metrics of everything run inside the block, including tasks it starts.
+    """
+    metrics = TurnMetrics()
+    token = _current_turn_metrics.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current_turn_metrics.reset(token)
+        metrics.finish()
+
+
+def current_turn_metrics() -> Optional[TurnMetrics]:
+    return _current_turn_metrics.get()
+
+
+def record_llm_call(
+    name: str, prompt_tokens: Optional[int], completion_tokens: Optional[int], seconds: float
+) -> None:
+    """
+    Records an LLM call made without LangChain, e.g. with LiteLLM or boto3 directly.
+    """
+    metrics = current_turn_metrics()
+    if metrics is not None:
+        metrics.record_llm_call(name, prompt_tokens, completion_tokens, seconds)
+    else:
+        _export_llm_call(name, prompt_tokens, completion_tokens, seconds)
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    """
+    Records a hit or miss of one of the application caches.
+    """
+    metrics = current_turn_metrics()
+    if metrics is not None:
+        metrics.record_cache_lookup(cache, hit)
+    if PROMETHEUS_ENABLED:
+        CACHE_LOOKUPS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+def record_extraction(seconds: float) -> None:
+    """
+    Records the latency of a trip JSON extraction.
+    """
+    metrics = current_turn_metrics()
+    if metrics is not None and metrics.finished_at is None:
+        metrics.extractor_seconds = seconds
+    if PROMETHEUS_ENABLED:
+        EXTRACTOR_LATENCY.observe(seconds)
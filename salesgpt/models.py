@@ -1,16 +1,25 @@
-from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
 
 from langchain_core.callbacks import (
     AsyncCallbackManagerForLLMRun,
     CallbackManagerForLLMRun,
 )
 from langchain_core.language_models import BaseChatModel, SimpleChatModel
+from langchain_core.language_models.chat_models import (
+    agenerate_from_stream,
+    generate_from_stream,
+)
 from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
 from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
 from langchain_core.runnables import run_in_executor
 from langchain_openai import ChatOpenAI
 
-from salesgpt.tools import completion_bedrock
+from salesgpt.tools import (
+    acompletion_bedrock,
+    acompletion_bedrock_stream,
+    completion_bedrock,
+    completion_bedrock_stream,
+)
 
 
 class BedrockCustomModel(ChatOpenAI):
@@ -33,7 +42,29 @@ class BedrockCustomModel(ChatOpenAI):
 
     model: str
     system_prompt: str
-    """The number of characters from the last message of the prompt to be echoed."""
+    max_tokens: Optional[int] = 1000
+    """The maximum number of tokens to generate, unless the caller passes `max_tokens`."""
+    prompt_caching: bool = False
+    """Attach Bedrock prompt-caching markers to the system prompt, including the agent instructions, and the stable conversation prefix."""
+
+    def _bedrock_request(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None, **kwargs: Any
+    ) -> Dict[str, Any]:
+        """Builds the keyword arguments of the `completion_bedrock*` helpers for a LangChain prompt."""
+        system, bedrock_messages = _to_bedrock_messages(
+            messages, self.system_prompt, self.prompt_caching
+        )
+        if stop is None:
+            stop = kwargs.get("stop")
+        if isinstance(stop, str):
+            stop = [stop]
+        return {
+            "model_id": self.model,
+            "system_prompt": system,
+            "messages": bedrock_messages,
+            "max_tokens": kwargs.get("max_tokens") or self.max_tokens or 1000,
+            "stop_sequences": stop,
+        }
 
     def _generate(
         self,
@@ -57,21 +88,14 @@ class BedrockCustomModel(ChatOpenAI):
                   downstream and understand why generation stopped.
             run_manager: A run manager with callbacks for the LLM.
         """
-        last_message = messages[-1]
-
-        print(messages)
-        response = completion_bedrock(
-            model_id=self.model,
-            system_prompt=self.system_prompt,
-            messages=[{"content": last_message.content, "role": "user"}],
-            max_tokens=1000,
-        )
-        print("output", response)
-        content = response["content"][0]["text"]
-        message = AIMessage(content=content)
-        generation = ChatGeneration(message=message)
-        return ChatResult(generations=[generation])
-    
+        if self.streaming:
+            return generate_from_stream(
+                self._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+            )
+
+        response = completion_bedrock(**self._bedrock_request(messages, stop, **kwargs))
+        return _chat_result(response)
+
     async def _agenerate(
         self,
         messages: List[BaseMessage],
@@ -82,61 +106,120 @@ class BedrockCustomModel(ChatOpenAI):
     ) -> ChatResult:
         should_stream = stream if stream is not None else self.streaming
         if should_stream:
-            raise NotImplementedError("Streaming not implemented")
-        
-        last_message = messages[-1]
+            return await agenerate_from_stream(
+                self._astream(messages, stop=stop, run_manager=run_manager, **kwargs)
+            )
 
-        print(messages)
         response = await acompletion_bedrock(
-            model_id=self.model,
-            system_prompt=self.system_prompt,
-            messages=[{"content": last_message.content, "role": "user"}],
-            max_tokens=1000,
-        )
-        print("output", response)
-        content = response["content"][0]["text"]
-        message = AIMessage(content=content)
-        generation = ChatGeneration(message=message)
-        return ChatResult(generations=[generation])
-
-        # message_dicts, params = self._create_message_dicts(messages, stop)
-        # params = {
-        #     **params,
-        #     **({"stream": stream} if stream is not None else {}),
-        #     **kwargs,
-        # }
-        # response = await self.async_client.create(messages=message_dicts, **params)
-        # return self._create_chat_result(response)
-
-import aioboto3
-import os
-import json
-
-async def acompletion_bedrock(model_id, system_prompt, messages, max_tokens=1000):
-    """
-    High-level API call to generate a message with Anthropic Claude, refactored for async.
-    """
-    session = aioboto3.Session()
-    async with session.client(service_name="bedrock-runtime", region_name=os.environ.get("AWS_REGION_NAME")) as bedrock_runtime:
-
-        body = json.dumps(
-            {
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": max_tokens,
-                "system": system_prompt,
-                "messages": messages,
-            }
+            **self._bedrock_request(messages, stop, **kwargs)
         )
+        return _chat_result(response)
 
-        response = await bedrock_runtime.invoke_model(body=body, modelId=model_id)
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        """Stream the reply with Bedrock's invoke_model_with_response_stream, one chunk per text delta."""
+        for text in completion_bedrock_stream(
+            **self._bedrock_request(messages, stop, **kwargs)
+        ):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=text))
+            if run_manager:
+                run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        """Async version of `_stream`."""
+        async for text in acompletion_bedrock_stream(
+            **self._bedrock_request(messages, stop, **kwargs)
+        ):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=text))
+            if run_manager:
+                await run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
+
+
+_BEDROCK_ROLES = {"human": "user", "ai": "assistant"}
+_CACHE_CONTROL = {"type": "ephemeral"}
 
-        # print('RESPONSE', response)
 
-        # Correctly handle the streaming body
-        response_body_bytes = await response['body'].read()
-        # print('RESPONSE BODY', response_body_bytes)
-        response_body = json.loads(response_body_bytes.decode("utf-8"))
-        # print('RESPONSE BODY', response_body)
+def _text_block(text: str, cache: bool = False) -> Dict[str, Any]:
+    block = {"type": "text", "text": text}
+    if cache:
+        block["cache_control"] = dict(_CACHE_CONTROL)
+    return block
 
-        return response_body
 
+def _to_bedrock_messages(
+    messages: List[BaseMessage], system_prompt: str, prompt_caching: bool = False
+) -> Tuple[Any, List[Dict[str, Any]]]:
+    """
+    Maps a LangChain message list to the `system` and `messages` fields of the Anthropic Messages API.
+
+    System messages are appended to `system_prompt`, human and AI messages become `user` and `assistant`
+    turns, and consecutive turns of the same role are merged because Anthropic requires them to alternate.
+    A prompt made only of system messages, like the one SalesGPT streams, is sent as the user turn.
+
+    With `prompt_caching`, the system field is sent as one block per system message and its last block, as
+    well as the turn before the latest one, carry cache points, so Bedrock can reuse the unchanged prefix
+    of the conversation on the next call. SalesGPT sends its static instructions as a system message of
+    their own (see `salesgpt.templates.split_static_prompt`), which puts them into that cached prefix.
+    Bedrock only caches prefixes above a model-specific minimum length. A message can also request a
+    cache point itself through `additional_kwargs["cache_control"]`.
+
+    Args:
+        messages (List[BaseMessage]): The LangChain prompt.
+        system_prompt (str): The model's default system prompt.
+        prompt_caching (bool, optional): Whether to add cache points to the stable prefix.
+
+    Returns:
+        Tuple[Any, List[Dict[str, Any]]]: The `system` field (a string, or content blocks when caching) and the turns.
+    """
+    system_parts = [system_prompt] if system_prompt else []
+    turns: List[Dict[str, Any]] = []
+    for message in messages:
+        content = message.content if isinstance(message.content, str) else str(message.content)
+        role = _BEDROCK_ROLES.get(message.type)
+        if role is None:
+            system_parts.append(content)
+            continue
+        block = _text_block(content)
+        if "cache_control" in message.additional_kwargs:
+            block["cache_control"] = message.additional_kwargs["cache_control"]
+        if turns and turns[-1]["role"] == role:
+            turns[-1]["content"].append(block)
+        else:
+            turns.append({"role": role, "content": [block]})
+
+    if not turns and len(system_parts) > 1:
+        turns.append({"role": "user", "content": [_text_block(system_parts.pop())]})
+    if turns and turns[0]["role"] != "user":
+        turns.insert(0, {"role": "user", "content": [_text_block("(conversation start)")]})
+
+    if not prompt_caching:
+        return "\n\n".join(system_parts), turns
+    if len(turns) > 1:
+        turns[-2]["content"][-1]["cache_control"] = dict(_CACHE_CONTROL)
+    system_blocks = [_text_block(part) for part in system_parts]
+    if system_blocks:
+        system_blocks[-1]["cache_control"] = dict(_CACHE_CONTROL)
+    return system_blocks, turns
+
+
+def _chat_result(response: Dict[str, Any]) -> ChatResult:
+    content = "".join(
+        block.get("text", "") for block in response["content"] if block.get("type") == "text"
+    )
+    generation = ChatGeneration(message=AIMessage(content=content))
+    return ChatResult(
+        generations=[generation], llm_output={"token_usage": response.get("usage", {})}
+    )
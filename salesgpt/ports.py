@@ -0,0 +1,191 @@
+import difflib
+import json
+import os
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# The registry shipped with the package. It only lists location codes verified against Liknoss; set PORTS_FILE
+# to use a registry with more ports.
+DEFAULT_PORTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "ports.json")
+
+# Shortest prefix of a port name that is looked up.
+MIN_PREFIX_LENGTH = 3
+
+# Lowest similarity at which a misspelled name is matched to a port. Fuzzy matches must also start with the
+# same letter and differ in length by at most one character, so "Kythira" is not taken for "Thira".
+FUZZY_CUTOFF = 0.8
+
+# Words that do not identify a port, e.g. in "the port of Rafina".
+FILLER_WORDS = {"the", "port", "of", "island", "harbor", "harbour", "λιμάνι", "νήσος"}
+
+
+def fold(text: str) -> str:
+    """
+    Lowercases `text` and removes accents, so "Άνδρος" and "ανδρος" or "Ραφήνα" and "ραφηνα" compare equal.
+    """
+    text = unicodedata.normalize("NFD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return unicodedata.normalize("NFC", text).replace("ς", "σ")
+
+
+def normalize_port_name(name: str) -> str:
+    """
+    Folds `name` and reduces it to the words that identify the port.
+    """
+    words = re.findall(r"\w+", fold(name))
+    return " ".join(word for word in words if word not in FILLER_WORDS)
+
+
+class Port:
+    """
+    A Liknoss location with the names it is known by.
+    """
+
+    __slots__ = ("code", "name", "names")
+
+    def __init__(self, code: str, name: str, names: Iterable[str] = ()):
+        self.code = code
+        self.name = name
+        self.names = tuple(names)
+
+    def __repr__(self) -> str:
+        return f"Port({self.code!r}, {self.name!r})"
+
+
+class PortMatch:
+    """
+    The result of a port lookup.
+
+    `kind` is "exact", "prefix", "fuzzy" or "unknown". An unknown port has no `port`, only `suggestions`
+    of similar port names.
+    """
+
+    __slots__ = ("port", "kind", "suggestions")
+
+    def __init__(self, port: Optional[Port], kind: str, suggestions: Tuple[str, ...] = ()):
+        self.port = port
+        self.kind = kind
+        self.suggestions = suggestions
+
+    def __bool__(self) -> bool:
+        return self.port is not None
+
+    def __repr__(self) -> str:
+        return f"PortMatch({self.port!r}, {self.kind!r}, {self.suggestions!r})"
+
+
+class UnknownPortError(ValueError):
+    """
+    Raised when a port name matches no port of the registry.
+    """
+
+    def __init__(self, name: str, suggestions: Tuple[str, ...] = ()):
+        self.name = name
+        self.suggestions = suggestions
+        message = f"Unknown port '{name}'."
+        if suggestions:
+            message += f" Did you mean {' or '.join(suggestions)}?"
+        super().__init__(message)
+
+
+class PortRegistry:
+    """
+    Looks up Liknoss locations by code, name, Greek name or alias.
+
+    Names are folded and normalized once when the registry is built. Exact names and codes are found with
+    one dict lookup; other names are tried as the prefix of a single port's name (with a binary search over
+    the sorted names) and finally matched fuzzily, which catches misspellings like "Andors".
+
+    Args:
+        ports (Iterable[Port]): The ports of the registry.
+    """
+
+    def __init__(self, ports: Iterable[Port]):
+        self.ports: List[Port] = list(ports)
+        self._by_code: Dict[str, Port] = {}
+        self._by_name: Dict[str, Port] = {}
+        for port in self.ports:
+            self._by_code[port.code.upper()] = port
+            for name in (port.name, *port.names):
+                key = normalize_port_name(name)
+                if key:
+                    self._by_name.setdefault(key, port)
+        self._sorted_names = sorted(self._by_name)
+
+    @classmethod
+    def from_file(cls, path: str) -> "PortRegistry":
+        """
+        Loads a registry from a JSON list of objects with a `code`, a `name` and optionally other `names`.
+        """
+        with open(path, encoding="utf-8") as f:
+            entries = json.load(f)
+        return cls(Port(entry["code"], entry["name"], entry.get("names", ())) for entry in entries)
+
+    def get(self, code: str) -> Optional[Port]:
+        return self._by_code.get(code.upper())
+
+    def names(self) -> List[str]:
+        """
+        Returns every normalized port name, longest first.
+        """
+        return sorted(self._by_name, key=len, reverse=True)
+
+    def lookup(self, name: str) -> PortMatch:
+        """
+        Finds the port called `name`.
+
+        Returns:
+            PortMatch: The port and how it was found, or an "unknown" match with suggestions.
+        """
+        key = normalize_port_name(name)
+        if not key:
+            return PortMatch(None, "unknown")
+        port = self._by_name.get(key)
+        if port is not None:
+            return PortMatch(port, "exact")
+        port = self._by_code.get(name.strip().upper())
+        if port is not None:
+            return PortMatch(port, "exact")
+
+        if len(key) >= MIN_PREFIX_LENGTH:
+            start = bisect_left(self._sorted_names, key)
+            prefixed = set()
+            for candidate in self._sorted_names[start:]:
+                if not candidate.startswith(key):
+                    break
+                prefixed.add(self._by_name[candidate])
+            if len(prefixed) == 1:
+                return PortMatch(prefixed.pop(), "prefix")
+
+        # Best similarity per port, in descending order.
+        scores: Dict[Port, float] = {}
+        for candidate in difflib.get_close_matches(key, self._sorted_names, n=5, cutoff=FUZZY_CUTOFF):
+            if candidate[0] != key[0] or abs(len(candidate) - len(key)) > 1:
+                continue
+            scores.setdefault(self._by_name[candidate], difflib.SequenceMatcher(None, key, candidate).ratio())
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        if ranked and (len(ranked) == 1 or ranked[0][1] - ranked[1][1] >= 0.1):
+            return PortMatch(ranked[0][0], "fuzzy")
+        return PortMatch(None, "unknown", tuple(port.name for port, _ in ranked))
+
+    def __len__(self) -> int:
+        return len(self.ports)
+
+
+_registry: Optional[PortRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_port_registry() -> PortRegistry:
+    """
+    Returns the process-wide port registry, loaded from PORTS_FILE on first use.
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = PortRegistry.from_file(os.getenv("PORTS_FILE", DEFAULT_PORTS_FILE))
+    return _registry
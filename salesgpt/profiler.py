@@ -0,0 +1,220 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
+
+
+class Span:
+    """
+    One timed section of a profiled request.
+    """
+
+    __slots__ = ("name", "kind", "start", "end", "children")
+
+    def __init__(self, name: str, kind: str):
+        self.name = name
+        self.kind = kind
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.children: List["Span"] = []
+
+    def duration(self, now: float) -> float:
+        return (self.end if self.end is not None else now) - self.start
+
+    def to_dict(self, origin: float, now: float) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "start_ms": (self.start - origin) * 1000,
+            "duration_ms": self.duration(now) * 1000,
+            "finished": self.end is not None,
+            "children": [child.to_dict(origin, now) for child in self.children],
+        }
+
+
+class RequestProfiler(BaseCallbackHandler):
+    """
+    Records a span tree for one request.
+
+    LangChain chains, LLM calls and tools are recorded from their callbacks and nested by their parent run.
+    Our own code adds spans with `span`, which `time_logger` does for every decorated function, so the tree
+    covers `SalesGPTAPI.do`, `SalesGPT.acall`, the agent executor with its LLM calls and tools, and the
+    trip JSON extraction.
+    """
+
+    run_inline = True
+
+    def __init__(self, name: str):
+        self.root = Span(name, "request")
+        self._runs: Dict[UUID, Span] = {}
+        self._lock = threading.Lock()
+
+    def _open(self, parent: Span, name: str, kind: str) -> Span:
+        span = Span(name, kind)
+        with self._lock:
+            parent.children.append(span)
+        return span
+
+    def _start_run(self, run_id: UUID, parent_run_id: Optional[UUID], name: str, kind: str) -> None:
+        parent = self._runs.get(parent_run_id) if parent_run_id else None
+        if parent is None:
+            parent = _current_span.get() or self.root
+        self._runs[run_id] = self._open(parent, name, kind)
+
+    def _end_run(self, run_id: UUID) -> None:
+        span = self._runs.get(run_id)
+        if span is not None:
+            span.end = time.perf_counter()
+
+    def on_chain_start(
+        self,
+        serialized: Dict[str, Any],
+        inputs: Dict[str, Any],
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        self._start_run(run_id, parent_run_id, kwargs.get("name") or _run_name(serialized), "chain")
+
+    def on_chain_end(self, outputs: Dict[str, Any], *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_run(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_run(run_id)
+
+    def on_llm_start(
+        self,
+        serialized: Dict[str, Any],
+        prompts: List[str],
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        self._start_run(run_id, parent_run_id, _run_name(serialized), "llm")
+
+    def on_chat_model_start(
+        self,
+        serialized: Dict[str, Any],
+        messages: List[Any],
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        self._start_run(run_id, parent_run_id, _run_name(serialized), "llm")
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_run(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_run(run_id)
+
+    def on_tool_start(
+        self,
+        serialized: Dict[str, Any],
+        input_str: str,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        self._start_run(run_id, parent_run_id, serialized.get("name", "tool"), "tool")
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_run(run_id)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_run(run_id)
+
+    def finish(self) -> "RequestProfiler":
+        self.root.end = time.perf_counter()
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Returns the span tree with start offsets and durations in milliseconds.
+        """
+        now = time.perf_counter()
+        with self._lock:
+            return self.root.to_dict(self.root.start, now)
+
+    def to_collapsed(self) -> str:
+        """
+        Returns the span tree in the collapsed stack format read by flamegraph.pl, speedscope and inferno.
+
+        Each line is a `;`-separated stack followed by the self time of its last span in microseconds.
+        """
+        now = time.perf_counter()
+        lines: List[str] = []
+
+        def visit(span: Span, stack: str) -> None:
+            path = f"{stack};{span.name}" if stack else span.name
+            children_time = sum(child.duration(now) for child in span.children)
+            self_time = max(span.duration(now) - children_time, 0.0)
+            if self_time:
+                lines.append(f"{path} {int(self_time * 1_000_000)}")
+            for child in span.children:
+                visit(child, path)
+
+        with self._lock:
+            visit(self.root, "")
+        return "\n".join(lines) + "\n"
+
+
+_active_profiler: ContextVar[Optional[RequestProfiler]] = ContextVar(
+    "salesgpt_request_profiler", default=None
+)
+_current_span: ContextVar[Optional[Span]] = ContextVar("salesgpt_profiler_span", default=None)
+# Adds the active profiler to every callback manager LangChain configures.
+register_configure_hook(_active_profiler, inheritable=True)
+
+
+def _run_name(serialized: Dict[str, Any]) -> str:
+    if not serialized:
+        return "run"
+    return serialized.get("name") or serialized.get("id", ["run"])[-1]
+
+
+def active_profiler() -> Optional[RequestProfiler]:
+    return _active_profiler.get()
+
+
+@contextmanager
+def profile_request(name: str) -> Iterator[RequestProfiler]:
+    """
+    Profiles everything run inside the block, including the tasks it starts.
+    """
+    profiler = RequestProfiler(name)
+    profiler_token = _active_profiler.set(profiler)
+    span_token = _current_span.set(profiler.root)
+    try:
+        yield profiler
+    finally:
+        _current_span.reset(span_token)
+        _active_profiler.reset(profiler_token)
+        profiler.finish()
+
+
+@contextmanager
+def span(name: str, kind: str = "function") -> Iterator[Optional[Span]]:
+    """
+    Records the block as a span of the active request profiler. Without one, this does nothing.
+    """
+    profiler = _active_profiler.get()
+    if profiler is None:
+        yield None
+        return
+    current = profiler._open(_current_span.get() or profiler.root, name, kind)
+    token = _current_span.set(current)
+    try:
+        yield current
+    finally:
+        _current_span.reset(token)
+        current.end = time.perf_counter()
@@ -153,3 +153,17 @@ Then output the enriched JSON data only with a key name ex_json.
 
 '''
 
+
+
+HISTORY_SUMMARY_PROMPT = '''
+Summarize the following part of a conversation between a travel agent and a customer.
+Keep every fact that matters for planning the trip: destinations, dates, number of travellers, budget,
+preferences, and the decisions taken. Leave out greetings and itinerary details that were repeated later.
+
+{previous_summary}
+Conversation:
+===
+{conversation}
+===
+
+Summary:'''
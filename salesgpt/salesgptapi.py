@@ -1,13 +1,155 @@
 import asyncio
 import json
+import os
 import re
+import threading
+import time
+from typing import Dict, Optional, Tuple
 
 from langchain_community.chat_models import BedrockChat, ChatLiteLLM
 from langchain_openai import ChatOpenAI
 
 from salesgpt.agents import SalesGPT
+from salesgpt.logger import time_logger
+from salesgpt.metrics import PROMETHEUS_ENABLED, collect_turn_metrics, record_extraction
 from salesgpt.models import BedrockCustomModel
 
+# Built agents are shared by every session with the same settings, see `get_agent_template`.
+# Each entry also records the config file mtime the template was built from.
+_agent_templates: Dict[Tuple, Tuple[Optional[float], SalesGPT]] = {}
+_agent_templates_lock = threading.Lock()
+
+
+def build_llm(model_name: str, max_tokens: int = 2000):
+    """
+    Creates the chat model used by the agent for the given model name.
+
+    Args:
+        model_name (str): The model name, Anthropic models are served through Bedrock.
+        max_tokens (int, optional): The maximum number of tokens to generate. Defaults to 2000.
+
+    Returns:
+        The LangChain chat model.
+    """
+    if "anthropic" in model_name:
+        return BedrockCustomModel(
+            type="bedrock-model",
+            model=model_name,
+            system_prompt="You are a helpful assistant.",
+            max_tokens=max_tokens,
+            prompt_caching=os.getenv("BEDROCK_PROMPT_CACHING", "False").lower()
+            in ["true", "1"],
+        )
+    return ChatLiteLLM(temperature=0.2, max_tokens=max_tokens, model=model_name)
+
+
+def build_agent(
+    llm,
+    config_path: str,
+    verbose: bool = True,
+    product_catalog: str = "examples/sample_product_catalog.txt",
+    use_tools: bool = True,
+) -> SalesGPT:
+    """
+    Builds and seeds a SalesGPT agent from the JSON agent config.
+
+    Args:
+        llm: The chat model used by the agent chains.
+        config_path (str): Path to the JSON agent config, or an empty string for the default config.
+        verbose (bool, optional): Verbosity of the agent chains. Defaults to True.
+        product_catalog (str, optional): Path to the product catalog used by the tools.
+        use_tools (bool, optional): Whether the agent uses tools. Defaults to True.
+
+    Returns:
+        SalesGPT: The seeded agent.
+    """
+    config = {"verbose": verbose}
+    if config_path:
+        with open(config_path, "r") as f:
+            config.update(json.load(f))
+        if verbose:
+            print(f"Loaded agent config: {config}")
+    else:
+        print("Default agent config in use")
+
+    if use_tools:
+        print("USING TOOLS")
+        config.update(
+            {
+                "use_tools": True,
+                "product_catalog": product_catalog,
+                "salesperson_name": "X"
+                if not config_path
+                else config.get("salesperson_name", "X"),
+            }
+        )
+
+    sales_agent = SalesGPT.from_llm(llm, **config)
+
+    print(f"SalesGPT use_tools: {sales_agent.use_tools}")
+    sales_agent.seed_agent()
+    return sales_agent
+
+
+def _config_mtime(config_path: str) -> Optional[float]:
+    if not config_path:
+        return None
+    try:
+        return os.path.getmtime(config_path)
+    except OSError:
+        return None
+
+
+def get_agent_template(
+    config_path: str,
+    verbose: bool = True,
+    model_name: str = "gpt-3.5-turbo",
+    product_catalog: str = "examples/sample_product_catalog.txt",
+    use_tools: bool = True,
+    max_tokens: int = 2000,
+) -> SalesGPT:
+    """
+    Returns the process-wide agent template for the given settings, building it on first use.
+
+    The template owns the LLM client, chains, tools and agent executor. It is never used for a conversation
+    directly; sessions are created from it with `SalesGPT.spawn`, which only allocates conversation state.
+    The template is rebuilt when the modification time of `config_path` changes, so edits to the agent config
+    are picked up by new sessions without a restart. Existing sessions keep the template they were spawned from.
+
+    Returns:
+        SalesGPT: The shared agent template.
+    """
+    key = (config_path, verbose, model_name, product_catalog, use_tools, max_tokens)
+    mtime = _config_mtime(config_path)
+    entry = _agent_templates.get(key)
+    if entry is not None and entry[0] == mtime:
+        return entry[1]
+    with _agent_templates_lock:
+        entry = _agent_templates.get(key)
+        if entry is None or entry[0] != mtime:
+            llm = build_llm(model_name, max_tokens=max_tokens)
+            template = build_agent(
+                llm,
+                config_path,
+                verbose=verbose,
+                product_catalog=product_catalog,
+                use_tools=use_tools,
+            )
+            entry = (mtime, template)
+            _agent_templates[key] = entry
+    return entry[1]
+
+
+def clear_agent_templates():
+    """
+    Drops all cached agent templates so that the next session rebuilds them.
+
+    This is the explicit reload hook for changes the config mtime does not reveal, e.g. a different
+    `CONFIG_PATH` or updated environment variables.
+    """
+    with _agent_templates_lock:
+        _agent_templates.clear()
+
 
 class SalesGPTAPI:
     def __init__(
@@ -19,55 +161,60 @@ class SalesGPTAPI:
         model_name: str = "gpt-3.5-turbo",
         product_catalog: str = "examples/sample_product_catalog.txt",
         use_tools=True,
+        background_trip_json: bool = True,
     ):
         self.max_tokens = max_tokens
         self.config_path = config_path
         self.verbose = verbose
         self.max_num_turns = max_num_turns
         self.model_name = model_name
-        if "anthropic" in model_name:
-            self.llm = BedrockCustomModel(
-                type="bedrock-model",
-                model=model_name,
-                system_prompt="You are a helpful assistant.",
-            )
-        else:
-            self.llm = ChatLiteLLM(temperature=0.2, max_tokens=2000, model=model_name)
         self.product_catalog = product_catalog
         self.conversation_history = []
         self.use_tools = use_tools
         self.sales_agent = self.initialize_agent()
+        self.llm = self.sales_agent.sales_conversation_utterance_chain.llm
         self.current_turn = 0
+        self.background_trip_json = background_trip_json
+        self.trip_json_task: Optional[asyncio.Task] = None
 
     def initialize_agent(self):
-        config = {"verbose": self.verbose}
-        if self.config_path:
-            with open(self.config_path, "r") as f:
-                config.update(json.load(f))
-            if self.verbose:
-                print(f"Loaded agent config: {config}")
-        else:
-            print("Default agent config in use")
-
-        if self.use_tools:
-            print("USING TOOLS")
-            config.update(
-                {
-                    "use_tools": True,
-                    "product_catalog": self.product_catalog,
-                    "salesperson_name": "X"
-                    if not self.config_path
-                    else config.get("salesperson_name", "X"),
-                }
-            )
+        """
+        Creates the conversation for this session from the shared agent template.
+        """
+        template = get_agent_template(
+            self.config_path,
+            verbose=self.verbose,
+            model_name=self.model_name,
+            product_catalog=self.product_catalog,
+            use_tools=self.use_tools,
+            max_tokens=self.max_tokens,
+        )
+        return template.spawn()
+
+    @time_logger
+    async def do(self, human_input=None, include_metrics: bool = False):
+        """
+        Runs one turn of the conversation and returns the reply payload.
+
+        The turn's metrics are only collected when they are requested or exported to Prometheus, because the
+        collecting callback handler takes the chains off their no-callbacks fast path.
 
-        sales_agent = SalesGPT.from_llm(self.llm, **config)
+        Args:
+            human_input (str, optional): The user's message for this turn.
+            include_metrics (bool, optional): Add the turn's token usage and latencies under "metrics".
 
-        print(f"SalesGPT use_tools: {sales_agent.use_tools}")
-        sales_agent.seed_agent()
-        return sales_agent
+        Returns:
+            dict: The reply payload.
+        """
+        if not (include_metrics or PROMETHEUS_ENABLED):
+            return await self._do(human_input)
+        with collect_turn_metrics() as metrics:
+            payload = await self._do(human_input)
+        if include_metrics and isinstance(payload, dict):
+            payload["metrics"] = metrics.to_dict()
+        return payload
 
-    async def do(self, human_input=None):
+    async def _do(self, human_input=None):
         self.current_turn += 1
         current_turns = self.current_turn
         if current_turns >= self.max_num_turns:
@@ -81,7 +228,10 @@ class SalesGPTAPI:
             self.sales_agent.human_step(human_input)
 
         ai_log = await self.sales_agent.astep(stream=False)
-        await self.sales_agent.aextract_trip_json()
+        if self.background_trip_json:
+            self.schedule_trip_json_extraction()
+        else:
+            await self._timed_trip_json_extraction()
         # TODO - handle end of conversation in the API - send a special token to the client?
         if self.verbose:
             print("=" * 10)
@@ -144,6 +294,7 @@ class SalesGPTAPI:
             "response": ": ".join(reply.split(": ")[1:]).rstrip("<END_OF_TURN>"),
             # "conversational_stage": self.sales_agent.current_conversation_stage,
             "extract_trip_json": self.sales_agent.extracted_trip_json_data,
+            "extract_trip_json_pending": self.trip_json_pending(),
             "tool": tool,
             "tool_input": tool_input,
             "action_output": action_output,
@@ -152,36 +303,118 @@ class SalesGPTAPI:
         }
         return payload
 
-    async def do_stream(self, conversation_history: [str], human_input=None):
-        # TODO
-        current_turns = len(conversation_history) + 1
-        if current_turns >= self.max_num_turns:
-            print("Maximum number of turns reached - ending the conversation.")
-            yield [
-                "BOT",
-                "In case you'll have any questions - just text me one more time!",
-            ]
-            raise StopAsyncIteration
+    def schedule_trip_json_extraction(self) -> asyncio.Task:
+        """
+        Starts the trip JSON extraction for the current conversation history in the background.
+
+        The extraction is a second LLM call over the conversation, so it runs after the reply has been returned.
+        A still running extraction from an earlier turn is cancelled, its result would be outdated.
 
-        self.sales_agent.seed_agent()
-        self.sales_agent.conversation_history = conversation_history
+        Returns:
+            asyncio.Task: The extraction task, see `get_trip_json` for its result.
+        """
+        if self.trip_json_task is not None and not self.trip_json_task.done():
+            self.trip_json_task.cancel()
+        self.trip_json_task = asyncio.create_task(self._extract_trip_json())
+        return self.trip_json_task
+
+    async def _timed_trip_json_extraction(self):
+        started = time.perf_counter()
+        try:
+            return await self.sales_agent.aextract_trip_json()
+        finally:
+            record_extraction(time.perf_counter() - started)
+
+    async def _extract_trip_json(self):
+        try:
+            await self._timed_trip_json_extraction()
+        except Exception as e:
+            print(f"Error extracting trip JSON: {e}")
+        return self.sales_agent.extracted_trip_json_data
+
+    def trip_json_pending(self) -> bool:
+        """
+        Returns whether a trip JSON extraction is still running for this session.
+        """
+        return self.trip_json_task is not None and not self.trip_json_task.done()
+
+    async def get_trip_json(self, wait: bool = True, timeout: Optional[float] = None):
+        """
+        Returns the latest extracted trip JSON of the session.
+
+        Args:
+            wait (bool, optional): Wait for a running extraction to finish first. Defaults to True.
+            timeout (float, optional): Maximum time to wait in seconds, `None` waits until it finishes.
+
+        Returns:
+            dict: The trip JSON under "extract_trip_json" and whether an extraction is still "pending".
+        """
+        task = self.trip_json_task
+        if wait and task is not None and not task.done():
+            try:
+                # Shield the task, a client that gives up waiting must not cancel the extraction.
+                await asyncio.wait_for(asyncio.shield(task), timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                pass
+        return {
+            "extract_trip_json": self.sales_agent.extracted_trip_json_data,
+            "pending": self.trip_json_pending(),
+        }
+
+    async def do_stream(self, human_input=None):
+        """
+        Streams the agent's reply to `human_input` using this session's conversation history.
+
+        Yields one event per text delta, `{"token": ...}`, followed by a final event with the complete reply
+        in the same shape as the `do` payload plus `"done": True` and `"end_of_call"`. The reply is added to
+        the session history when the stream completes. A last `{"extract_trip_json": ...}` event follows once
+        the trip JSON has been extracted from the updated history.
+
+        Streaming uses the conversation chain directly, so tools are not run for streamed turns.
+
+        Args:
+            human_input (str, optional): The user's message for this turn.
+
+        Yields:
+            dict: The streamed events.
+        """
+        self.current_turn += 1
+        if self.current_turn >= self.max_num_turns:
+            print("Maximum number of turns reached - ending the conversation.")
+            message = "In case you'll have any questions - just text me one more time!"
+            yield {"token": message}
+            yield {
+                "done": True,
+                "bot_name": "BOT",
+                "response": message,
+                "end_of_call": True,
+                "model_name": self.model_name,
+            }
+            return
 
         if human_input is not None:
             self.sales_agent.human_step(human_input)
 
-        stream_gen = self.sales_agent.astep(stream=True)
-        for model_response in stream_gen:
-            for choice in model_response.choices:
-                message = choice["delta"]["content"]
-                if message is not None:
-                    if "<END_OF_CALL>" in message:
-                        print(
-                            "Sales Agent determined it is time to end the conversation."
-                        )
-                        yield [
-                            "BOT",
-                            "In case you'll have any questions - just text me one more time!",
-                        ]
-                    yield message
-                else:
-                    continue
+        async for token in self.sales_agent.astream_step():
+            yield {"token": token}
+
+        reply = self.sales_agent.conversation_history[-1]
+        end_of_call = "<END_OF_CALL>" in reply
+        if end_of_call:
+            print("Sales Agent determined it is time to end the conversation.")
+            reply = reply.replace("<END_OF_CALL>", "<END_OF_TURN>")
+            self.sales_agent.conversation_history[-1] = reply
+        yield {
+            "done": True,
+            "bot_name": reply.split(": ")[0],
+            "response": ": ".join(reply.split(": ")[1:]).replace("<END_OF_TURN>", "").strip(),
+            "end_of_call": end_of_call,
+            "model_name": self.model_name,
+        }
+
+        # The reply is complete, push the trip JSON as a last event once its extraction finishes.
+        if self.background_trip_json:
+            yield {"extract_trip_json": await self.schedule_trip_json_extraction()}
+        else:
+            await self._timed_trip_json_extraction()
+            yield {"extract_trip_json": self.sales_agent.extracted_trip_json_data}
@@ -0,0 +1,231 @@
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, Optional
+
+
+# Rough footprint of one `SalesGPTAPI` session. The chains, tools and agent executor are shared through the
+# agent template, so a session only owns a shallow SalesGPT copy; its transcript is counted on top of this.
+DEFAULT_SESSION_OVERHEAD_BYTES = 16 * 1024
+
+
+class BaseSessionStore(ABC):
+    """
+    Interface for the stores that keep per-user conversation sessions.
+
+    The API keeps one session object per `session_id`. Implementations decide where the sessions live and
+    when they are dropped, so the FastAPI handlers only ever use `get`, `set` and `delete`.
+    """
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[Any]:
+        """
+        Returns the session for `session_id`, or None if it does not exist or was evicted.
+        """
+
+    @abstractmethod
+    def set(self, session_id: str, session: Any) -> None:
+        """
+        Stores `session` under `session_id`, replacing any previous session.
+        """
+
+    @abstractmethod
+    def delete(self, session_id: str) -> bool:
+        """
+        Removes the session for `session_id` and returns whether it existed.
+        """
+
+    def __contains__(self, session_id: str) -> bool:
+        return self.get(session_id) is not None
+
+    def __getitem__(self, session_id: str) -> Any:
+        session = self.get(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        return session
+
+    def __setitem__(self, session_id: str, session: Any) -> None:
+        self.set(session_id, session)
+
+    def __delitem__(self, session_id: str) -> None:
+        if not self.delete(session_id):
+            raise KeyError(session_id)
+
+
+class InMemorySessionStore(BaseSessionStore):
+    """
+    Bounded in-process session store with LRU and idle-TTL eviction.
+
+    Sessions are kept in access order. On every write the store first drops sessions that have been idle
+    for longer than `ttl_seconds`, then evicts the least recently used sessions until both the session
+    count and the estimated memory are back under their limits.
+
+    Args:
+        max_sessions (int, optional): Maximum number of live sessions. `None` or `0` disables the limit.
+        ttl_seconds (float, optional): Idle time after which a session expires. `None` or `0` disables expiry.
+        max_bytes (int, optional): Upper bound for the sum of `sizeof(session)`. `None` or `0` disables the limit.
+        sizeof (Callable[[Any], int], optional): Estimates the memory held by a session, in bytes.
+        clock (Callable[[], float], optional): Monotonic time source, injectable for tests.
+    """
+
+    def __init__(
+        self,
+        max_sessions: Optional[int] = 1000,
+        ttl_seconds: Optional[float] = 3600,
+        max_bytes: Optional[int] = None,
+        sizeof: Optional[Callable[[Any], int]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_sessions = max_sessions or None
+        self.ttl_seconds = ttl_seconds or None
+        self.max_bytes = max_bytes or None
+        self.sizeof = sizeof or (lambda session: 0)
+        self.clock = clock
+        self._sessions: "OrderedDict[str, Any]" = OrderedDict()
+        self._last_access: Dict[str, float] = {}
+        self._sizes: Dict[str, int] = {}
+        self._total_bytes = 0
+        self._lock = threading.RLock()
+        self._metrics = {
+            "hits": 0,
+            "misses": 0,
+            "created": 0,
+            "evicted_lru": 0,
+            "evicted_ttl": 0,
+            "evicted_memory": 0,
+            "deleted": 0,
+        }
+
+    def get(self, session_id: str) -> Optional[Any]:
+        with self._lock:
+            self._expire()
+            session = self._sessions.get(session_id)
+            if session is None:
+                self._metrics["misses"] += 1
+                return None
+            self._sessions.move_to_end(session_id)
+            self._last_access[session_id] = self.clock()
+            self._metrics["hits"] += 1
+            return session
+
+    def set(self, session_id: str, session: Any) -> None:
+        with self._lock:
+            if session_id not in self._sessions:
+                self._metrics["created"] += 1
+            self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            self._last_access[session_id] = self.clock()
+            size = self.sizeof(session)
+            self._total_bytes += size - self._sizes.get(session_id, 0)
+            self._sizes[session_id] = size
+            self._expire()
+            self._enforce_limits()
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            if session_id not in self._sessions:
+                return False
+            self._remove(session_id)
+            self._metrics["deleted"] += 1
+            return True
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            return iter(list(self._sessions))
+
+    def __contains__(self, session_id: str) -> bool:
+        # Membership checks must not count as a cache hit or refresh the LRU position.
+        with self._lock:
+            self._expire()
+            return session_id in self._sessions
+
+    def clear(self) -> None:
+        with self._lock:
+            self._sessions.clear()
+            self._last_access.clear()
+            self._sizes.clear()
+            self._total_bytes = 0
+
+    def memory_usage(self) -> int:
+        """
+        Returns the estimated memory held by all live sessions, in bytes.
+
+        Sizes are measured when a session is written, so callers that mutate a session in place should
+        `set` it again afterwards to keep the estimate current.
+        """
+        with self._lock:
+            return self._total_bytes
+
+    def metrics(self) -> Dict[str, int]:
+        """
+        Returns a snapshot of the store counters together with the current size and memory estimate.
+        """
+        with self._lock:
+            snapshot = dict(self._metrics)
+            snapshot["sessions"] = len(self._sessions)
+            snapshot["memory_bytes"] = self.memory_usage()
+            return snapshot
+
+    def _remove(self, session_id: str) -> None:
+        self._sessions.pop(session_id, None)
+        self._last_access.pop(session_id, None)
+        self._total_bytes -= self._sizes.pop(session_id, 0)
+
+    def _expire(self) -> None:
+        if self.ttl_seconds is None:
+            return
+        deadline = self.clock() - self.ttl_seconds
+        # The OrderedDict is kept in access order, so expired sessions are always at the front.
+        while self._sessions:
+            oldest = next(iter(self._sessions))
+            if self._last_access[oldest] > deadline:
+                break
+            self._remove(oldest)
+            self._metrics["evicted_ttl"] += 1
+
+    def _enforce_limits(self) -> None:
+        if self.max_sessions is not None:
+            while len(self._sessions) > self.max_sessions:
+                self._remove(next(iter(self._sessions)))
+                self._metrics["evicted_lru"] += 1
+        if self.max_bytes is not None:
+            # Never evict the session that was just written, even if it alone exceeds the budget.
+            while self._total_bytes > self.max_bytes and len(self._sessions) > 1:
+                self._remove(next(iter(self._sessions)))
+                self._metrics["evicted_memory"] += 1
+
+
+def estimate_session_size(
+    sales_api: Any, overhead_bytes: int = DEFAULT_SESSION_OVERHEAD_BYTES
+) -> int:
+    """
+    Estimates the memory held by a `SalesGPTAPI` session, in bytes.
+
+    The estimate is a fixed per-session overhead for the agent objects plus the in-memory size of the
+    conversation history strings and the extracted trip JSON, which keep growing over the session's lifetime.
+
+    Args:
+        sales_api (Any): The session object, normally a `SalesGPTAPI`.
+        overhead_bytes (int, optional): Fixed cost of the session's agent objects.
+
+    Returns:
+        int: The estimated size of the session in bytes.
+    """
+    sales_agent = getattr(sales_api, "sales_agent", None)
+    if sales_agent is None:
+        return overhead_bytes
+    history = sales_agent.conversation_history
+    size = overhead_bytes + sys.getsizeof(history)
+    size += sum(sys.getsizeof(turn) for turn in history)
+    # A `ConversationHistory` also holds the joined history text.
+    joined_text = getattr(history, "text", None)
+    if isinstance(joined_text, str):
+        size += sys.getsizeof(joined_text)
+    size += sys.getsizeof(sales_agent.extracted_trip_json_data)
+    return size
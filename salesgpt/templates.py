@@ -1,6 +1,28 @@
-from typing import Callable
+from typing import Callable, Tuple
 
 from langchain.prompts.base import StringPromptTemplate
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.prompt_values import ChatPromptValue, PromptValue, StringPromptValue
+
+# The agent prompts are the same for every turn up to this line; the conversation history follows it.
+CONVERSATION_HISTORY_MARKER = "Previous conversation history:"
+
+
+def split_static_prompt(prompt: str) -> Tuple[str, str]:
+    """
+    Splits a formatted agent prompt into its static instructions and the part that changes every turn.
+
+    Sending the instructions as their own system message keeps the start of every request identical, so the
+    LLM provider can cache it (see `BedrockCustomModel.prompt_caching`). A prompt without the
+    `CONVERSATION_HISTORY_MARKER` line has no static part.
+
+    Returns:
+        Tuple[str, str]: The instructions, or an empty string, and the rest of the prompt.
+    """
+    index = prompt.find(CONVERSATION_HISTORY_MARKER)
+    if index <= 0 or not prompt[:index].strip():
+        return "", prompt
+    return prompt[:index].strip(), prompt[index:]
 
 
 class CustomPromptTemplateForTools(StringPromptTemplate):
@@ -29,3 +51,12 @@ class CustomPromptTemplateForTools(StringPromptTemplate):
         # Create a list of tool names for the tools provided
         kwargs["tool_names"] = ", ".join([tool.name for tool in tools])
         return self.template.format(**kwargs)
+
+    def format_prompt(self, **kwargs) -> PromptValue:
+        # Chat models get the static instructions and the conversation as separate messages.
+        instructions, conversation = split_static_prompt(self.format(**kwargs))
+        if not instructions:
+            return StringPromptValue(text=conversation)
+        return ChatPromptValue(
+            messages=[SystemMessage(content=instructions), HumanMessage(content=conversation)]
+        )
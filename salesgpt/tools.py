@@ -1,59 +1,112 @@
+import asyncio
+import difflib
+import hashlib
+import itertools
 import json
 import os
+import re
+import threading
+import time
 import glob
-import boto3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Optional
 import requests
 from langchain.agents import Tool
 from langchain.chains import RetrievalQA
-from langchain.text_splitter import CharacterTextSplitter
 from langchain_community.chat_models import BedrockChat
-from langchain.vectorstores import Chroma
-from langchain_community.vectorstores import Chroma
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from litellm import completion
+from langchain_openai import ChatOpenAI
+from litellm import acompletion, completion
 import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 
+from salesgpt.clients import (
+    aget_bedrock_client,
+    get_async_http_client,
+    get_bedrock_client,
+    run_blocking,
+)
+from salesgpt.cache import SingleFlightCache, TTLCache
+from salesgpt.knowledge_base import (
+    DEFAULT_INDEX_DIR,
+    VectorIndexRetriever,
+    get_embeddings,
+    get_index,
+    read_catalog,
+)
+from salesgpt.metrics import record_cache_lookup, record_llm_call
+from salesgpt.ports import UnknownPortError, get_port_registry
+from salesgpt.trip_query import parse_trip_query
+from salesgpt.trips import (
+    TripsParser,
+    merge_trips,
+    parse_trips,
+    render_trips,
+    trips_from_response_data,
+)
+
 def setup_knowledge_base(
-    combined_product_catalog: str, model_name: str = "gpt-3.5-turbo"
+    combined_product_catalog: str,
+    model_name: str = "gpt-3.5-turbo",
+    embeddings=None,
+    index_dir: Optional[str] = None,
 ):
     """
     We assume that the product catalog is simply a text string.
+
+    The catalog is searched through a prebuilt index (see `salesgpt.knowledge_base`) that is shared by all
+    agents of the process, so it is embedded once per catalog rather than once per session.
+
+    Args:
+        combined_product_catalog (str): The product catalog text.
+        model_name (str, optional): Unused, kept for compatibility.
+        embeddings (Embeddings, optional): Embedding function, by default the one set in KNOWLEDGE_BASE_EMBEDDINGS.
+        index_dir (str, optional): Directory of the prebuilt indexes, by default KNOWLEDGE_BASE_INDEX_DIR.
+
+    Returns:
+        RetrievalQA: The question answering chain over the catalog.
     """
-    # Split the combined product catalog into smaller chunks
-    text_splitter = CharacterTextSplitter(chunk_size=3000, chunk_overlap=500)
-    texts = text_splitter.split_text(combined_product_catalog)
+    embeddings = embeddings or get_embeddings()
+    index = get_index(combined_product_catalog, embeddings, index_dir or DEFAULT_INDEX_DIR)
 
     llm = ChatOpenAI(model_name="gpt-4-0125-preview", temperature=0)
 
-    embeddings = OpenAIEmbeddings()
-    docsearch = Chroma.from_texts(
-        texts, embeddings, collection_name="product-knowledge-base"
-    )
-
     knowledge_base = RetrievalQA.from_chain_type(
-        llm=llm, chain_type="stuff", retriever=docsearch.as_retriever()
+        llm=llm,
+        chain_type="stuff",
+        retriever=VectorIndexRetriever(index=index, embeddings=embeddings),
     )
     return knowledge_base
 
 
-def completion_bedrock(model_id, system_prompt, messages, max_tokens=1000):
+def _bedrock_body(system_prompt, messages, max_tokens, stop_sequences=None):
+    """
+    Serializes an Anthropic Messages API request for Bedrock.
+
+    `system_prompt` is either a plain string or a list of content blocks, which lets callers attach
+    prompt-caching markers to the static part of the prompt.
+    """
+    request = {
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": max_tokens,
+        "system": system_prompt,
+        "messages": messages,
+    }
+    if stop_sequences:
+        request["stop_sequences"] = list(stop_sequences)
+    return json.dumps(request)
+
+
+def completion_bedrock(
+    model_id, system_prompt, messages, max_tokens=1000, stop_sequences=None
+):
     """
     High-level API call to generate a message with Anthropic Claude.
     """
-    bedrock_runtime = boto3.client(
-        service_name="bedrock-runtime", region_name=os.environ.get("AWS_REGION_NAME")
-    )
+    bedrock_runtime = get_bedrock_client()
 
-    body = json.dumps(
-        {
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": max_tokens,
-            "system": system_prompt,
-            "messages": messages,
-        }
-    )
+    body = _bedrock_body(system_prompt, messages, max_tokens, stop_sequences)
 
     response = bedrock_runtime.invoke_model(body=body, modelId=model_id)
     response_body = json.loads(response.get("body").read())
@@ -61,10 +114,251 @@ def completion_bedrock(model_id, system_prompt, messages, max_tokens=1000):
     return response_body
 
 
-def get_product_id_from_query(query, product_price_id_mapping_path):
-    # Load product_price_id_mapping from a JSON file
-    with open(product_price_id_mapping_path, "r") as f:
-        product_price_id_mapping = json.load(f)
+async def acompletion_bedrock(
+    model_id, system_prompt, messages, max_tokens=1000, stop_sequences=None
+):
+    """
+    High-level API call to generate a message with Anthropic Claude, refactored for async.
+    """
+    bedrock_runtime = await aget_bedrock_client()
+
+    body = _bedrock_body(system_prompt, messages, max_tokens, stop_sequences)
+
+    response = await bedrock_runtime.invoke_model(body=body, modelId=model_id)
+
+    # Correctly handle the streaming body
+    response_body_bytes = await response['body'].read()
+    response_body = json.loads(response_body_bytes.decode("utf-8"))
+
+    return response_body
+
+
+def _bedrock_stream_text(event):
+    """Returns the text delta carried by one Bedrock response-stream event, if any."""
+    chunk = event.get("chunk")
+    if not chunk:
+        return None
+    data = json.loads(chunk["bytes"])
+    if data.get("type") == "content_block_delta":
+        return data.get("delta", {}).get("text")
+    return None
+
+
+def completion_bedrock_stream(
+    model_id, system_prompt, messages, max_tokens=1000, stop_sequences=None
+):
+    """
+    Streams a message from Anthropic Claude on Bedrock, yielding the text deltas as they arrive.
+    """
+    bedrock_runtime = get_bedrock_client()
+
+    body = _bedrock_body(system_prompt, messages, max_tokens, stop_sequences)
+
+    response = bedrock_runtime.invoke_model_with_response_stream(body=body, modelId=model_id)
+    for event in response["body"]:
+        text = _bedrock_stream_text(event)
+        if text:
+            yield text
+
+
+async def acompletion_bedrock_stream(
+    model_id, system_prompt, messages, max_tokens=1000, stop_sequences=None
+):
+    """
+    Async version of `completion_bedrock_stream`.
+    """
+    bedrock_runtime = await aget_bedrock_client()
+
+    body = _bedrock_body(system_prompt, messages, max_tokens, stop_sequences)
+
+    response = await bedrock_runtime.invoke_model_with_response_stream(body=body, modelId=model_id)
+    async for event in response["body"]:
+        text = _bedrock_stream_text(event)
+        if text:
+            yield text
+
+
+def _record_litellm_usage(response, started):
+    usage = getattr(response, "usage", None)
+    record_llm_call(
+        "tool_prompt",
+        getattr(usage, "prompt_tokens", None),
+        getattr(usage, "completion_tokens", None),
+        time.perf_counter() - started,
+    )
+
+
+def _record_bedrock_usage(response, started):
+    usage = response.get("usage", {})
+    record_llm_call(
+        "tool_prompt",
+        usage.get("input_tokens"),
+        usage.get("output_tokens"),
+        time.perf_counter() - started,
+    )
+
+
+def complete_prompt(prompt, max_tokens=1000, temperature=0.2):
+    """
+    Sends a single-message prompt to the configured GPT_MODEL and returns the text of the reply.
+    """
+    model_name = os.getenv("GPT_MODEL", "gpt-3.5-turbo-1106")
+    started = time.perf_counter()
+    if "anthropic" in model_name:
+        response = completion_bedrock(
+            model_id=model_name,
+            system_prompt="You are a helpful assistant.",
+            messages=[{"content": prompt, "role": "user"}],
+            max_tokens=max_tokens,
+        )
+        _record_bedrock_usage(response, started)
+        return response["content"][0]["text"]
+    response = completion(
+        model=model_name,
+        messages=[{"content": prompt, "role": "user"}],
+        max_tokens=max_tokens,
+        temperature=temperature,
+    )
+    _record_litellm_usage(response, started)
+    return response.choices[0].message.content.strip()
+
+
+async def acomplete_prompt(prompt, max_tokens=1000, temperature=0.2):
+    """
+    Async version of `complete_prompt` that does not block the event loop.
+    """
+    model_name = os.getenv("GPT_MODEL", "gpt-3.5-turbo-1106")
+    started = time.perf_counter()
+    if "anthropic" in model_name:
+        response = await acompletion_bedrock(
+            model_id=model_name,
+            system_prompt="You are a helpful assistant.",
+            messages=[{"content": prompt, "role": "user"}],
+            max_tokens=max_tokens,
+        )
+        _record_bedrock_usage(response, started)
+        return response["content"][0]["text"]
+    response = await acompletion(
+        model=model_name,
+        messages=[{"content": prompt, "role": "user"}],
+        max_tokens=max_tokens,
+        temperature=temperature,
+    )
+    _record_litellm_usage(response, started)
+    return response.choices[0].message.content.strip()
+
+
+# Parsed product price id mappings by path, as (modification time, mapping, content hash).
+_product_price_mappings = {}
+_product_price_mappings_lock = threading.Lock()
+
+# LLM price id decisions by normalized query and mapping hash.
+_product_id_cache = TTLCache(
+    max_entries=int(os.getenv("PRODUCT_ID_CACHE_SIZE", 1024)),
+    ttl_seconds=float(os.getenv("PRODUCT_ID_CACHE_TTL_SECONDS", 3600)),
+)
+
+# Lowest similarity at which a query is matched to a product name without asking the LLM.
+PRODUCT_MATCH_CUTOFF = 0.85
+
+
+def load_product_price_mapping(product_price_id_mapping_path):
+    """
+    Returns the product to price id mapping stored at `product_price_id_mapping_path` and a hash of its content.
+
+    The file is parsed once and only read again when its modification time changes.
+    """
+    mtime = os.stat(product_price_id_mapping_path).st_mtime_ns
+    with _product_price_mappings_lock:
+        cached = _product_price_mappings.get(product_price_id_mapping_path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1], cached[2]
+    with open(product_price_id_mapping_path, "rb") as f:
+        content = f.read()
+    mapping = json.loads(content)
+    digest = hashlib.sha256(content).hexdigest()
+    with _product_price_mappings_lock:
+        _product_price_mappings[product_price_id_mapping_path] = (mtime, mapping, digest)
+    return mapping, digest
+
+
+def normalize_product_query(query):
+    """Lowercases `query` and reduces it to words separated by single spaces."""
+    return " ".join(re.findall(r"[a-z0-9]+", query.lower()))
+
+
+def match_product_price_id(query, product_price_id_mapping):
+    """
+    Finds the price id of the product named in `query` without the LLM.
+
+    A product matches when its normalized name appears in the query, or when a run of query words of the same
+    length is at least `PRODUCT_MATCH_CUTOFF` similar to it, which catches small misspellings. A name that is
+    part of a longer matching name is ignored. Only a single clear match is returned.
+
+    Returns:
+        str: The price id, or None if no product or more than one product matches.
+    """
+    words = normalize_product_query(query).split()
+    padded_query = f" {' '.join(words)} "
+    exact = {}
+    fuzzy = {}
+    for product, price_id in product_price_id_mapping.items():
+        name = normalize_product_query(product)
+        if not name:
+            continue
+        if f" {name} " in padded_query:
+            exact[name] = price_id
+            continue
+        size = len(name.split())
+        score = max(
+            difflib.SequenceMatcher(None, name, " ".join(words[i : i + size])).ratio()
+            for i in range(max(len(words) - size + 1, 1))
+        )
+        if score >= PRODUCT_MATCH_CUTOFF:
+            fuzzy[name] = (score, price_id)
+    if exact:
+        names = [name for name in exact if not any(name != other and f" {name} " in f" {other} " for other in exact)]
+        price_ids = {exact[name] for name in names}
+        return price_ids.pop() if len(price_ids) == 1 else None
+    price_ids = {price_id for _, price_id in fuzzy.values()}
+    if len(price_ids) == 1:
+        return price_ids.pop()
+    return None
+
+
+def _product_id_lookup(query, product_price_id_mapping_path):
+    """
+    Resolves `query` from the mapping or the decision cache.
+
+    Returns:
+        tuple: The price id JSON or None if the LLM has to decide, and the key its decision is cached under.
+    """
+    mapping, digest = load_product_price_mapping(product_price_id_mapping_path)
+    price_id = match_product_price_id(query, mapping)
+    if price_id is not None:
+        return json.dumps({"price_id": price_id}), None
+    key = (normalize_product_query(query), digest)
+    cached = _product_id_cache.get(key)
+    record_cache_lookup("product_id", cached is not None)
+    return cached, key
+
+
+def _cache_product_id(key, price_id, product_price_id_mapping_path):
+    """
+    Caches an LLM price id decision, if it is valid JSON naming a price id of the mapping. Malformed and
+    "no relevant product" answers are not cached, so the next call asks the LLM again.
+    """
+    try:
+        decision = json.loads(price_id)
+    except (json.JSONDecodeError, TypeError):
+        return
+    mapping, _ = load_product_price_mapping(product_price_id_mapping_path)
+    if isinstance(decision, dict) and decision.get("price_id") in set(mapping.values()):
+        _product_id_cache.set(key, price_id)
+
+
+def build_product_id_prompt(query, product_price_id_mapping_path):
+    product_price_id_mapping, _ = load_product_price_mapping(product_price_id_mapping_path)
 
     # Serialize the product_price_id_mapping to a JSON string for inclusion in the prompt
     product_price_id_mapping_json_str = json.dumps(product_price_id_mapping)
@@ -99,42 +393,44 @@ def get_product_id_from_query(query, product_price_id_mapping_path):
     Return a valid directly parsable json, dont return in it within a code snippet or add any kind of explanation!!
     """
     prompt += "{"
-    model_name = os.getenv("GPT_MODEL", "gpt-3.5-turbo-1106")
+    return prompt
 
-    if "anthropic" in model_name:
-        response = completion_bedrock(
-            model_id=model_name,
-            system_prompt="You are a helpful assistant.",
-            messages=[{"content": prompt, "role": "user"}],
-            max_tokens=1000,
-        )
 
-        product_id = response["content"][0]["text"]
+def get_product_id_from_query(query, product_price_id_mapping_path):
+    """
+    Returns the price id JSON for the product named in `query`.
+
+    Product names found in the query are resolved locally; other queries go to the LLM and its decision, if
+    it names a known price id, is cached for the query and the current content of the mapping.
+    """
+    price_id, key = _product_id_lookup(query, product_price_id_mapping_path)
+    if price_id is not None:
+        return price_id
+    prompt = build_product_id_prompt(query, product_price_id_mapping_path)
+    price_id = complete_prompt(prompt, max_tokens=1000, temperature=0)
+    _cache_product_id(key, price_id, product_price_id_mapping_path)
+    return price_id
 
-    else:
-        response = completion(
-            model=model_name,
-            messages=[{"content": prompt, "role": "user"}],
-            max_tokens=1000,
-            temperature=0,
-        )
-        product_id = response.choices[0].message.content.strip()
-    return product_id
 
+async def aget_product_id_from_query(query, product_price_id_mapping_path):
+    """
+    Async version of `get_product_id_from_query`.
+    """
+    price_id, key = _product_id_lookup(query, product_price_id_mapping_path)
+    if price_id is not None:
+        return price_id
+    prompt = build_product_id_prompt(query, product_price_id_mapping_path)
+    price_id = await acomplete_prompt(prompt, max_tokens=1000, temperature=0)
+    _cache_product_id(key, price_id, product_price_id_mapping_path)
+    return price_id
 
-def generate_stripe_payment_link(query: str) -> str:
-    """Generate a stripe payment link for a customer based on a single query string."""
 
+def _payment_link_request(query: str, price_id: str):
+    """Builds the URL, headers and body of the payment gateway request for a price id returned by the LLM."""
     # example testing payment gateway url
     PAYMENT_GATEWAY_URL = os.getenv(
         "PAYMENT_GATEWAY_URL", "https://agent-payments-gateway.vercel.app/payment"
     )
-    PRODUCT_PRICE_MAPPING = os.getenv(
-        "PRODUCT_PRICE_MAPPING", "example_product_price_id_mapping.json"
-    )
-
-    # use LLM to get the price_id from query
-    price_id = get_product_id_from_query(query, PRODUCT_PRICE_MAPPING)
     price_id = json.loads(price_id)
     payload = json.dumps(
         {"prompt": query, **price_id, "stripe_key": os.getenv("STRIPE_API_KEY")}
@@ -142,13 +438,38 @@ def generate_stripe_payment_link(query: str) -> str:
     headers = {
         "Content-Type": "application/json",
     }
+    return PAYMENT_GATEWAY_URL, headers, payload
+
+
+def generate_stripe_payment_link(query: str) -> str:
+    """Generate a stripe payment link for a customer based on a single query string."""
+    PRODUCT_PRICE_MAPPING = os.getenv(
+        "PRODUCT_PRICE_MAPPING", "example_product_price_id_mapping.json"
+    )
+
+    # use LLM to get the price_id from query
+    price_id = get_product_id_from_query(query, PRODUCT_PRICE_MAPPING)
+    url, headers, payload = _payment_link_request(query, price_id)
 
     response = requests.request(
-        "POST", PAYMENT_GATEWAY_URL, headers=headers, data=payload
+        "POST", url, headers=headers, data=payload
     )
     return response.text
 
-def get_mail_body_subject_from_query(query):
+
+async def agenerate_stripe_payment_link(query: str) -> str:
+    """Async version of `generate_stripe_payment_link`."""
+    PRODUCT_PRICE_MAPPING = os.getenv(
+        "PRODUCT_PRICE_MAPPING", "example_product_price_id_mapping.json"
+    )
+
+    price_id = await aget_product_id_from_query(query, PRODUCT_PRICE_MAPPING)
+    url, headers, payload = _payment_link_request(query, price_id)
+
+    response = await get_async_http_client().post(url, headers=headers, content=payload)
+    return response.text
+
+def build_mail_prompt(query):
     prompt = f"""
     Given the query: "{query}", analyze the content and extract the necessary information to send an email. The information needed includes the recipient's email address, the subject of the email, and the body content of the email. 
     Based on the analysis, return a dictionary in Python format where the keys are 'recipient', 'subject', and 'body', and the values are the corresponding pieces of information extracted from the query. 
@@ -161,26 +482,17 @@ def get_mail_body_subject_from_query(query):
     Now, based on the provided query, return the structured information as described.
     Return a valid directly parsable json, dont return in it within a code snippet or add any kind of explanation!!
     """
-    model_name = os.getenv("GPT_MODEL", "gpt-3.5-turbo-1106")
+    return prompt
 
-    if "anthropic" in model_name:
-        response = completion_bedrock(
-            model_id=model_name,
-            system_prompt="You are a helpful assistant.",
-            messages=[{"content": prompt, "role": "user"}],
-            max_tokens=1000,
-        )
 
-        mail_body_subject = response["content"][0]["text"]
+def get_mail_body_subject_from_query(query):
+    mail_body_subject = complete_prompt(build_mail_prompt(query), max_tokens=1000, temperature=0.2)
+    print(mail_body_subject)
+    return mail_body_subject
 
-    else:
-        response = completion(
-            model=model_name,
-            messages=[{"content": prompt, "role": "user"}],
-            max_tokens=1000,
-            temperature=0.2,
-        )
-        mail_body_subject = response.choices[0].message.content.strip()
+
+async def aget_mail_body_subject_from_query(query):
+    mail_body_subject = await acomplete_prompt(build_mail_prompt(query), max_tokens=1000, temperature=0.2)
     print(mail_body_subject)
     return mail_body_subject
 
@@ -220,8 +532,23 @@ def send_email_tool(query):
     return result
 
 
-def generate_calendly_invitation_link(query):
-    '''Generate a calendly invitation link based on the single query string'''
+async def asend_email_with_gmail(email_details):
+    """Async version of `send_email_with_gmail`, smtplib is blocking so it runs in a worker thread."""
+    return await run_blocking(send_email_with_gmail, email_details)
+
+
+async def asend_email_tool(query):
+    '''Async version of `send_email_tool`'''
+    email_details = await aget_mail_body_subject_from_query(query)
+    if isinstance(email_details, str):
+        email_details = json.loads(email_details)  # Ensure it's a dictionary
+    print("EMAIL DETAILS")
+    print(email_details)
+    return await asend_email_with_gmail(email_details)
+
+
+def _calendly_request():
+    '''Builds the URL, body and headers of the Calendly scheduling link request'''
     event_type_uuid = os.getenv("CALENDLY_EVENT_UUID")
     api_key = os.getenv('CALENDLY_API_KEY')
     headers = {
@@ -234,28 +561,33 @@ def generate_calendly_invitation_link(query):
     "owner": f"https://api.calendly.com/event_types/{event_type_uuid}",
     "owner_type": "EventType"
     }
-    
-    
-    response = requests.post(url, json=payload, headers=headers)
-    if response.status_code == 201:
-        data = response.json()
+    return url, payload, headers
+
+
+def _calendly_result(status_code, data):
+    if status_code == 201:
         return f"url: {data['resource']['booking_url']}"
     else:
         return "Failed to create Calendly link: "
 
 
-def extract_trip_info_from_query(query):
-    """
-    Use the LLM to extract trip information from the query.
-    Returns a dictionary with keys:
-    - departureDate
-    - departureTime
-    - origin
-    - destination
-    - passengers
-    - vehicles
-    - pets
-    """
+def generate_calendly_invitation_link(query):
+    '''Generate a calendly invitation link based on the single query string'''
+    url, payload, headers = _calendly_request()
+    response = requests.post(url, json=payload, headers=headers)
+    data = response.json() if response.status_code == 201 else None
+    return _calendly_result(response.status_code, data)
+
+
+async def agenerate_calendly_invitation_link(query):
+    '''Async version of `generate_calendly_invitation_link`'''
+    url, payload, headers = _calendly_request()
+    response = await get_async_http_client().post(url, json=payload, headers=headers)
+    data = response.json() if response.status_code == 201 else None
+    return _calendly_result(response.status_code, data)
+
+
+def build_trip_info_prompt(query):
     prompt = f"""
     You are a helpful assistant that extracts trip information from user's queries.
 
@@ -284,23 +616,10 @@ def extract_trip_info_from_query(query):
     Return a valid directly parsable JSON, don't return it within a code snippet or add any kind of explanation!!
     """
 
-    model_name = os.getenv("GPT_MODEL", "gpt-3.5-turbo-1106")
-    if "anthropic" in model_name:
-        response = completion_bedrock(
-            model_id=model_name,
-            system_prompt="You are a helpful assistant.",
-            messages=[{"content": prompt, "role": "user"}],
-            max_tokens=500,
-        )
-        trip_info_str = response["content"][0]["text"]
-    else:
-        response = completion(
-            model=model_name,
-            messages=[{"content": prompt, "role": "user"}],
-            max_tokens=500,
-            temperature=0.2,
-        )
-        trip_info_str = response.choices[0].message.content.strip()
+    return prompt
+
+
+def parse_trip_info(trip_info_str):
     print(trip_info_str)
     # Now parse the JSON
     try:
@@ -310,31 +629,106 @@ def extract_trip_info_from_query(query):
         return None
     return trip_info
 
+
+def extract_trip_info_from_query(query):
+    """
+    Extract trip information from the query, with the rule-based `parse_trip_query` when it understands
+    the query and with the LLM otherwise.
+    Returns a dictionary with keys:
+    - departureDate
+    - departureTime
+    - origin
+    - destination
+    - passengers
+    - vehicles
+    - pets
+    """
+    trip_info = parse_trip_query(query)
+    if trip_info is not None:
+        return trip_info
+    trip_info_str = complete_prompt(build_trip_info_prompt(query), max_tokens=500, temperature=0.2)
+    return parse_trip_info(trip_info_str)
+
+
+async def aextract_trip_info_from_query(query):
+    """
+    Async version of `extract_trip_info_from_query`.
+    """
+    trip_info = parse_trip_query(query)
+    if trip_info is not None:
+        return trip_info
+    trip_info_str = await acomplete_prompt(build_trip_info_prompt(query), max_tokens=500, temperature=0.2)
+    return parse_trip_info(trip_info_str)
+
 def get_port_code(port_name):
-    # Simplify port_name
-    port_name = port_name.strip().title()
-    port_codes = {
-        'Rafina': 'RAF',
-        'Andros': 'AND',
-        'Athens': 'ATH',
-        'Santorini': 'SAN',
-        # Add more mappings as required
-    }
-    return port_codes.get(port_name, 'RAF')  # default to 'RAF' if not found
+    """
+    Returns the Liknoss location code of `port_name`, looked up in the port registry (see `salesgpt.ports`).
 
-def fetch_from_endpoint(query):
-    print(f"Fetching trips with query: {query}")
-    trip_info = extract_trip_info_from_query(query)
-    if not trip_info:
-        return "Could not extract trip information from query."
-    # Map origin and destination to codes
-    origin_code = get_port_code(trip_info.get('origin', 'Rafina'))
-    destination_code = get_port_code(trip_info.get('destination', 'Andros'))
+    Raises:
+        UnknownPortError: If no port of the registry matches the name.
+    """
+    match = get_port_registry().lookup(port_name)
+    if match.port is None:
+        raise UnknownPortError(port_name, match.suggestions)
+    return match.port.code
+
+LIKNOSS_TRIPS_URL = "https://gds.liknoss.com/cws/resources/web-services/v200/b2b/list-of-trips"
+# Bytes read from the list-of-trips response at a time while it is decoded.
+TRIP_RESPONSE_CHUNK_SIZE = 64 * 1024
+
+LIKNOSS_HEADERS = {
+    'agency-code': '1000',
+    'Content-Type': 'application/json',
+    'agency-user-name': 'TASOS',
+    'agency-password': 'TLYK',
+    'agency-signature': '31353135',
+    'language-code': 'en'
+}
+
+
+# Trip search results by `trip_search_key`. Popular routes are answered from here; expired results are
+# still served for TRIP_SEARCH_CACHE_STALE_SECONDS while one background request refreshes them.
+_trip_search_cache = SingleFlightCache(
+    "trip_search",
+    ttl_seconds=float(os.getenv("TRIP_SEARCH_CACHE_TTL_SECONDS", 120)),
+    stale_seconds=float(os.getenv("TRIP_SEARCH_CACHE_STALE_SECONDS", 600)),
+    max_entries=int(os.getenv("TRIP_SEARCH_CACHE_SIZE", 512)),
+)
+
+
+class TripSearchError(Exception):
+    """A failed Liknoss trip search. The message is the observation returned to the agent."""
+
+
+def trip_search_key(trip_info):
+    """
+    Returns the fields of a trip search as a tuple: origin code, destination code, date, time, passengers,
+    vehicles and pets.
+
+    Raises:
+        UnknownPortError: If the origin or destination is not a known port.
+    """
+    return (
+        get_port_code(trip_info.get('origin', 'Rafina')),
+        get_port_code(trip_info.get('destination', 'Andros')),
+        trip_info.get('departureDate', '2024-11-31'),
+        trip_info.get('departureTime', ''),
+        int(trip_info.get('passengers', 1)),
+        int(trip_info.get('vehicles', 0)),
+        int(trip_info.get('pets', 0)),
+    )
+
+
+def build_trip_search_payload(trip_info):
+    """Builds the Liknoss list-of-trips request body from the extracted trip information or its search key."""
+    if isinstance(trip_info, dict):
+        trip_info = trip_search_key(trip_info)
+    origin_code, destination_code, departure_date, departure_time, passengers, vehicles, pets = trip_info
     # Construct the payload
     payload_data = [
         {
-            "departureDate": trip_info.get('departureDate', '2024-11-31'),
-            "departureTime": trip_info.get('departureTime', ''),
+            "departureDate": departure_date,
+            "departureTime": departure_time,
             "originIdOrCode": origin_code,
             "destinationIdOrCode": destination_code,
             "company": {
@@ -343,152 +737,376 @@ def fetch_from_endpoint(query):
             "sorting": "BY_DEPARTURE_TIME",
             "availabilityInformation": True,
             "quoteRequest": {
-                "passengers": int(trip_info.get('passengers', 1)),
-                "vehicles": int(trip_info.get('vehicles', 0)),
-                "pets": int(trip_info.get('pets', 0))
+                "passengers": passengers,
+                "vehicles": vehicles,
+                "pets": pets
             }
         }
     ]
-    payload = json.dumps(payload_data)
+    return json.dumps(payload_data)
 
-    url = "https://gds.liknoss.com/cws/resources/web-services/v200/b2b/list-of-trips"
-    headers = {
-        'agency-code': '1000',
-        'Content-Type': 'application/json',
-        'agency-user-name': 'TASOS',
-        'agency-password': 'TLYK',
-        'agency-signature': '31353135',
-        'language-code': 'en'
-    }
-
-    response = requests.request("POST", url, headers=headers, data=payload)
 
+def _check_trips_status(status_code):
     # Check for HTTP errors
-    if response.status_code != 200:
-        print(f"API request failed with status code {response.status_code}")
-        return "Failed to fetch trips due to a network error."
+    if status_code != 200:
+        print(f"API request failed with status code {status_code}")
+        raise TripSearchError("Failed to fetch trips due to a network error.")
+
+
+def _parse_failed(e):
+    print(f"Failed to parse response JSON: {e}")
+    return TripSearchError("Failed to parse response from the endpoint.")
+
+
+def search_trips(key):
+    """
+    Searches the Liknoss trips for a `trip_search_key` and returns the parsed trips.
+
+    The response body is decoded while it streams in (see `salesgpt.trips.TripsParser`).
+
+    Raises:
+        TripSearchError: If the request fails or the response cannot be parsed.
+    """
+    payload = build_trip_search_payload(key)
+    with requests.request(
+        "POST", LIKNOSS_TRIPS_URL, headers=LIKNOSS_HEADERS, data=payload, stream=True
+    ) as response:
+        _check_trips_status(response.status_code)
+        try:
+            result = parse_trips(response.iter_content(chunk_size=TRIP_RESPONSE_CHUNK_SIZE))
+        except ValueError as e:
+            raise _parse_failed(e)
+    return result
+
+
+async def asearch_trips(key):
+    """
+    Async version of `search_trips`.
+    """
+    payload = build_trip_search_payload(key)
+    async with get_async_http_client().stream(
+        "POST", LIKNOSS_TRIPS_URL, headers=LIKNOSS_HEADERS, content=payload
+    ) as response:
+        _check_trips_status(response.status_code)
+        parser = TripsParser()
+        try:
+            async for chunk in response.aiter_bytes(TRIP_RESPONSE_CHUNK_SIZE):
+                parser.feed(chunk)
+            result = parser.close()
+        except ValueError as e:
+            raise _parse_failed(e)
+    return result
+
+
+def format_trips_response(response_data):
+    """Turns a decoded Liknoss list-of-trips response into the observation returned to the agent."""
+    return render_trips(trips_from_response_data(response_data))
+
 
-    # Parse the response JSON
+def fetch_from_endpoint(query):
+    print(f"Fetching trips with query: {query}")
+    trip_info = extract_trip_info_from_query(query)
+    if not trip_info:
+        return "Could not extract trip information from query."
     try:
-        response_data = response.json()
-    except json.JSONDecodeError:
-        print("Failed to parse response JSON.")
-        return "Failed to parse response from the endpoint."
-
-    # Check if 'tripsWithDictionary' is present
-    trips_with_dict_list = response_data.get("tripsWithDictionary", [])
-    if not trips_with_dict_list:
-        print("No 'tripsWithDictionary' key in response data.")
-        return "No trips found for the given query."
-
-    trip_info_list = []
-
-    for trips_with_dict in trips_with_dict_list:
-        trips = trips_with_dict.get("trips", [])
-        companies = trips_with_dict.get("companies", {})
-        locations = trips_with_dict.get("locations", {})
-
-        if not trips:
-            continue  # Skip if no trips
-
-        for trip in trips:
-            # Extract basic trip details
-            departure_datetime = trip.get("departureDateTime", "N/A")
-            arrival_datetime = trip.get("arrivalDateTime", "N/A")
-            origin_code = trip.get("origin", {}).get("idOrCode", "")
-            destination_code = trip.get("destination", {}).get("idOrCode", "")
-
-            # Get location names
-            origin_name = locations.get(origin_code, {}).get("name", origin_code)
-            destination_name = locations.get(destination_code, {}).get("name", destination_code)
-
-            # Get vessel and company information
-            vessel_code = trip.get("vessel", {}).get("idOrCode", "")
-            company_abbr = trip.get("vessel", {}).get("company", {}).get("abbreviation", "")
-
-            company_info = companies.get(company_abbr, {})
-            company_name = company_info.get("name", company_abbr)
-
-            vessel_name = company_info.get("vessels", {}).get(vessel_code, {}).get("name", vessel_code)
-
-            # Extract basic price (convert from cents to euros)
-            basic_price = trip.get("basicPrice", "N/A")
-            if basic_price != "N/A":
-                basic_price_eur = float(basic_price) / 100  # Convert cents to euros
-                basic_price_eur = f"{basic_price_eur:.2f}€"
-            else:
-                basic_price_eur = "N/A"
-
-            # Build trip info dictionary
-            trip_info = {
-                'Company': company_name,
-                'Ferry': vessel_name,
-                'Origin': origin_name,
-                'Destination': destination_name,
-                'DepartureTime': departure_datetime,
-                'ArrivalTime': arrival_datetime,
-                'Price': basic_price_eur  # Price in Euros as a string
-            }
+        key = trip_search_key(trip_info)
+    except UnknownPortError as e:
+        return f"{e} Ask the customer for the port they want to travel from or to."
+    try:
+        return render_trips(_trip_search_cache.get_or_load(key, lambda: search_trips(key)))
+    except TripSearchError as e:
+        return str(e)
+
+
+async def afetch_from_endpoint(query):
+    print(f"Fetching trips with query: {query}")
+    trip_info = await aextract_trip_info_from_query(query)
+    if not trip_info:
+        return "Could not extract trip information from query."
+    try:
+        key = trip_search_key(trip_info)
+    except UnknownPortError as e:
+        return f"{e} Ask the customer for the port they want to travel from or to."
+    try:
+        return render_trips(await _trip_search_cache.aget_or_load(key, lambda: asearch_trips(key)))
+    except TripSearchError as e:
+        return str(e)
+
 
-            trip_info_list.append(trip_info)
+# Most Liknoss searches a batch search makes, and how many of them are in flight at once.
+TRIP_BATCH_MAX_SEARCHES = int(os.getenv("TRIP_BATCH_MAX_SEARCHES", 12))
+TRIP_SEARCH_CONCURRENCY = int(os.getenv("TRIP_SEARCH_CONCURRENCY", 4))
 
-    if not trip_info_list:
-        return json.dumps({"error": "No trips available for the selected criteria."})
+# Fields of a batch search that may list several values, one search is made for every combination.
+TRIP_SEARCH_LIST_FIELDS = ("origin", "destination", "departureDate")
 
-    # Return the trip information as a JSON-formatted string
-    return json.dumps({"trips": trip_info_list}, indent=2)
+_TRIP_SEARCH_SEPARATOR = re.compile(r"[;\n]+")
+
+
+def build_trip_searches_prompt(query):
+    prompt = f"""
+    You are a helpful assistant that extracts ferry trip searches from user's queries.
+
+    The query may ask for several routes or dates, for example to compare islands or to find the cheapest day.
+    Return a JSON list with one object per route and these keys:
+    - origin (city or port name)
+    - destination (city or port name, or a list of them)
+    - departureDate (format YYYY-MM-DD, or a list of dates for a range of days)
+    - departureTime (if specified, in HH:MM format)
+    - passengers
+    - vehicles
+    - pets
+
+    Today is {date.today().isoformat()}. If any of the information is not specified, use default values:
+    - departureDate: today's date in YYYY-MM-DD format
+    - departureTime: empty string
+    - origin: 'Rafina'
+    - destination: 'Andros'
+    - passengers: 1
+    - vehicles: 0
+    - pets: 0
+
+    User's query: "{query}"
+
+    Return a valid directly parsable JSON, don't return it within a code snippet or add any kind of explanation!!
+    """
+
+    return prompt
+
+
+def expand_trip_searches(searches):
+    """
+    Turns batch searches, whose origin, destination and departureDate may be lists, into one trip information
+    dictionary (see `extract_trip_info_from_query`) per combination of their values.
+    """
+    if isinstance(searches, dict):
+        searches = [searches]
+    if not isinstance(searches, list):
+        return []
+    trip_infos = []
+    for search in searches:
+        if not isinstance(search, dict):
+            continue
+        options = [
+            value if isinstance(value, list) else [value]
+            for value in (search.get(field) for field in TRIP_SEARCH_LIST_FIELDS)
+        ]
+        for combination in itertools.product(*options):
+            trip_info = dict(search)
+            for field, value in zip(TRIP_SEARCH_LIST_FIELDS, combination):
+                if value is None:
+                    trip_info.pop(field, None)
+                else:
+                    trip_info[field] = value
+            trip_infos.append(trip_info)
+    return trip_infos
+
+
+def parse_trip_searches(searches_str):
+    try:
+        searches = json.loads(searches_str)
+    except json.JSONDecodeError as e:
+        print(f"Error parsing trip searches: {e}")
+        return None
+    return expand_trip_searches(searches) or None
+
+
+def _trip_searches_without_llm(query):
+    """
+    Returns the searches of a batch search query written as JSON, or with every ';' or line separated part
+    understood by `parse_trip_query`, and None otherwise.
+    """
+    if query.lstrip().startswith(("[", "{")):
+        return parse_trip_searches(query)
+    trip_infos = []
+    for part in _TRIP_SEARCH_SEPARATOR.split(query):
+        if not part.strip():
+            continue
+        trip_info = parse_trip_query(part)
+        if trip_info is None:
+            return None
+        trip_infos.append(trip_info)
+    return trip_infos or None
+
+
+def extract_trip_searches_from_query(query):
+    """
+    Extract the trip searches of a batch search query, without the LLM when the query is JSON or every
+    ';' or line separated part of it is a single search `parse_trip_query` understands.
+    Returns a list of trip information dictionaries with the keys of `extract_trip_info_from_query`.
+    """
+    trip_infos = _trip_searches_without_llm(query)
+    if trip_infos is not None:
+        return trip_infos
+    searches_str = complete_prompt(build_trip_searches_prompt(query), max_tokens=1000, temperature=0.2)
+    return parse_trip_searches(searches_str)
+
+
+async def aextract_trip_searches_from_query(query):
+    """
+    Async version of `extract_trip_searches_from_query`.
+    """
+    trip_infos = _trip_searches_without_llm(query)
+    if trip_infos is not None:
+        return trip_infos
+    searches_str = await acomplete_prompt(build_trip_searches_prompt(query), max_tokens=1000, temperature=0.2)
+    return parse_trip_searches(searches_str)
+
+
+def trip_search_keys(trip_infos):
+    """
+    Returns the distinct `trip_search_key`s of a batch search, at most TRIP_BATCH_MAX_SEARCHES of them, and
+    notes on the searches that are not made.
+    """
+    keys, notes = [], []
+    for trip_info in trip_infos:
+        try:
+            keys.append(trip_search_key(trip_info))
+        except UnknownPortError as e:
+            notes.append(str(e))
+    keys = list(dict.fromkeys(keys))
+    if len(keys) > TRIP_BATCH_MAX_SEARCHES:
+        notes.append(f"Only the first {TRIP_BATCH_MAX_SEARCHES} of {len(keys)} searches were made.")
+        keys = keys[:TRIP_BATCH_MAX_SEARCHES]
+    return keys, notes
+
+
+def _cached_search_trips(key):
+    try:
+        return _trip_search_cache.get_or_load(key, lambda: search_trips(key))
+    except TripSearchError as e:
+        return e
+
+
+def search_trips_batch(keys):
+    """
+    Searches the trips of several `trip_search_key`s, at most TRIP_SEARCH_CONCURRENCY at a time. Every search
+    goes through the trip search cache.
+
+    Returns:
+        list: The TripsResult, or the TripSearchError, of each key.
+    """
+    if len(keys) <= 1:
+        return [_cached_search_trips(key) for key in keys]
+    with ThreadPoolExecutor(max_workers=min(TRIP_SEARCH_CONCURRENCY, len(keys))) as executor:
+        return list(executor.map(_cached_search_trips, keys))
+
+
+async def asearch_trips_batch(keys):
+    """
+    Async version of `search_trips_batch`.
+    """
+    semaphore = asyncio.Semaphore(TRIP_SEARCH_CONCURRENCY)
+
+    async def search(key):
+        async with semaphore:
+            try:
+                return await _trip_search_cache.aget_or_load(key, lambda: asearch_trips(key))
+            except TripSearchError as e:
+                return e
+
+    return await asyncio.gather(*[search(key) for key in keys])
+
+
+def _trip_search_label(key):
+    origin_code, destination_code, departure_date, departure_time = key[:4]
+    registry = get_port_registry()
+    label = f"{registry.get(origin_code).name} -> {registry.get(destination_code).name} {departure_date}"
+    return f"{label} {departure_time}" if departure_time else label
+
+
+def format_trip_batch_response(keys, outcomes, notes=()):
+    """
+    Turns the outcomes of a batch search into one observation: a line per search with its number of trips
+    or its error, then the cheapest trips of all searches together.
+    """
+    lines = list(notes)
+    for key, outcome in zip(keys, outcomes):
+        if isinstance(outcome, Exception):
+            status = str(outcome)
+        elif not outcome.found:
+            status = "no trips found"
+        else:
+            status = f"{len(outcome.trips)} trips"
+        lines.append(f"{_trip_search_label(key)}: {status}")
+    merged = merge_trips(outcome for outcome in outcomes if not isinstance(outcome, Exception))
+    if merged.trips:
+        lines.append(render_trips(merged, order="price"))
+    return "\n".join(lines)
+
+
+def fetch_trips_batch(query):
+    print(f"Fetching trips for several routes or dates with query: {query}")
+    trip_infos = extract_trip_searches_from_query(query)
+    if not trip_infos:
+        return "Could not extract trip searches from query."
+    keys, notes = trip_search_keys(trip_infos)
+    if not keys:
+        return "\n".join(notes + ["Ask the customer for the ports they want to travel from or to."])
+    return format_trip_batch_response(keys, search_trips_batch(keys), notes)
+
+
+async def afetch_trips_batch(query):
+    print(f"Fetching trips for several routes or dates with query: {query}")
+    trip_infos = await aextract_trip_searches_from_query(query)
+    if not trip_infos:
+        return "Could not extract trip searches from query."
+    keys, notes = trip_search_keys(trip_infos)
+    if not keys:
+        return "\n".join(notes + ["Ask the customer for the ports they want to travel from or to."])
+    return format_trip_batch_response(keys, await asearch_trips_batch(keys), notes)
 
 
 def get_tools(product_files):
-    # Combine content from all product files
-    # if not os.path.isdir(product_files):
-    #     # raise ValueError(f"{product_files} is not a valid directory")
-    #     return False
-    #     # Combine content from all product files
-    # combined_product_catalog = ""
-    # print("Reading product files...")  # Debugging line
-    # product_files = glob.glob(os.path.join(product_files, "*"))
-    # for product_file in product_files:
-    #     print(f"Reading file: {product_file}")  # Debugging line
-    #     if not os.path.isfile(product_file):
-    #         print(f"File not found: {product_file}")  # Debugging line
-    #         continue  # Skip the missing file
-    #     try:
-    #         with open(product_file, "r") as f:
-    #             combined_product_catalog += f.read() + "\n"
-    #     except Exception as e:
-    #         print(f"Error reading file {product_file}: {e}")  # Debugging line
-
-    # Initialize knowledge base with the combined content
-    # knowledge_base = setup_knowledge_base(combined_product_catalog)
     tools = [
         Tool(
             name="EndpointFetch",
             func=fetch_from_endpoint,
+            coroutine=afetch_from_endpoint,
             description="Fetch ferry trip information based on user request. Input should include departure date, origin, destination, number of passengers, etc.",
         ),
-        # Tool(
-        #     name="ProductSearch",
-        #     func=knowledge_base.run,
-        #     description="useful for when you need to answer questions about product information or services offered, availability and their costs.",
-        # ),
+        Tool(
+            name="BatchTripSearch",
+            func=fetch_trips_batch,
+            coroutine=afetch_trips_batch,
+            description="Compare ferry trips over several routes or dates in one step, e.g. to find the cheapest day or island. Input should list the searches one per line, each with departure date, origin, destination, number of passengers, etc.",
+        ),
         Tool(
             name="GeneratePaymentLink",
             func=generate_stripe_payment_link,
+            coroutine=agenerate_stripe_payment_link,
             description="useful to close a transaction with a customer. You need to include product name and quantity and customer name in the query input.",
         ),
         Tool(
             name="SendEmail",
             func=send_email_tool,
+            coroutine=asend_email_tool,
             description="Sends an email based on the query input. The query should specify the recipient, subject, and body of the email.",
         ),
         Tool(
             name="SendCalendlyInvitation",
             func=generate_calendly_invitation_link,
+            coroutine=agenerate_calendly_invitation_link,
             description='''Useful for when you need to create invite for a personal meeting in Sleep Heaven shop. 
             Sends a calendly invitation based on the query input.''',
         )
     ]
 
+    # The product search tool answers from the catalog index, which is built once and shared by all agents.
+    use_knowledge_base = os.getenv("KNOWLEDGE_BASE_ENABLED", "False").lower() in ["true", "1", "t"]
+    if use_knowledge_base and product_files:
+        combined_product_catalog = read_catalog(product_files)
+        if combined_product_catalog.strip():
+            knowledge_base = setup_knowledge_base(combined_product_catalog)
+            tools.insert(
+                1,
+                Tool(
+                    name="ProductSearch",
+                    func=knowledge_base.run,
+                    coroutine=knowledge_base.arun,
+                    description="useful for when you need to answer questions about product information or services offered, availability and their costs.",
+                ),
+            )
+
     return tools
 
@@ -0,0 +1,367 @@
+import argparse
+import json
+import re
+import time
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from salesgpt.ports import fold, get_port_registry
+
+# Defaults of the trip information prompt, see `build_trip_info_prompt`.
+DEFAULT_ORIGIN = "Rafina"
+DEFAULT_DESTINATION = "Andros"
+
+MONTHS = {
+    name: number
+    for number, names in enumerate(
+        [
+            ("january", "jan"),
+            ("february", "feb"),
+            ("march", "mar"),
+            ("april", "apr"),
+            ("may",),
+            ("june", "jun"),
+            ("july", "jul"),
+            ("august", "aug"),
+            ("september", "sep", "sept"),
+            ("october", "oct"),
+            ("november", "nov"),
+            ("december", "dec"),
+        ],
+        start=1,
+    )
+    for name in names
+}
+WEEKDAYS = {
+    name: number
+    for number, names in enumerate(
+        [
+            ("monday", "mon"),
+            ("tuesday", "tue", "tues"),
+            ("wednesday", "wed"),
+            ("thursday", "thu", "thur", "thurs"),
+            ("friday", "fri"),
+            ("saturday",),
+            ("sunday",),
+        ]
+    )
+    for name in names
+}
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "my": 1, "our": 1, "his": 1, "her": 1, "their": 1, "single": 1,
+    "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+}
+
+_MONTH = "|".join(sorted(MONTHS, key=len, reverse=True))
+_WEEKDAY = "|".join(sorted(WEEKDAYS, key=len, reverse=True))
+_COUNT = r"\d+|" + "|".join(NUMBER_WORDS)
+_ORDINAL = r"(?:st|nd|rd|th)?"
+
+DATE_PATTERNS = [
+    ("iso", re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")),
+    ("dmy", re.compile(r"\b(\d{1,2})[/.](\d{1,2})[/.](\d{4}|\d{2})\b")),
+    ("day_month", re.compile(rf"\b(\d{{1,2}}){_ORDINAL}(?:\s+of)?\s+({_MONTH})\b\.?(?:,?\s+(\d{{4}}))?")),
+    ("month_day", re.compile(rf"\b({_MONTH})\.?\s+(\d{{1,2}}){_ORDINAL}\b(?:,?\s+(\d{{4}}))?")),
+    ("after_tomorrow", re.compile(r"\b(?:the\s+)?day\s+after\s+tomorrow\b")),
+    ("tomorrow", re.compile(r"\btomorrow\b")),
+    ("today", re.compile(r"\b(?:today|tonight)\b")),
+    ("in_days", re.compile(rf"\bin\s+({_COUNT})\s+days?\b")),
+    ("weekday", re.compile(rf"\b(?:(?:on|this|next)\s+)?({_WEEKDAY})\b")),
+]
+# Words that name a date the patterns do not understand, e.g. "next weekend", "mid November", "in 2 weeks" or
+# "on the 5th". They are looked for once the understood dates are blanked out. "may" is handled by MAY_HINT.
+DATE_HINT = re.compile(
+    rf"\b(?:{'|'.join(month for month in MONTHS if month != 'may')}|{_WEEKDAY}"
+    r"|days?|weeks?|weekends?|fortnights?|months?|years?|easter|christmas|holidays?|summer|winter|spring|autumn"
+    r"|\d{1,2}(?:st|nd|rd|th))\b|\d+/\d+"
+)
+# "may" is a month unless it is followed by a word that makes it a verb, as in "we may travel" or "may I".
+MAY_HINT = re.compile(
+    r"\bmay\b(?!\s+(?:i|we|you|they|he|she|it|also|not|be|have|need|want|like|prefer|travel|go|come|bring"
+    r"|take|book|get|ask|see|choose|change|leave|arrive|stay|visit|add|use|pay)\b)"
+)
+
+TIME_PATTERNS = [
+    ("24h", re.compile(r"\b([01]?\d|2[0-3])[:.]([0-5]\d)\s*(am|pm)?\b")),
+    ("12h", re.compile(r"\b(1[0-2]|0?[1-9])\s*(am|pm)\b")),
+    ("noon", re.compile(r"\b(?:noon|midday)\b")),
+]
+# Words that name a time the patterns do not understand, e.g. "around 9" or "late afternoon". They are looked
+# for once the understood times are blanked out.
+TIME_HINT = re.compile(
+    r"\b(?:morning|afternoon|evening|night|overnight|midnight|early|late|o'?clock"
+    r"|(?:at|around|about|approximately|after|before|until|till)\s+\d{1,2}\b"
+    r"(?!\s+(?:[a-z]+\s+)?(?:people|persons?|passengers?|adults?|travell?ers?|of\s+us|cars?|vehicles?)))"
+    r"|\d\s*[ap]\.m\b"
+)
+# Return and round trips need a second search, which only the LLM extraction can describe.
+RETURN_HINT = re.compile(
+    r"\b(?:return(?:ing)?|round[\s-]?trips?|roundtrip|two[\s-]ways?|both\s+ways|and\s+back"
+    r"|(?:come|coming|go|going|get|getting|travel(?:l?ing)?|fly|flying|sail|sailing)\s+back"
+    r"|back\s+(?:on|to|from|home))\b"
+)
+
+_QUANTITY = rf"(?:\b(?P<neg>no|without)\s+(?:a\s+|an\s+|any\s+)?|\b(?P<count>{_COUNT})\s+(?:[a-z]+\s+)?)"
+COUNT_PATTERNS = {
+    "passengers": re.compile(
+        _QUANTITY
+        + r"(?P<noun>people|persons?|passengers?|adults?|children|child|kids?|infants?|babies|baby"
+        r"|travell?ers?|pax|seniors?|students?)\b"
+    ),
+    "vehicles": re.compile(
+        _QUANTITY
+        + r"(?P<noun>cars?|vehicles?|motorbikes?|motorcycles?|campers?|vans?|trailers?)\b(?!\s*ferr)"
+    ),
+    "pets": re.compile(_QUANTITY + r"(?P<noun>pets?|dogs?|cats?)\b"),
+}
+# Counts written as fields, e.g. "passengers: 2".
+COUNT_FIELDS = re.compile(r"\b(passengers|vehicles|pets)\s*[:=]\s*(\d+)\b")
+SOLO = re.compile(r"\b(?:just\s+me|only\s+me|alone|by\s+myself|solo|myself)\b")
+COUPLE = re.compile(r"\b(?:a\s+)?couple\b")
+# Words implying travel companions whose number is not given.
+COMPANIONS = re.compile(
+    r"\b(?:we|us|family|friends|group|wife|husband|partner|girlfriend|boyfriend|son|daughter"
+    r"|parents|kids|children|and\s+i|me\s+and)\b"
+)
+
+ORIGIN_MARKER = re.compile(r"(?:\bfrom|\bleaving|\bdeparting(?:\s+from)?|\borigin\s*[:=])\s*$")
+DESTINATION_MARKER = re.compile(r"(?:\bto|\btowards|\bfor|->|→|>|\bdestination\s*[:=])\s*$")
+# A capitalized word after "from" or "to", which is a place unless it starts a port name or a date.
+PLACE = re.compile(r"\b(?:from|to)\s+([A-ZΑ-Ω][\wͰ-Ͽ-]+)")
+DATE_WORDS = {*MONTHS, *WEEKDAYS, "today", "tonight", "tomorrow"}
+
+
+@lru_cache(maxsize=1)
+def _port_patterns() -> Tuple[re.Pattern, re.Pattern, frozenset]:
+    """
+    Returns the patterns for port mentions and routes built from the port registry, and the first words
+    of all port names.
+    """
+    names = get_port_registry().names()
+    port = "|".join(re.escape(name) for name in names)
+    mention = re.compile(rf"\b({port})\b")
+    route = re.compile(rf"\b({port})\s*(?:to|->|→|-|–|>)\s*({port})\b")
+    return mention, route, frozenset(name.split()[0] for name in names)
+
+
+def _port_name(mention: str) -> str:
+    return get_port_registry().lookup(mention).port.name
+
+
+def _number(text: str) -> int:
+    return int(text) if text.isdigit() else NUMBER_WORDS[text]
+
+
+def _mask(text: str, start: int, end: int) -> str:
+    return text[:start] + " " * (end - start) + text[end:]
+
+
+def _next_date(today: date, month: int, day: int) -> date:
+    candidate = date(today.year, month, day)
+    return candidate if candidate >= today else date(today.year + 1, month, day)
+
+
+def _find_dates(text: str, today: date) -> Tuple[List[date], str]:
+    """
+    Returns the dates mentioned in `text` and the text with them blanked out.
+
+    Raises:
+        ValueError: If a mentioned date does not exist.
+    """
+    dates = []
+    for kind, pattern in DATE_PATTERNS:
+        for match in pattern.finditer(text):
+            groups = match.groups()
+            if kind == "iso":
+                found = date(int(groups[0]), int(groups[1]), int(groups[2]))
+            elif kind == "dmy":
+                year = int(groups[2])
+                found = date(year + 2000 if year < 100 else year, int(groups[1]), int(groups[0]))
+            elif kind in ("day_month", "month_day"):
+                day, month = (groups[0], groups[1]) if kind == "day_month" else (groups[1], groups[0])
+                if groups[2]:
+                    found = date(int(groups[2]), MONTHS[month], int(day))
+                else:
+                    found = _next_date(today, MONTHS[month], int(day))
+            elif kind == "after_tomorrow":
+                found = today + timedelta(days=2)
+            elif kind == "tomorrow":
+                found = today + timedelta(days=1)
+            elif kind == "today":
+                found = today
+            elif kind == "in_days":
+                found = today + timedelta(days=_number(groups[0]))
+            else:
+                days_ahead = (WEEKDAYS[groups[0]] - today.weekday()) % 7
+                found = today + timedelta(days=days_ahead or 7)
+            dates.append(found)
+            text = _mask(text, match.start(), match.end())
+    return dates, text
+
+
+def _find_times(text: str) -> Tuple[List[str], str]:
+    times = []
+    for kind, pattern in TIME_PATTERNS:
+        for match in pattern.finditer(text):
+            if kind == "noon":
+                hour, minute = 12, 0
+            else:
+                hour = int(match.group(1))
+                minute = int(match.group(2)) if kind == "24h" else 0
+                suffix = match.group(3) if kind == "24h" else match.group(2)
+                if suffix and hour > 12:
+                    continue
+                if suffix == "pm" and hour < 12:
+                    hour += 12
+                elif suffix == "am" and hour == 12:
+                    hour = 0
+            times.append(f"{hour:02d}:{minute:02d}")
+            text = _mask(text, match.start(), match.end())
+    return times, text
+
+
+def _count(field: str, text: str) -> Optional[int]:
+    """
+    Sums the quantities of the `field` nouns in `text`, or returns None if none are mentioned.
+    """
+    fields = [int(count) for name, count in COUNT_FIELDS.findall(text) if name == field]
+    if fields:
+        return fields[0] if len(set(fields)) == 1 else None
+    total = None
+    for match in COUNT_PATTERNS[field].finditer(text):
+        count = 0 if match.group("neg") else _number(match.group("count"))
+        total = (total or 0) + count
+    return total
+
+
+def _find_route(text: str) -> Tuple[Optional[str], Optional[str], bool]:
+    """
+    Returns the origin and destination ports of `text`, and whether the route is ambiguous.
+    """
+    port_mention, route_pattern, _ = _port_patterns()
+    route = route_pattern.search(text)
+    if route:
+        if len(port_mention.findall(text)) > 2:
+            return None, None, True
+        return _port_name(route.group(1)), _port_name(route.group(2)), False
+    origin = destination = None
+    for match in port_mention.finditer(text):
+        before = text[max(match.start() - 20, 0) : match.start()]
+        port = _port_name(match.group(1))
+        if ORIGIN_MARKER.search(before) and origin is None:
+            origin = port
+        elif DESTINATION_MARKER.search(before) and destination is None:
+            destination = port
+        else:
+            return None, None, True
+    return origin, destination, False
+
+
+def parse_trip_query(query: str, today: Optional[date] = None) -> Optional[Dict]:
+    """
+    Extracts the trip information of a ferry search query without the LLM.
+
+    Understands ISO, day/month/year and written dates, relative dates like "tomorrow", "in 3 days" or
+    "on Friday", times, the ports of the port registry and passenger, vehicle and pet counts. Fields that are not
+    mentioned get the defaults of `build_trip_info_prompt`. When anything is ambiguous, e.g. several dates,
+    an unknown port or "we" without a count, or when the query mentions a date, time or return trip the
+    rules do not understand, None is returned so the caller can ask the LLM instead.
+
+    Args:
+        query (str): The search query written by the agent.
+        today (date, optional): The date relative dates are counted from, by default today.
+
+    Returns:
+        Dict: The trip information with the keys of `extract_trip_info_from_query`, or None.
+    """
+    today = today or date.today()
+    port_words = _port_patterns()[2]
+    for place in PLACE.findall(query):
+        place = fold(place)
+        if place not in port_words and place not in DATE_WORDS:
+            return None
+    text = " ".join(fold(query).split())
+    if RETURN_HINT.search(text):
+        return None
+
+    try:
+        dates, text = _find_dates(text, today)
+    except ValueError:
+        return None
+    if len(set(dates)) > 1 or DATE_HINT.search(text) or MAY_HINT.search(text):
+        return None
+    departure_date = dates[0] if dates else today
+    if departure_date < today:
+        return None
+
+    times, text = _find_times(text)
+    if len(set(times)) > 1 or TIME_HINT.search(text):
+        return None
+
+    origin, destination, ambiguous = _find_route(text)
+    if ambiguous or (origin is None and destination is None):
+        return None
+    origin = origin or (DEFAULT_ORIGIN if destination != DEFAULT_ORIGIN else None)
+    destination = destination or (DEFAULT_DESTINATION if origin != DEFAULT_DESTINATION else None)
+    if origin is None or destination is None or origin == destination:
+        return None
+
+    passengers = _count("passengers", text)
+    if passengers is None:
+        if COUPLE.search(text):
+            passengers = 2
+        elif SOLO.search(text) or not COMPANIONS.search(text):
+            passengers = 1
+        else:
+            return None
+    if passengers < 1:
+        return None
+
+    return {
+        "departureDate": departure_date.isoformat(),
+        "departureTime": times[0] if times else "",
+        "origin": origin,
+        "destination": destination,
+        "passengers": passengers,
+        "vehicles": _count("vehicles", text) or 0,
+        "pets": _count("pets", text) or 0,
+    }
+
+
+def benchmark(queries: List[Dict], today: Optional[date] = None) -> Dict:
+    """
+    Measures how many recorded queries `parse_trip_query` answers and how many of those answers are right.
+
+    Args:
+        queries (List[Dict]): Records with a `query` and the `expected` trip information, or None where the
+            LLM is needed.
+        today (date, optional): The date the queries were recorded on.
+
+    Returns:
+        Dict: The number of queries, the hit rate, the number of wrong answers and the mean parse time.
+    """
+    hits = wrong = 0
+    started = time.perf_counter()
+    for record in queries:
+        result = parse_trip_query(record["query"], today)
+        if result is not None:
+            hits += 1
+            if result != record["expected"]:
+                wrong += 1
+    seconds = time.perf_counter() - started
+    return {
+        "queries": len(queries),
+        "hit_rate": hits / len(queries) if queries else 0.0,
+        "wrong": wrong,
+        "mean_parse_ms": seconds * 1000 / len(queries) if queries else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the rule-based trip query parser.")
+    parser.add_argument("queries", help="JSON file with today's date and the recorded queries")
+    args = parser.parse_args()
+    with open(args.queries, encoding="utf-8") as f:
+        recorded = json.load(f)
+    print(json.dumps(benchmark(recorded["queries"], date.fromisoformat(recorded["today"])), indent=2))
@@ -0,0 +1,259 @@
+import heapq
+import json
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+try:
+    import ijson
+except ImportError:  # ijson is optional, responses are then parsed once the whole body has arrived
+    ijson = None
+
+# Most trips listed in one observation, by earliest departure. 0 lists all of them.
+MAX_TRIPS = int(os.getenv("TRIP_SEARCH_MAX_RESULTS", 10))
+
+NO_TRIPS_FOUND = "No trips found for the given query."
+NO_TRIPS_AVAILABLE = json.dumps({"error": "No trips available for the selected criteria."})
+
+_GROUP = "tripsWithDictionary.item"
+_TRIP = f"{_GROUP}.trips.item"
+_COMPANIES = f"{_GROUP}.companies"
+_LOCATIONS = f"{_GROUP}.locations"
+
+_DATETIME = re.compile(r"^(\d{4}-\d\d-\d\d)T(\d\d:\d\d)")
+
+# How trips can be ranked in an observation: the sort key and the word used in its header.
+TRIP_ORDERS = {
+    "departure": (lambda trip: trip.departure or "", "earliest"),
+    "price": (lambda trip: (trip.price is None, trip.price or 0, trip.departure or ""), "cheapest"),
+}
+
+
+class TripRecord:
+    """
+    One ferry trip of a Liknoss list-of-trips response, with names resolved and the price in cents.
+    """
+
+    __slots__ = ("company", "vessel", "origin", "destination", "departure", "arrival", "price")
+
+    def __init__(self, company, vessel, origin, destination, departure, arrival, price):
+        self.company = company
+        self.vessel = vessel
+        self.origin = origin
+        self.destination = destination
+        self.departure = departure
+        self.arrival = arrival
+        self.price = price
+
+    def __repr__(self) -> str:
+        return f"TripRecord({self.company!r}, {self.vessel!r}, {self.departure!r})"
+
+
+class TripsResult:
+    """
+    The trips of a response, or `found=False` if the response had no `tripsWithDictionary` at all.
+    """
+
+    __slots__ = ("found", "trips")
+
+    def __init__(self, found: bool, trips: List[TripRecord]):
+        self.found = found
+        self.trips = trips
+
+
+def _trip_fields(trip: Dict[str, Any]) -> tuple:
+    """
+    Returns the codes, price and times of a trip, which is all that is kept of it until names are resolved.
+    """
+    vessel = trip.get("vessel") or {}
+    return (
+        (vessel.get("company") or {}).get("abbreviation") or "",
+        vessel.get("idOrCode") or "",
+        (trip.get("origin") or {}).get("idOrCode") or "",
+        (trip.get("destination") or {}).get("idOrCode") or "",
+        trip.get("departureDateTime") or "N/A",
+        trip.get("arrivalDateTime") or "N/A",
+        trip.get("basicPrice"),
+    )
+
+
+def _trip_record(fields: tuple, companies: Dict[str, Any], locations: Dict[str, Any]) -> TripRecord:
+    company_abbr, vessel_code, origin_code, destination_code, departure, arrival, price = fields
+    company = companies.get(company_abbr) or {}
+    return TripRecord(
+        company.get("name") or company_abbr,
+        ((company.get("vessels") or {}).get(vessel_code) or {}).get("name") or vessel_code,
+        (locations.get(origin_code) or {}).get("name") or origin_code,
+        (locations.get(destination_code) or {}).get("name") or destination_code,
+        departure,
+        arrival,
+        None if price is None or price == "N/A" else float(price),
+    )
+
+
+def trips_from_response_data(response_data: Dict[str, Any]) -> TripsResult:
+    """
+    Builds the trip records of an already decoded list-of-trips response.
+    """
+    groups = response_data.get("tripsWithDictionary") or []
+    trips = [
+        _trip_record(_trip_fields(trip), group.get("companies") or {}, group.get("locations") or {})
+        for group in groups
+        for trip in group.get("trips") or []
+    ]
+    return TripsResult(bool(groups), trips)
+
+
+class TripsParser:
+    """
+    Decodes a list-of-trips response incrementally from the chunks of its body.
+
+    With ijson installed, every trip is decoded on its own as its bytes arrive and only the fields of
+    `TripRecord` are kept, so the whole response never exists as Python objects at once. Trips reference the
+    companies and locations listed next to them, which may come later in the body, so names are resolved
+    at the end of each group. Without ijson the chunks are collected and decoded at once in `close`.
+
+    Raises:
+        ValueError: From `feed` or `close` if the body is not valid JSON.
+    """
+
+    def __init__(self):
+        self._trips: List[TripRecord] = []
+        self._found = False
+        if ijson is None:
+            self._chunks: List[bytes] = []
+            return
+        self._events = ijson.sendable_list()
+        self._parser = ijson.parse_coro(self._events)
+        self._builder = None
+        self._building: Optional[str] = None
+        self._group_trips: List[tuple] = []
+        self._dictionaries: Dict[str, Dict[str, Any]] = {}
+
+    def feed(self, chunk: bytes) -> None:
+        if ijson is None:
+            self._chunks.append(chunk)
+            return
+        try:
+            self._parser.send(chunk)
+        except ijson.JSONError as e:
+            raise ValueError(f"Invalid list-of-trips response: {e}") from e
+        self._handle_events()
+
+    def _handle_events(self) -> None:
+        for prefix, event, value in self._events:
+            if self._builder is not None:
+                self._builder.event(event, value)
+                if prefix == self._building and event in ("end_map", "end_array"):
+                    self._finish_object(self._builder.value)
+                continue
+            if event == "start_map" and prefix in (_TRIP, _COMPANIES, _LOCATIONS):
+                self._builder = ijson.ObjectBuilder()
+                self._building = prefix
+                self._builder.event(event, value)
+            elif prefix == _GROUP and event == "start_map":
+                self._found = True
+                self._group_trips = []
+                self._dictionaries = {}
+            elif prefix == _GROUP and event == "end_map":
+                companies = self._dictionaries.get(_COMPANIES) or {}
+                locations = self._dictionaries.get(_LOCATIONS) or {}
+                self._trips.extend(_trip_record(trip, companies, locations) for trip in self._group_trips)
+                self._group_trips = []
+        del self._events[:]
+
+    def _finish_object(self, value: Dict[str, Any]) -> None:
+        if self._building == _TRIP:
+            self._group_trips.append(_trip_fields(value))
+        else:
+            self._dictionaries[self._building] = value
+        self._builder = None
+        self._building = None
+
+    def close(self) -> TripsResult:
+        """
+        Finishes decoding and returns the trips of the response.
+        """
+        if ijson is None:
+            try:
+                response_data = json.loads(b"".join(self._chunks))
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid list-of-trips response: {e}") from e
+            if not isinstance(response_data, dict):
+                return TripsResult(False, [])
+            return trips_from_response_data(response_data)
+        try:
+            self._parser.close()
+        except ijson.JSONError as e:
+            raise ValueError(f"Invalid list-of-trips response: {e}") from e
+        self._handle_events()
+        return TripsResult(self._found, self._trips)
+
+
+def merge_trips(results: Iterable[TripsResult]) -> TripsResult:
+    """
+    Combines the trips of several searches into one result, found if any of the searches found trips.
+    """
+    found = False
+    trips: List[TripRecord] = []
+    for result in results:
+        found = found or result.found
+        trips.extend(result.trips)
+    return TripsResult(found, trips)
+
+
+def parse_trips(chunks: Iterable[bytes]) -> TripsResult:
+    parser = TripsParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+    return parser.close()
+
+
+def _compact_datetime(value: str) -> str:
+    match = _DATETIME.match(value or "")
+    return f"{match.group(1)} {match.group(2)}" if match else value
+
+
+def render_trips(result: TripsResult, max_trips: Optional[int] = None, order: str = "departure") -> str:
+    """
+    Renders the trips as the agent observation: one line per trip under a single header, ranked by `order`
+    and at most `max_trips` of them, which takes far fewer prompt tokens than a JSON object per trip.
+
+    Args:
+        result (TripsResult): The parsed response.
+        max_trips (int, optional): Most trips listed, by default TRIP_SEARCH_MAX_RESULTS. 0 lists all.
+        order (str, optional): "departure" lists the earliest trips first, "price" the cheapest.
+
+    Returns:
+        str: The observation.
+    """
+    if not result.found:
+        print("No 'tripsWithDictionary' key in response data.")
+        return NO_TRIPS_FOUND
+    if not result.trips:
+        return NO_TRIPS_AVAILABLE
+    max_trips = MAX_TRIPS if max_trips is None else max_trips
+    key, ranking = TRIP_ORDERS[order]
+    if max_trips and len(result.trips) > max_trips:
+        trips = heapq.nsmallest(max_trips, result.trips, key=key)
+        header = f"{len(result.trips)} trips, the {max_trips} {ranking}:"
+    else:
+        trips = sorted(result.trips, key=key)
+        header = f"{len(trips)} trips:"
+    lines = [header, "Company|Ferry|From|To|Departure|Arrival|Price"]
+    for trip in trips:
+        price = "N/A" if trip.price is None else f"{trip.price / 100:.2f}€"
+        lines.append(
+            "|".join(
+                [
+                    trip.company,
+                    trip.vessel,
+                    trip.origin,
+                    trip.destination,
+                    _compact_datetime(trip.departure),
+                    _compact_datetime(trip.arrival),
+                    price,
+                ]
+            )
+        )
+    return "\n".join(lines)
@@ -3,8 +3,18 @@ import os
 import pytest
 from dotenv import load_dotenv
 
+from salesgpt.salesgptapi import clear_agent_templates
+
 
 @pytest.fixture
 def load_env():
     data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_data")
     load_dotenv(dotenv_path=f"{data_dir}/.env")
+
+
+@pytest.fixture(autouse=True)
+def fresh_agent_templates():
+    # Agent templates are cached per process, do not let one test reuse an agent built by another.
+    clear_agent_templates()
+    yield
+    clear_agent_templates()
@@ -1,3 +1,4 @@
+import asyncio
 import os
 from unittest.mock import MagicMock, patch, AsyncMock
 
@@ -46,6 +47,18 @@ class TestSalesGPTAPI:
             api.sales_agent.use_tools == False
         ), "SalesGPTAPI should initialize SalesGPT with tools disabled."
 
+    def test_sessions_share_agent_template(self):
+        first = SalesGPTAPI(config_path="", use_tools=False)
+        second = SalesGPTAPI(config_path="", use_tools=False)
+        assert (
+            first.sales_agent.sales_conversation_utterance_chain
+            is second.sales_agent.sales_conversation_utterance_chain
+        ), "Sessions should reuse the chains of the shared agent template."
+        first.sales_agent.human_step("Hello")
+        assert (
+            second.sales_agent.conversation_history == []
+        ), "Sessions should not share conversation history."
+
     @pytest.mark.asyncio
     async def test_do_method_with_human_input(self, mock_salesgpt_astep):
         api = SalesGPTAPI(config_path="", use_tools=False)
@@ -79,12 +92,52 @@ class TestSalesGPTAPI:
             payload["response"] == ""
         ), "The payload response should match the mock response when no human input is provided."
 
-    # @pytest.mark.asyncio
-    # async def test_do_stream_method(self):
-    #     api = SalesGPTAPI(config_path="", use_tools=False)
-    #     stream_gen = api.do_stream(conversation_history=[])
-    #     async for response in stream_gen:
-    #         assert response == "Agent: Mock response <END_OF_TURN>", "Stream generator should yield the mock response."
+    @pytest.mark.asyncio
+    async def test_do_stream_method(self):
+        api = SalesGPTAPI(config_path="", use_tools=False)
+        name = api.sales_agent.salesperson_name
+        chunks = [name[:3], name[3:] + ": Hello", " there <END_", "OF_CALL> ignored"]
+
+        async def fake_stream():
+            for chunk in chunks:
+                yield {"choices": [{"delta": {"content": chunk}}]}
+
+        with patch(
+            "salesgpt.salesgptapi.SalesGPT._astreaming_generator",
+            new=AsyncMock(return_value=fake_stream()),
+        ), patch("salesgpt.salesgptapi.SalesGPT.aextract_trip_json", new=AsyncMock()):
+            events = [event async for event in api.do_stream(human_input="Hi")]
+
+        tokens = "".join(event["token"] for event in events if "token" in event)
+        assert tokens == "Hello there ", "Stream should drop the speaker prefix and stop at the end token."
+        done = next(event for event in events if event.get("done"))
+        assert done["end_of_call"] and done["response"] == "Hello there"
+        assert "extract_trip_json" in events[-1], "The trip JSON should be pushed after the reply."
+        assert api.sales_agent.conversation_history == [
+            "User: Hi <END_OF_TURN>",
+            f"{name}: Hello there <END_OF_TURN>",
+        ], "The streamed reply should be added to the session history."
+
+    @pytest.mark.asyncio
+    async def test_trip_json_extraction_runs_after_reply(self, mock_salesgpt_astep):
+        api = SalesGPTAPI(config_path="", use_tools=False)
+        extraction_started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def slow_extraction(sales_agent):
+            extraction_started.set()
+            await release.wait()
+            sales_agent.extracted_trip_json_data = '{"trip": 1}'
+
+        with patch("salesgpt.salesgptapi.SalesGPT.aextract_trip_json", new=slow_extraction):
+            payload = await api.do(human_input="Hello")
+            assert payload["extract_trip_json_pending"], "The reply should not wait for the extraction."
+            await extraction_started.wait()
+            assert (await api.get_trip_json(wait=False))["pending"]
+            release.set()
+            result = await api.get_trip_json()
+        assert result == {"extract_trip_json": '{"trip": 1}', "pending": False}
+
     @pytest.mark.asyncio
     async def test_payload_structure(self):
         api = SalesGPTAPI(config_path="", use_tools=False)
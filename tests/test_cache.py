@@ -0,0 +1,116 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from salesgpt.cache import SingleFlightCache, TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = TTLCache(max_entries=10, ttl_seconds=5, clock=clock)
+    cache.set("a", 1)
+    clock.now = 5
+    assert cache.get("a") == 1
+    clock.now = 5.1
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(max_entries=2, ttl_seconds=0)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+
+def test_single_flight_coalesces_concurrent_loads():
+    cache = SingleFlightCache("test", ttl_seconds=60)
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def load():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "trips"
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        first = pool.submit(cache.get_or_load, "route", load)
+        started.wait(5)
+        others = [pool.submit(cache.get_or_load, "route", load) for _ in range(3)]
+        time.sleep(0.05)
+        release.set()
+        results = [future.result(5) for future in [first, *others]]
+    assert results == ["trips"] * 4
+    assert len(calls) == 1
+
+
+def test_failed_loads_are_not_cached():
+    cache = SingleFlightCache("test", ttl_seconds=60)
+
+    def fail():
+        raise ValueError("upstream down")
+
+    with pytest.raises(ValueError):
+        cache.get_or_load("route", fail)
+    assert cache.get_or_load("route", lambda: "trips") == "trips"
+
+
+def test_stale_entries_are_served_while_refreshing():
+    clock = FakeClock()
+    cache = SingleFlightCache("test", ttl_seconds=10, stale_seconds=60, clock=clock)
+    cache.get_or_load("route", lambda: "old")
+    clock.now = 30
+    refreshed = threading.Event()
+
+    def refresh():
+        refreshed.set()
+        return "new"
+
+    assert cache.get_or_load("route", refresh) == "old"
+    assert refreshed.wait(5)
+    for _ in range(100):
+        if cache.get_or_load("route", lambda: "unused") == "new":
+            break
+        time.sleep(0.01)
+    assert cache.get_or_load("route", lambda: "unused") == "new"
+    clock.now = 200
+    assert cache.get_or_load("route", lambda: "reloaded") == "reloaded"
+
+
+@pytest.mark.asyncio
+async def test_async_single_flight_and_stale_refresh():
+    clock = FakeClock()
+    cache = SingleFlightCache("test", ttl_seconds=10, stale_seconds=60, clock=clock)
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return f"trips-{len(calls)}"
+
+    results = await asyncio.gather(*[cache.aget_or_load("route", load) for _ in range(5)])
+    assert results == ["trips-1"] * 5
+    assert len(calls) == 1
+
+    clock.now = 30
+    assert await cache.aget_or_load("route", load) == "trips-1"
+    assert await cache.aget_or_load("route", load) == "trips-1"
+    await asyncio.sleep(0.05)
+    assert len(calls) == 2
+    assert await cache.aget_or_load("route", load) == "trips-2"
@@ -0,0 +1,76 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from salesgpt import clients
+
+
+def test_bedrock_client_is_reused_per_region():
+    with patch("salesgpt.clients.boto3.client") as mock_client:
+        mock_client.side_effect = lambda **kwargs: MagicMock(region=kwargs["region_name"])
+        first = clients.get_bedrock_client("eu-west-1")
+        second = clients.get_bedrock_client("eu-west-1")
+        other = clients.get_bedrock_client("us-east-1")
+    assert first is second
+    assert other is not first
+    assert mock_client.call_count == 2
+    assert mock_client.call_args.kwargs["config"].max_pool_connections == 50
+    clients._bedrock_clients.clear()
+
+
+@pytest.mark.asyncio
+async def test_async_bedrock_client_is_entered_once_and_closed_on_shutdown():
+    bedrock_client = MagicMock()
+    client_context = MagicMock()
+    client_context.__aenter__ = AsyncMock(return_value=bedrock_client)
+    client_context.__aexit__ = AsyncMock(return_value=False)
+    session = MagicMock()
+    session.client.return_value = client_context
+
+    with patch("salesgpt.clients._aioboto3_session", session):
+        first = await clients.aget_bedrock_client("eu-west-1")
+        second = await clients.aget_bedrock_client("eu-west-1")
+        assert first is second is bedrock_client
+        session.client.assert_called_once()
+
+        await clients.aclose_clients()
+    client_context.__aexit__.assert_awaited_once()
+    assert clients._async_bedrock_clients == {}
+
+
+def test_async_http_client_is_shared_per_event_loop():
+    async def get_twice():
+        first = clients.get_async_http_client()
+        assert clients.get_async_http_client() is first
+        return first
+
+    async def get_and_close():
+        client = await get_twice()
+        await clients.aclose_clients()
+        return client
+
+    first = asyncio.run(get_twice())
+    second = asyncio.run(get_and_close())
+    assert second is not first
+    assert second.is_closed
+    assert clients._async_http_client is None
+
+
+def test_async_bedrock_clients_can_be_created_on_several_loops():
+    session = MagicMock()
+
+    def client(**kwargs):
+        context = MagicMock()
+        context.__aenter__ = AsyncMock(return_value=MagicMock())
+        context.__aexit__ = AsyncMock(return_value=False)
+        return context
+
+    session.client.side_effect = client
+    with patch("salesgpt.clients._aioboto3_session", session):
+        first = asyncio.run(clients.aget_bedrock_client("eu-west-1"))
+        second = asyncio.run(clients.aget_bedrock_client("eu-west-1"))
+    assert second is not first
+    assert session.client.call_count == 2
+    clients._async_bedrock_clients.clear()
+    clients._async_bedrock_stack = None
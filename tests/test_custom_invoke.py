@@ -0,0 +1,91 @@
+from unittest.mock import patch
+
+import pytest
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain.agents import LLMSingleActionAgent, Tool
+from langchain.chains import LLMChain
+from langchain_community.llms.fake import FakeListLLM
+from langchain_core.agents import AgentAction
+
+from salesgpt.custom_invoke import CustomAgentExecutor
+from salesgpt.parsers import SalesConvoOutputParser
+from salesgpt.templates import CustomPromptTemplateForTools
+
+
+def _build_executor(responses, tools):
+    prompt = CustomPromptTemplateForTools(
+        template="{tools}\n{input}\n{agent_scratchpad}",
+        tools_getter=lambda x: tools,
+        input_variables=["input", "intermediate_steps"],
+    )
+    agent = LLMSingleActionAgent(
+        llm_chain=LLMChain(llm=FakeListLLM(responses=responses), prompt=prompt),
+        output_parser=SalesConvoOutputParser(ai_prefix="Ted"),
+        stop=["\nObservation:"],
+        allowed_tools=[tool.name for tool in tools],
+    )
+    return CustomAgentExecutor.from_agent_and_tools(
+        agent=agent, tools=tools, return_intermediate_steps=True
+    )
+
+
+async def _aecho(query):
+    return f"async echo: {query}"
+
+
+ECHO_TOOL = Tool(
+    name="Echo",
+    func=lambda query: f"sync echo: {query}",
+    coroutine=_aecho,
+    description="Echoes the input.",
+)
+
+
+class TestCustomAgentExecutor:
+    def test_invoke_keeps_agent_steps(self):
+        executor = _build_executor(
+            ["Action: Echo\nAction Input: hi", "Ted: done"], [ECHO_TOOL]
+        )
+        outputs = executor.invoke({"input": "hello"})
+        assert outputs["output"] == "done"
+        action, observation = outputs["intermediate_steps"][0]
+        assert isinstance(action, AgentAction)
+        assert observation == "sync echo: hi"
+        assert outputs["execution_events"][-1]["event"] == "Call Successful"
+
+    @pytest.mark.asyncio
+    async def test_ainvoke_uses_tool_coroutines(self):
+        executor = _build_executor(
+            ["Action: Echo\nAction Input: hi", "Ted: done"], [ECHO_TOOL]
+        )
+        outputs = await executor.ainvoke({"input": "hello"}, include_run_info=True)
+        assert outputs["output"] == "done"
+        action, observation = outputs["intermediate_steps"][0]
+        assert observation == "async echo: hi"
+        assert [event["event"] for event in outputs["execution_events"]] == [
+            "Chain Started",
+            "Call Successful",
+        ]
+        assert "run_info" in outputs
+
+    def test_invoke_without_callbacks_skips_serialization(self):
+        executor = _build_executor(["Ted: done"], [ECHO_TOOL])
+        with patch("salesgpt.custom_invoke.dumpd") as mock_dumpd:
+            outputs = executor.invoke({"input": "hello"})
+        assert outputs["output"] == "done"
+        mock_dumpd.assert_not_called()
+
+    def test_invoke_with_non_tracing_callback_skips_serialization(self):
+        class RecordingHandler(BaseCallbackHandler):
+            def __init__(self):
+                self.serialized = []
+
+            def on_chain_start(self, serialized, inputs, **kwargs):
+                self.serialized.append(serialized)
+
+        handler = RecordingHandler()
+        executor = _build_executor(["Ted: done"], [ECHO_TOOL])
+        with patch("salesgpt.custom_invoke.dumpd") as mock_dumpd:
+            executor.invoke({"input": "hello"}, config={"callbacks": [handler]})
+        mock_dumpd.assert_not_called()
+        assert handler.serialized[0]["name"] == "CustomAgentExecutor"
@@ -0,0 +1,136 @@
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from salesgpt.history import (
+    ConversationHistory,
+    estimate_tokens,
+    extractive_summary,
+    history_window_start,
+    summarize_turn,
+)
+from salesgpt.salesgptapi import SalesGPTAPI
+
+TURNS = [
+    "User: Hi, we are two adults. We want to visit Andros. <END_OF_TURN>",
+    "Ted Lasso: Great choice! When do you want to travel? <END_OF_TURN>",
+    "User: Next week. <END_OF_TURN>",
+    "Ted Lasso: Here is the plan. "
+    '{"days": [{"day_number": 1, "morning_activities": "Swim", "afternoon_details": "Hike", '
+    '"evening_plans": "Dinner"}]} <END_OF_TURN>',
+]
+
+
+class TestHistoryWindow:
+    def test_no_limits_keeps_everything(self):
+        assert history_window_start(TURNS) == 0
+
+    def test_keep_last(self):
+        assert history_window_start(TURNS, keep_last=2) == 2
+
+    def test_token_budget_always_keeps_newest_turn(self):
+        assert history_window_start(TURNS, max_tokens=1) == len(TURNS) - 1
+        budget = sum(estimate_tokens(turn) + 1 for turn in TURNS[-2:])
+        assert history_window_start(TURNS, max_tokens=budget) == 2
+
+    def test_summarize_turn(self):
+        assert summarize_turn(TURNS[0]) == "User: Hi, we are two adults."
+        assert summarize_turn(TURNS[3]) == "Ted Lasso: Here is the plan."
+        assert "[itinerary]" in summarize_turn('Ted Lasso: {"day_number": 1, "evening_plans": "x"}')
+        assert extractive_summary(TURNS[:2]).count("\n") == 1
+
+
+class TestConversationHistoryPolicy:
+    def _agent(self, **policy):
+        sales_agent = SalesGPTAPI(config_path="", use_tools=False).sales_agent
+        for key, value in policy.items():
+            setattr(sales_agent, key, value)
+        return sales_agent
+
+    def test_full_history_by_default(self):
+        sales_agent = self._agent()
+        sales_agent.conversation_history = list(TURNS)
+        assert sales_agent.format_conversation_history() == "\n".join(TURNS)
+
+    def test_window_with_cached_extractive_summary(self):
+        sales_agent = self._agent(history_keep_last=2)
+        sales_agent.conversation_history = list(TURNS[:3])
+        text = sales_agent.format_conversation_history()
+        assert text.startswith("Summary of the earlier conversation:\nUser: Hi, we are two adults.")
+        assert text.endswith("\n".join(TURNS[1:3]))
+        assert sales_agent.history_summary_upto == 1
+
+        sales_agent.conversation_history.append(TURNS[3])
+        text = sales_agent.format_conversation_history()
+        assert sales_agent.history_summary_upto == 2
+        assert sales_agent.history_summary.splitlines() == [
+            "User: Hi, we are two adults.",
+            "Ted Lasso: Great choice!",
+        ]
+
+    def test_summary_is_dropped_when_history_is_replaced(self):
+        sales_agent = self._agent(history_keep_last=1)
+        sales_agent.conversation_history = list(TURNS)
+        sales_agent.format_conversation_history()
+        sales_agent.conversation_history = [TURNS[0]]
+        assert sales_agent.format_conversation_history() == TURNS[0]
+        assert sales_agent.history_summary == ""
+
+    def test_summary_is_dropped_when_history_is_replaced_by_a_longer_one(self):
+        sales_agent = self._agent(history_keep_last=1)
+        sales_agent.conversation_history = list(TURNS[:2])
+        sales_agent.format_conversation_history()
+        assert sales_agent.history_summary == extractive_summary(TURNS[:1])
+        other_turns = ["User: Hello, a family of four.", "Ted Lasso: Welcome!", "User: Paros please."]
+        sales_agent.conversation_history = list(other_turns)
+        text = sales_agent.format_conversation_history()
+        assert "two adults" not in text
+        assert sales_agent.history_summary == extractive_summary(other_turns[:2])
+
+    @pytest.mark.asyncio
+    async def test_llm_summary(self):
+        sales_agent = self._agent(history_keep_last=1, history_summary_mode="llm")
+        sales_agent.conversation_history = list(TURNS)
+        summarize = AsyncMock(return_value=AIMessage(content="Two adults, Andros, next week."))
+        with patch("langchain_community.chat_models.ChatLiteLLM.ainvoke", new=summarize):
+            text = await sales_agent.aformat_conversation_history()
+            await sales_agent.aformat_conversation_history()
+        assert summarize.await_count == 1, "The summary should be cached until more turns leave the window."
+        assert text == f"Summary of the earlier conversation:\nTwo adults, Andros, next week.\n\n{TURNS[-1]}"
+
+
+class TestConversationHistory:
+    def test_appends_keep_joined_text(self):
+        history = ConversationHistory()
+        for turn in TURNS:
+            history.append(turn)
+        assert history.text == "\n".join(TURNS)
+        assert history.text_from(2) == "\n".join(TURNS[2:])
+        assert history.token_count == sum(estimate_tokens(turn) + 1 for turn in TURNS)
+        assert history == TURNS, "The container should still behave like the list of turns."
+
+    def test_window_start_matches_list_version(self):
+        history = ConversationHistory(TURNS)
+        for keep_last in range(0, 5):
+            for max_tokens in [0, 1, 10, 30, 60, 1000]:
+                assert history.window_start(keep_last, max_tokens) == history_window_start(
+                    list(TURNS), keep_last, max_tokens
+                ), (keep_last, max_tokens)
+
+    def test_in_place_changes_rebuild_text(self):
+        history = ConversationHistory(TURNS)
+        history[-1] = "Ted Lasso: Bye"
+        assert history.text.endswith("\nTed Lasso: Bye")
+        history.pop(0)
+        history[0] = "Ted Lasso: Hi"
+        assert history.text == "\n".join(["Ted Lasso: Hi", TURNS[2], "Ted Lasso: Bye"])
+
+    def test_agent_keeps_history_container(self):
+        sales_agent = SalesGPTAPI(config_path="", use_tools=False).sales_agent
+        sales_agent.human_step("Hello")
+        assert isinstance(sales_agent.conversation_history, ConversationHistory)
+        assert sales_agent.history_buffer().text == "User: Hello <END_OF_TURN>"
+        sales_agent.conversation_history = ["User: Hi <END_OF_TURN>"]
+        assert sales_agent.format_conversation_history() == "User: Hi <END_OF_TURN>"
+        assert isinstance(sales_agent.conversation_history, ConversationHistory)
@@ -0,0 +1,92 @@
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from salesgpt.itinerary import (
+    find_itinerary_block,
+    normalize_block,
+    parse_itinerary,
+    repair_json,
+    validate_itinerary,
+)
+from salesgpt.salesgptapi import SalesGPTAPI
+
+ITINERARY = """{
+  "location_name": "Andros",
+  "days": [
+    {"day_number": 1, "morning_activities": "Hike to {Pithara} falls", "afternoon_details": "Beach", "evening_plans": "Taverna"}
+  ]
+}"""
+
+
+class TestFindItineraryBlock:
+    def test_finds_block_in_reply(self):
+        reply = f"Ted Lasso: Here is your plan! ```json\n{ITINERARY}\n``` Enjoy {{your}} trip <END_OF_TURN>"
+        assert find_itinerary_block(reply) == ITINERARY
+
+    def test_no_itinerary(self):
+        assert find_itinerary_block('Ted Lasso: {"price": 20} <END_OF_TURN>') is None
+        assert find_itinerary_block("Ted Lasso: Where would you like to go?") is None
+
+    def test_ignores_unclosed_block(self):
+        assert find_itinerary_block('{"day_number": 1, "morning_activities": "Hike"') is None
+
+    def test_normalize_block_ignores_formatting(self):
+        assert normalize_block(ITINERARY) == normalize_block(" ".join(ITINERARY.split()))
+
+
+class TestParseItinerary:
+    def test_parses_valid_itinerary(self):
+        data = parse_itinerary(f"Agent: {ITINERARY}")
+        assert data["days"][0]["morning_activities"] == "Hike to {Pithara} falls"
+
+    def test_repairs_fences_comments_and_trailing_commas(self):
+        reply = (
+            "```json\n{\"location_name\": \"Andros\", // the island\n"
+            "\"days\": [{\"day_number\": 1, \"morning_activities\": \"Swim\","
+            " \"afternoon_details\": \"http://andros.gr\", \"evening_plans\": \"Dinner\",},],}\n```"
+        )
+        data = parse_itinerary(reply)
+        assert data["days"][0]["afternoon_details"] == "http://andros.gr"
+
+    def test_repairs_truncated_itinerary(self):
+        truncated = ITINERARY.replace('"Beach", "evening_plans": "Taverna"}\n  ]\n}', '"Beach", "evening_plans": "Tav')
+        assert repair_json(truncated).endswith('"Tav"}]}')
+        assert parse_itinerary(truncated)["days"][0]["evening_plans"] == "Tav"
+
+    def test_rejects_itinerary_with_missing_fields(self):
+        assert parse_itinerary('{"days": [{"day_number": 1, "morning_activities": "Swim"}]}') is None
+        assert validate_itinerary({"days": [{"day_number": "one", "morning_activities": "a",
+                                             "afternoon_details": "b", "evening_plans": "c"}]})
+
+
+class TestIncrementalTripJsonExtraction:
+    @pytest.mark.asyncio
+    async def test_valid_itinerary_is_extracted_locally(self):
+        sales_agent = SalesGPTAPI(config_path="", use_tools=False).sales_agent
+        extractor = AsyncMock()
+        with patch("salesgpt.chains.JsonExtractorChain.ainvoke", new=extractor):
+            sales_agent.conversation_history = [f"Agent: {ITINERARY}"]
+            trip_data = await sales_agent.aextract_trip_json()
+        assert trip_data["location_name"] == "Andros"
+        assert sales_agent.extracted_trip_json_data == trip_data
+        assert extractor.await_count == 0, "A valid itinerary should not need the LLM."
+
+    @pytest.mark.asyncio
+    async def test_extracts_only_when_itinerary_changes(self):
+        sales_agent = SalesGPTAPI(config_path="", use_tools=False).sales_agent
+        sales_agent.enrich_trip_json = True
+        extractor = AsyncMock(return_value={"text": '{"ex_json": {"days": []}}'})
+        with patch("salesgpt.chains.JsonExtractorChain.ainvoke", new=extractor):
+            sales_agent.conversation_history = ["Agent: Where would you like to go?"]
+            assert await sales_agent.aextract_trip_json() is None
+            assert extractor.await_count == 0, "Replies without an itinerary should not call the LLM."
+
+            sales_agent.conversation_history.append(f"Agent: {ITINERARY}")
+            assert await sales_agent.aextract_trip_json() == {"days": []}
+            sent = extractor.await_args.kwargs["input"]["conversation_history"]
+            assert "Where would you like to go?" not in sent, "Only the itinerary should be sent."
+
+            sales_agent.conversation_history.append(f"Agent: Still the same plan {ITINERARY}")
+            await sales_agent.aextract_trip_json()
+            assert extractor.await_count == 1, "An unchanged itinerary should not be extracted again."
@@ -0,0 +1,81 @@
+import os
+from unittest.mock import patch
+
+import numpy as np
+
+from salesgpt import knowledge_base
+from salesgpt.knowledge_base import (
+    HashingEmbeddings,
+    VectorIndexRetriever,
+    build_index,
+    get_index,
+    index_key,
+    read_catalog,
+)
+from salesgpt.tools import get_tools
+
+CATALOG = "\n\n".join(
+    [
+        "Classic Harmony Spring Mattress: a traditional innerspring mattress with firm support.",
+        "EcoGreen Hybrid Latex Mattress: organic latex and pocket coils, eco friendly.",
+        "Plush Serenity Bamboo Mattress: soft bamboo cover for hot sleepers.",
+    ]
+)
+
+
+def _small_chunks():
+    return patch.multiple(knowledge_base, CHUNK_SIZE=100, CHUNK_OVERLAP=0)
+
+
+def test_index_is_built_once_and_memory_mapped(tmp_path):
+    embeddings = HashingEmbeddings()
+    with _small_chunks():
+        index = build_index(CATALOG, embeddings, str(tmp_path))
+        assert index.exists()
+        with patch.object(HashingEmbeddings, "embed_documents") as embed:
+            assert build_index(CATALOG, embeddings, str(tmp_path)).key == index.key
+        embed.assert_not_called()
+
+    index.load()
+    assert isinstance(index._matrix, np.memmap)
+    assert np.allclose(np.linalg.norm(index._matrix, axis=1), 1.0)
+
+    docs = index.search(embeddings.embed_query("organic latex coils"), k=2)
+    assert docs[0].page_content.startswith("EcoGreen Hybrid Latex Mattress")
+    assert len(docs) == 2
+
+
+def test_index_key_depends_on_catalog_and_embeddings():
+    assert index_key(CATALOG, HashingEmbeddings()) != index_key(CATALOG + " ", HashingEmbeddings())
+    assert index_key(CATALOG, HashingEmbeddings(64)) != index_key(CATALOG, HashingEmbeddings(128))
+
+
+def test_get_index_is_shared(tmp_path):
+    with _small_chunks():
+        first = get_index(CATALOG, HashingEmbeddings(), str(tmp_path))
+        second = get_index(CATALOG, HashingEmbeddings(), str(tmp_path))
+    assert first is second
+
+
+def test_retriever(tmp_path):
+    embeddings = HashingEmbeddings()
+    with _small_chunks():
+        index = build_index(CATALOG, embeddings, str(tmp_path))
+    retriever = VectorIndexRetriever(index=index, embeddings=embeddings, k=1)
+    docs = retriever.get_relevant_documents("bamboo cover for hot sleepers")
+    assert docs[0].page_content.startswith("Plush Serenity Bamboo Mattress")
+
+
+def test_product_search_tool_is_opt_in(tmp_path):
+    catalog_path = tmp_path / "catalog.txt"
+    catalog_path.write_text(CATALOG)
+    assert read_catalog(str(tmp_path)).strip() == CATALOG
+    env = {
+        "KNOWLEDGE_BASE_ENABLED": "True",
+        "KNOWLEDGE_BASE_EMBEDDINGS": "hashing",
+        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY") or "unused",
+    }
+    with patch.dict(os.environ, env), patch("salesgpt.tools.DEFAULT_INDEX_DIR", str(tmp_path / "index")):
+        names = [tool.name for tool in get_tools(str(catalog_path))]
+    assert "ProductSearch" in names
+    assert "ProductSearch" not in [tool.name for tool in get_tools(str(catalog_path))]
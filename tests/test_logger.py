@@ -0,0 +1,49 @@
+import asyncio
+import time
+
+import pytest
+
+from salesgpt import logger
+from salesgpt.logger import get_timings, reset_timings, set_profiling_enabled, time_logger
+
+
+@pytest.fixture(autouse=True)
+def clean_timings():
+    reset_timings()
+    yield
+    reset_timings()
+    set_profiling_enabled(True)
+
+
+@time_logger
+async def slow_coroutine():
+    await asyncio.sleep(0.05)
+    return "done"
+
+
+@time_logger
+def slow_function():
+    time.sleep(0.02)
+    return "done"
+
+
+class TestTimeLogger:
+    @pytest.mark.asyncio
+    async def test_times_coroutine_execution(self):
+        assert await slow_coroutine() == "done"
+        assert get_timings()["slow_coroutine"]["max"] >= 0.05
+
+    def test_times_sync_function(self):
+        assert slow_function() == "done"
+        assert get_timings()["slow_function"]["count"] == 1
+
+    def test_can_be_disabled_at_runtime(self):
+        set_profiling_enabled(False)
+        slow_function()
+        assert "slow_function" not in get_timings()
+
+    def test_ring_buffer_keeps_recent_timings(self, monkeypatch):
+        monkeypatch.setattr(logger, "TIMING_HISTORY_SIZE", 3)
+        for seconds in [5.0, 1.0, 2.0, 3.0]:
+            logger.record_timing("step", seconds)
+        assert get_timings()["step"] == {"count": 3, "mean": 2.0, "p50": 2.0, "p95": 3.0, "max": 3.0}
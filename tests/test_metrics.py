@@ -0,0 +1,70 @@
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from langchain.agents import Tool
+from langchain_community.chat_models.fake import FakeListChatModel
+
+from salesgpt.metrics import (
+    collect_turn_metrics,
+    current_turn_metrics,
+    record_cache_lookup,
+    record_llm_call,
+)
+from salesgpt.salesgptapi import SalesGPTAPI
+
+
+class TestTurnMetrics:
+    def test_collects_langchain_llm_and_tool_calls(self):
+        llm = FakeListChatModel(responses=["Hi!"])
+        tool = Tool(name="Echo", func=lambda query: query, description="Echoes the query.")
+        with collect_turn_metrics() as metrics:
+            llm.invoke("Hello")
+            tool.run("ping")
+        assert current_turn_metrics() is None, "Metrics collection should end with the block."
+        assert len(metrics.llm_calls) == 1
+        assert [call["tool"] for call in metrics.tool_calls] == ["Echo"]
+
+    def test_records_direct_calls_and_cache_lookups(self):
+        with collect_turn_metrics() as metrics:
+            record_llm_call("tool_prompt", 120, 30, 0.5)
+            record_cache_lookup("trips", hit=True)
+            record_cache_lookup("trips", hit=False)
+        data = metrics.to_dict()
+        assert (data["prompt_tokens"], data["completion_tokens"]) == (120, 30)
+        assert data["cache_lookups"] == {"trips": {"hits": 1, "misses": 1}}
+
+    def test_recording_without_a_turn_is_a_no_op(self):
+        record_llm_call("tool_prompt", 1, 1, 0.1)
+        record_cache_lookup("trips", hit=True)
+
+    @pytest.mark.asyncio
+    async def test_do_returns_metrics_on_request(self):
+        api = SalesGPTAPI(config_path="", use_tools=False, background_trip_json=False)
+
+        async def astep(sales_agent, stream=False):
+            record_llm_call("agent", 10, 5, 0.1)
+            return {}
+
+        with patch("salesgpt.salesgptapi.SalesGPT.astep", new=astep), patch(
+            "salesgpt.salesgptapi.SalesGPT.aextract_trip_json", new=AsyncMock()
+        ):
+            payload = await api.do(human_input="Hello", include_metrics=True)
+            assert "metrics" not in await api.do(human_input="Hello again")
+        assert payload["metrics"]["prompt_tokens"] == 10
+        assert payload["metrics"]["extractor_seconds"] is not None
+
+    @pytest.mark.asyncio
+    async def test_do_does_not_collect_metrics_unless_needed(self):
+        api = SalesGPTAPI(config_path="", use_tools=False, background_trip_json=False)
+        collecting = []
+
+        async def astep(sales_agent, stream=False):
+            collecting.append(current_turn_metrics() is not None)
+            return {}
+
+        with patch("salesgpt.salesgptapi.SalesGPT.astep", new=astep), patch(
+            "salesgpt.salesgptapi.SalesGPT.aextract_trip_json", new=AsyncMock()
+        ), patch("salesgpt.salesgptapi.PROMETHEUS_ENABLED", False):
+            await api.do(human_input="Hello")
+            await api.do(human_input="Hello again", include_metrics=True)
+        assert collecting == [False, True]
@@ -0,0 +1,110 @@
+from unittest.mock import patch
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from salesgpt.models import BedrockCustomModel, _to_bedrock_messages
+from salesgpt.templates import CustomPromptTemplateForTools
+
+MODEL_NAME = "anthropic.claude-3-sonnet-20240229-v1:0"
+
+
+def _model(**kwargs):
+    return BedrockCustomModel(
+        type="bedrock-model",
+        model=MODEL_NAME,
+        system_prompt="You are a helpful assistant.",
+        # BedrockCustomModel extends ChatOpenAI, which requires a key even though it is never used.
+        openai_api_key="unused",
+        **kwargs,
+    )
+
+
+async def _fake_astream(**kwargs):
+    for text in ["Hello", " there", "!"]:
+        yield text
+
+
+class TestBedrockCustomModelStreaming:
+    def test_stream_yields_chunks(self):
+        with patch(
+            "salesgpt.models.completion_bedrock_stream",
+            return_value=iter(["Hello", " there"]),
+        ):
+            chunks = list(_model().stream([HumanMessage(content="hi")]))
+        assert [chunk.content for chunk in chunks] == ["Hello", " there"]
+
+    @pytest.mark.asyncio
+    async def test_astream_yields_chunks(self):
+        with patch("salesgpt.models.acompletion_bedrock_stream", _fake_astream):
+            chunks = [chunk async for chunk in _model().astream([HumanMessage(content="hi")])]
+        assert "".join(chunk.content for chunk in chunks) == "Hello there!"
+
+    @pytest.mark.asyncio
+    async def test_agenerate_with_streaming_aggregates_chunks(self):
+        with patch("salesgpt.models.acompletion_bedrock_stream", _fake_astream):
+            message = await _model(streaming=True).ainvoke([HumanMessage(content="hi")])
+        assert message.content == "Hello there!"
+
+
+class TestBedrockMessageMapping:
+    def test_maps_full_message_list(self):
+        system, turns = _to_bedrock_messages(
+            [
+                SystemMessage(content="Be brief."),
+                HumanMessage(content="Hi"),
+                AIMessage(content="Hello!"),
+                HumanMessage(content="Ferries to Andros?"),
+            ],
+            "You are a helpful assistant.",
+        )
+        assert system == "You are a helpful assistant.\n\nBe brief."
+        assert [turn["role"] for turn in turns] == ["user", "assistant", "user"]
+        assert turns[-1]["content"][0]["text"] == "Ferries to Andros?"
+
+    def test_system_only_prompt_becomes_user_turn(self):
+        system, turns = _to_bedrock_messages(
+            [SystemMessage(content="Inception prompt")], "You are a helpful assistant."
+        )
+        assert system == "You are a helpful assistant."
+        assert turns == [
+            {"role": "user", "content": [{"type": "text", "text": "Inception prompt"}]}
+        ]
+
+    def test_prompt_caching_marks_stable_prefix(self):
+        system, turns = _to_bedrock_messages(
+            [HumanMessage(content="a"), AIMessage(content="b"), HumanMessage(content="c")],
+            "You are a helpful assistant.",
+            prompt_caching=True,
+        )
+        assert system[0]["cache_control"] == {"type": "ephemeral"}
+        assert turns[1]["content"][-1]["cache_control"] == {"type": "ephemeral"}
+        assert "cache_control" not in turns[-1]["content"][-1]
+
+    def test_prompt_caching_marks_agent_instructions(self):
+        prompt = CustomPromptTemplateForTools(
+            template="Tools:\n{tools}\n\nPrevious conversation history:\n{conversation_history}\n{agent_scratchpad}",
+            tools_getter=lambda x: [],
+            input_variables=["input", "intermediate_steps", "conversation_history"],
+        )
+        messages = prompt.format_prompt(
+            input="", intermediate_steps=[], conversation_history="User: hi"
+        ).to_messages()
+        system, turns = _to_bedrock_messages(
+            messages, "You are a helpful assistant.", prompt_caching=True
+        )
+        assert [block["text"] for block in system] == ["You are a helpful assistant.", "Tools:"]
+        assert "cache_control" not in system[0]
+        assert system[-1]["cache_control"] == {"type": "ephemeral"}
+        assert turns[0]["content"][0]["text"].startswith("Previous conversation history:\nUser: hi")
+
+    def test_generate_forwards_max_tokens_and_stop(self):
+        response = {"content": [{"type": "text", "text": "ok"}], "usage": {}}
+        with patch("salesgpt.models.completion_bedrock", return_value=response) as mock:
+            message = _model(max_tokens=300).invoke(
+                [HumanMessage(content="hi")], stop=["<END_OF_TURN>"]
+            )
+        assert message.content == "ok"
+        kwargs = mock.call_args.kwargs
+        assert kwargs["max_tokens"] == 300
+        assert kwargs["stop_sequences"] == ["<END_OF_TURN>"]
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+from salesgpt.ports import Port, PortRegistry, UnknownPortError, get_port_registry
+from salesgpt.tools import get_port_code
+
+
+@pytest.mark.parametrize(
+    "name, code, kind",
+    [
+        ("Rafina", "RAF", "exact"),
+        ("  port of RAFINA ", "RAF", "exact"),
+        ("Ραφήνα", "RAF", "exact"),
+        ("ραφηνα", "RAF", "exact"),
+        ("Gavrio", "AND", "exact"),
+        ("Thira", "SAN", "exact"),
+        ("ath", "ATH", "exact"),
+        ("Andr", "AND", "prefix"),
+        ("Andors", "AND", "fuzzy"),
+        ("Santorinni", "SAN", "fuzzy"),
+    ],
+)
+def test_lookup(name, code, kind):
+    match = get_port_registry().lookup(name)
+    assert (match.port.code, match.kind) == (code, kind)
+
+
+@pytest.mark.parametrize("name", ["Kythira", "Atlantis", "", "a"])
+def test_unknown_ports_are_explicit(name):
+    match = get_port_registry().lookup(name)
+    assert not match
+    assert match.kind == "unknown"
+
+
+def test_ambiguous_names_are_unknown_with_suggestions():
+    registry = PortRegistry([Port("AAA", "Agios Nikolaos"), Port("BBB", "Agios Kirykos")])
+    match = registry.lookup("Agios")
+    assert match.port is None
+    assert set(match.suggestions) <= {"Agios Nikolaos", "Agios Kirykos"}
+    assert registry.lookup("agios kirikos").port.code == "BBB"
+
+
+def test_registry_from_file(tmp_path):
+    path = tmp_path / "ports.json"
+    path.write_text(json.dumps([{"code": "XYZ", "name": "Example", "names": ["Παράδειγμα"]}]))
+    registry = PortRegistry.from_file(str(path))
+    assert registry.lookup("παραδειγμα").port.code == "XYZ"
+    assert registry.get("xyz").name == "Example"
+
+
+def test_get_port_code_raises_for_unknown_ports():
+    assert get_port_code("Andros") == "AND"
+    with pytest.raises(UnknownPortError, match="Unknown port 'Atlantis'"):
+        get_port_code("Atlantis")
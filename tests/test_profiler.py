@@ -0,0 +1,53 @@
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from langchain.agents import Tool
+from langchain_community.chat_models.fake import FakeListChatModel
+
+from salesgpt.logger import time_logger
+from salesgpt.profiler import profile_request, span
+from salesgpt.salesgptapi import SalesGPTAPI
+
+
+@time_logger
+def format_prompt():
+    return FakeListChatModel(responses=["Hi!"]).invoke("Hello")
+
+
+class TestRequestProfiler:
+    def test_builds_span_tree_from_own_spans_and_callbacks(self):
+        tool = Tool(name="Echo", func=lambda query: query, description="Echoes the query.")
+        with profile_request("chat") as profiler:
+            with span("turn"):
+                format_prompt()
+                tool.run("ping")
+        tree = profiler.to_dict()
+        turn = tree["children"][0]
+        assert turn["name"] == "turn"
+        assert [child["name"] for child in turn["children"]] == ["format_prompt", "Echo"]
+        assert turn["children"][0]["children"][0]["kind"] == "llm"
+        assert all(child["finished"] for child in turn["children"])
+
+    def test_collapsed_stacks(self):
+        with profile_request("chat") as profiler:
+            with span("turn"):
+                format_prompt()
+        stacks = [line.rsplit(" ", 1)[0] for line in profiler.to_collapsed().splitlines()]
+        assert "chat;turn;format_prompt" in stacks
+        assert any(stack.startswith("chat;turn;format_prompt;") for stack in stacks)
+
+    def test_span_without_profiler_is_a_no_op(self):
+        with span("turn") as current:
+            assert current is None
+
+    @pytest.mark.asyncio
+    async def test_profiles_api_turn(self):
+        api = SalesGPTAPI(config_path="", use_tools=False)
+        with patch("salesgpt.salesgptapi.SalesGPT.astep", new=AsyncMock(return_value={})), patch(
+            "salesgpt.salesgptapi.SalesGPT.aextract_trip_json", new=AsyncMock()
+        ):
+            with profile_request("chat") as profiler:
+                await api.do(human_input="Hello")
+                await api.get_trip_json()
+        names = [child["name"] for child in profiler.to_dict()["children"]]
+        assert names == ["SalesGPTAPI.do"]
@@ -0,0 +1,89 @@
+from types import SimpleNamespace
+
+import pytest
+
+from salesgpt.sessions import BaseSessionStore, InMemorySessionStore, estimate_session_size
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestInMemorySessionStore:
+    def test_get_and_set(self):
+        store = InMemorySessionStore()
+        store.set("a", "session-a")
+        assert store.get("a") == "session-a"
+        assert store.get("missing") is None
+        assert "a" in store
+        metrics = store.metrics()
+        assert metrics["hits"] == 1 and metrics["misses"] == 1 and metrics["created"] == 1
+
+    def test_lru_eviction(self):
+        store = InMemorySessionStore(max_sessions=2, ttl_seconds=None)
+        store.set("a", 1)
+        store.set("b", 2)
+        store.get("a")  # "b" is now the least recently used session
+        store.set("c", 3)
+        assert "b" not in store
+        assert "a" in store and "c" in store
+        assert store.metrics()["evicted_lru"] == 1
+
+    def test_idle_ttl_eviction(self):
+        clock = FakeClock()
+        store = InMemorySessionStore(ttl_seconds=10, clock=clock)
+        store.set("a", 1)
+        clock.now = 5
+        store.set("b", 2)
+        clock.now = 12
+        assert store.get("a") is None
+        assert store.get("b") == 2
+        assert store.metrics()["evicted_ttl"] == 1
+
+    def test_memory_budget_eviction(self):
+        store = InMemorySessionStore(max_sessions=None, max_bytes=10, sizeof=len)
+        store.set("a", "xxxx")
+        store.set("b", "xxxx")
+        store.set("c", "xxxx")
+        assert "a" not in store
+        assert store.memory_usage() == 8
+        assert store.metrics()["evicted_memory"] == 1
+
+    def test_resetting_session_updates_memory_estimate(self):
+        store = InMemorySessionStore(sizeof=len)
+        history = ["hello"]
+        store.set("a", history)
+        history.append("world")
+        store.set("a", history)
+        assert store.memory_usage() == 2
+        assert store.metrics()["created"] == 1
+
+    def test_delete(self):
+        store = InMemorySessionStore(sizeof=len)
+        store.set("a", "xx")
+        assert store.delete("a") is True
+        assert store.delete("a") is False
+        assert len(store) == 0
+        assert store.memory_usage() == 0
+
+
+def test_incomplete_session_store_cannot_be_instantiated():
+    class GetOnlyStore(BaseSessionStore):
+        def get(self, session_id):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnlyStore()
+
+
+def test_estimate_session_size_counts_overhead_and_history():
+    agent = SimpleNamespace(conversation_history=[], extracted_trip_json_data="Empty JSON")
+    sales_api = SimpleNamespace(sales_agent=agent)
+    empty = estimate_session_size(sales_api, overhead_bytes=1000)
+    assert empty > 1000
+    agent.conversation_history.append("User: " + "x" * 1000 + " <END_OF_TURN>")
+    assert estimate_session_size(sales_api, overhead_bytes=1000) >= empty + 1000
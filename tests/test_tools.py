@@ -1,6 +1,31 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import date, timedelta
+
 import pytest
-from unittest.mock import patch, MagicMock
-from salesgpt.tools import generate_stripe_payment_link, send_email_tool, generate_calendly_invitation_link
+from unittest.mock import patch, MagicMock, AsyncMock
+from salesgpt.tools import (
+    _product_id_cache,
+    _trip_search_cache,
+    afetch_from_endpoint,
+    afetch_trips_batch,
+    build_trip_search_payload,
+    expand_trip_searches,
+    fetch_from_endpoint,
+    fetch_trips_batch,
+    trip_search_key,
+    agenerate_calendly_invitation_link,
+    agenerate_stripe_payment_link,
+    aget_product_id_from_query,
+    asend_email_tool,
+    generate_stripe_payment_link,
+    get_product_id_from_query,
+    load_product_price_mapping,
+    match_product_price_id,
+    send_email_tool,
+    generate_calendly_invitation_link,
+    get_tools,
+)
 import os
 import json
 
@@ -69,4 +94,319 @@ def test_generate_calendly_invitation_link(mock_requests):
     result = generate_calendly_invitation_link("query about a meeting")
 
     assert result == "url: https://mocked_calendly_link.com", "The function should return the URL from the mocked response."
-    mock_requests.assert_called_once()
\ No newline at end of file
+    mock_requests.assert_called_once()
+
+
+@pytest.fixture
+def mock_async_http_client():
+    client = MagicMock()
+    client.post = AsyncMock()
+    with patch("salesgpt.tools.get_async_http_client", return_value=client):
+        yield client
+
+
+@pytest.mark.asyncio
+async def test_agenerate_stripe_payment_link(mock_async_http_client):
+    mock_response = MagicMock()
+    mock_response.text = "https://mocked_payment_link.com"
+    mock_async_http_client.post.return_value = mock_response
+
+    with patch(
+        "salesgpt.tools.aget_product_id_from_query",
+        new_callable=AsyncMock,
+        return_value=json.dumps({"price_id": "price_123"}),
+    ):
+        result = await agenerate_stripe_payment_link("query about a product")
+
+    assert result == "https://mocked_payment_link.com"
+    mock_async_http_client.post.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_agenerate_calendly_invitation_link(mock_async_http_client):
+    mock_response = MagicMock()
+    mock_response.status_code = 201
+    mock_response.json.return_value = {
+        "resource": {"booking_url": "https://mocked_calendly_link.com"}
+    }
+    mock_async_http_client.post.return_value = mock_response
+
+    result = await agenerate_calendly_invitation_link("query about a meeting")
+
+    assert result == "url: https://mocked_calendly_link.com"
+    mock_async_http_client.post.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_asend_email_tool(mock_smtplib):
+    mock_server = MagicMock()
+    mock_smtplib.return_value = mock_server
+    email_details = {
+        "recipient": "test@example.com",
+        "subject": "Test Subject",
+        "body": "Test Body"
+    }
+    with patch(
+        "salesgpt.tools.aget_mail_body_subject_from_query",
+        new_callable=AsyncMock,
+        return_value=json.dumps(email_details),
+    ):
+        result = await asend_email_tool("query about sending an email")
+
+    assert result == "Email sent successfully."
+    mock_server.sendmail.assert_called_once()
+
+
+def test_all_tools_have_async_variants():
+    for tool in get_tools(None):
+        assert tool.coroutine is not None, f"Tool {tool.name} has no async variant."
+
+
+PRODUCT_MAPPING = {
+    "Classic Harmony Spring Mattress": "price_classic",
+    "EcoGreen Hybrid Latex Mattress": "price_eco",
+    "ai-consulting-services": "price_ai",
+}
+
+
+@pytest.fixture
+def product_mapping_path(tmp_path):
+    path = tmp_path / "mapping.json"
+    path.write_text(json.dumps(PRODUCT_MAPPING))
+    _product_id_cache.clear()
+    yield str(path)
+    _product_id_cache.clear()
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("2 x classic harmony spring mattress for John", "price_classic"),
+        ("One EcoGreen Hybrd Latex Matress please", "price_eco"),
+        ("AI consulting services for ACME", "price_ai"),
+        ("Classic Harmony Spring Mattress and EcoGreen Hybrid Latex Mattress", None),
+        ("the softest mattress you have", None),
+    ],
+)
+def test_match_product_price_id(query, expected):
+    assert match_product_price_id(query, PRODUCT_MAPPING) == expected
+
+
+def test_get_product_id_skips_llm_for_known_products(product_mapping_path):
+    with patch("salesgpt.tools.complete_prompt") as llm:
+        result = get_product_id_from_query("Classic Harmony Spring Mattress, 1 unit", product_mapping_path)
+    assert json.loads(result) == {"price_id": "price_classic"}
+    llm.assert_not_called()
+
+
+def test_get_product_id_caches_llm_decisions(product_mapping_path):
+    with patch("salesgpt.tools.complete_prompt", return_value='{"price_id": "price_eco"}') as llm:
+        first = get_product_id_from_query("Something  green to sleep on", product_mapping_path)
+        second = get_product_id_from_query("something green to sleep on!", product_mapping_path)
+    assert first == second == '{"price_id": "price_eco"}'
+    assert llm.call_count == 1
+
+
+@pytest.mark.parametrize(
+    "answer", ['{"price_id": "No relevant product id found"}', '{"price_id": "price_unknown"}', "price_eco"]
+)
+def test_get_product_id_does_not_cache_invalid_answers(product_mapping_path, answer):
+    with patch("salesgpt.tools.complete_prompt", return_value=answer) as llm:
+        get_product_id_from_query("something to sleep on", product_mapping_path)
+        get_product_id_from_query("something to sleep on", product_mapping_path)
+    assert llm.call_count == 2
+
+
+def test_product_mapping_reloads_on_change(product_mapping_path):
+    mapping, digest = load_product_price_mapping(product_mapping_path)
+    assert load_product_price_mapping(product_mapping_path)[0] is mapping
+
+    with open(product_mapping_path, "w") as f:
+        json.dump({"Plush Serenity Bamboo Mattress": "price_plush"}, f)
+    stat = os.stat(product_mapping_path)
+    os.utime(product_mapping_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    with patch("salesgpt.tools.complete_prompt", return_value='{"price_id": "price_plush"}') as llm:
+        get_product_id_from_query("something green", product_mapping_path)
+        new_mapping, new_digest = load_product_price_mapping(product_mapping_path)
+        get_product_id_from_query("something green", product_mapping_path)
+    assert new_mapping == {"Plush Serenity Bamboo Mattress": "price_plush"}
+    assert new_digest != digest
+    assert llm.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_aget_product_id_uses_cache(product_mapping_path):
+    with patch("salesgpt.tools.acomplete_prompt", new_callable=AsyncMock, return_value='{"price_id": "price_ai"}') as llm:
+        await aget_product_id_from_query("a quiet one", product_mapping_path)
+        assert get_product_id_from_query("A quiet one", product_mapping_path) == '{"price_id": "price_ai"}'
+        result = await aget_product_id_from_query("EcoGreen Hybrid Latex Mattress", product_mapping_path)
+    assert json.loads(result) == {"price_id": "price_eco"}
+    llm.assert_awaited_once()
+
+
+TRIP_INFO = {
+    "departureDate": "2026-11-03",
+    "departureTime": "",
+    "origin": "Rafina",
+    "destination": "Andros",
+    "passengers": 2,
+    "vehicles": 1,
+    "pets": 0,
+}
+
+
+@pytest.fixture
+def trip_search_cache():
+    _trip_search_cache.clear()
+    yield _trip_search_cache
+    _trip_search_cache.clear()
+
+
+def test_trip_search_key():
+    assert trip_search_key(TRIP_INFO) == ("RAF", "AND", "2026-11-03", "", 2, 1, 0)
+    payload = json.loads(build_trip_search_payload(TRIP_INFO))[0]
+    assert payload["quoteRequest"] == {"passengers": 2, "vehicles": 1, "pets": 0}
+
+
+def _trips_response(status_code=200, body=b'{"tripsWithDictionary": []}'):
+    response = MagicMock(status_code=status_code)
+    response.__enter__.return_value = response
+    response.iter_content.return_value = [body[:10], body[10:]]
+    return response
+
+
+def _async_trips_stream(body=b'{"tripsWithDictionary": []}', calls=None):
+    @asynccontextmanager
+    async def stream(*args, **kwargs):
+        if calls is not None:
+            calls.append(1)
+        await asyncio.sleep(0.01)
+
+        async def aiter_bytes(chunk_size=None):
+            yield body
+
+        yield MagicMock(status_code=200, aiter_bytes=aiter_bytes)
+
+    return stream
+
+
+def test_fetch_from_endpoint_caches_results(trip_search_cache, mock_requests_post):
+    mock_requests_post.return_value = _trips_response()
+    with patch("salesgpt.tools.extract_trip_info_from_query", return_value=TRIP_INFO):
+        first = fetch_from_endpoint("2 people, 1 car, Rafina to Andros on 2026-11-03")
+        second = fetch_from_endpoint("Rafina -> Andros, 2026-11-03, two adults and a car")
+    assert first == second == "No trips found for the given query."
+    mock_requests_post.assert_called_once()
+    assert mock_requests_post.call_args.kwargs["stream"] is True
+
+
+def test_fetch_from_endpoint_does_not_cache_errors(trip_search_cache, mock_requests_post):
+    mock_requests_post.return_value = _trips_response(status_code=503)
+    with patch("salesgpt.tools.extract_trip_info_from_query", return_value=TRIP_INFO):
+        assert fetch_from_endpoint("query") == "Failed to fetch trips due to a network error."
+        fetch_from_endpoint("query")
+    assert mock_requests_post.call_count == 2
+
+
+def test_fetch_from_endpoint_reports_invalid_json(trip_search_cache, mock_requests_post):
+    mock_requests_post.return_value = _trips_response(body=b'{"tripsWithDictionary": [')
+    with patch("salesgpt.tools.extract_trip_info_from_query", return_value=TRIP_INFO):
+        assert fetch_from_endpoint("query") == "Failed to parse response from the endpoint."
+
+
+@pytest.mark.asyncio
+async def test_afetch_from_endpoint_coalesces_identical_searches(trip_search_cache, mock_async_http_client):
+    calls = []
+    mock_async_http_client.stream = _async_trips_stream(calls=calls)
+    with patch("salesgpt.tools.aextract_trip_info_from_query", new_callable=AsyncMock, return_value=TRIP_INFO):
+        results = await asyncio.gather(*[afetch_from_endpoint("query") for _ in range(3)])
+    assert results == ["No trips found for the given query."] * 3
+    assert len(calls) == 1
+
+
+def test_fetch_from_endpoint_reports_unknown_ports(trip_search_cache, mock_requests_post):
+    trip_info = dict(TRIP_INFO, destination="Atlantis")
+    with patch("salesgpt.tools.extract_trip_info_from_query", return_value=trip_info):
+        result = fetch_from_endpoint("Rafina to Atlantis")
+    assert result.startswith("Unknown port 'Atlantis'.")
+    mock_requests_post.assert_not_called()
+
+
+def test_expand_trip_searches():
+    searches = [{"origin": "Rafina", "destination": ["Andros", "Santorini"], "departureDate": ["2026-11-03", "2026-11-04"], "passengers": 2}]
+    trip_infos = expand_trip_searches(searches)
+    assert [(t["destination"], t["departureDate"]) for t in trip_infos] == [
+        ("Andros", "2026-11-03"),
+        ("Andros", "2026-11-04"),
+        ("Santorini", "2026-11-03"),
+        ("Santorini", "2026-11-04"),
+    ]
+    assert all(t["passengers"] == 2 for t in trip_infos)
+
+
+def _trips_body(departure, price):
+    trip = {
+        "departureDateTime": departure,
+        "origin": {"idOrCode": "RAF"},
+        "destination": {"idOrCode": "AND"},
+        "vessel": {"idOrCode": "CJ2", "company": {"abbreviation": "SJ"}},
+        "basicPrice": price,
+    }
+    return json.dumps({"tripsWithDictionary": [{"trips": [trip]}]}).encode("utf-8")
+
+
+def test_fetch_trips_batch_ranks_all_searches_by_price(trip_search_cache, mock_requests_post):
+    bodies = {"2026-11-03": _trips_body("2026-11-03T07:30:00", 5200), "2026-11-04": _trips_body("2026-11-04T07:30:00", 3900)}
+
+    def request(method, url, data=None, **kwargs):
+        departure_date = json.loads(data)[0]["departureDate"]
+        if departure_date not in bodies:
+            return _trips_response(status_code=503)
+        return _trips_response(body=bodies[departure_date])
+
+    mock_requests_post.side_effect = request
+    query = json.dumps({"origin": "Rafina", "destination": "Andros", "departureDate": ["2026-11-03", "2026-11-04", "2026-11-05", "2026-11-03"]})
+    with patch("salesgpt.tools.complete_prompt") as mock_complete:
+        result = fetch_trips_batch(query)
+    mock_complete.assert_not_called()
+    lines = result.splitlines()
+    assert lines[:3] == [
+        "Rafina -> Andros 2026-11-03: 1 trips",
+        "Rafina -> Andros 2026-11-04: 1 trips",
+        "Rafina -> Andros 2026-11-05: Failed to fetch trips due to a network error.",
+    ]
+    assert [line.split("|")[4] for line in lines[5:]] == ["2026-11-04 07:30", "2026-11-03 07:30"]
+    assert mock_requests_post.call_count == 3
+
+
+def test_fetch_trips_batch_reports_unknown_ports(trip_search_cache, mock_requests_post):
+    result = fetch_trips_batch('{"origin": "Rafina", "destination": "Atlantis"}')
+    assert result.startswith("Unknown port 'Atlantis'.")
+    mock_requests_post.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_afetch_trips_batch_runs_searches_concurrently(trip_search_cache, mock_async_http_client):
+    in_flight, peak = [0], [0]
+
+    @asynccontextmanager
+    async def stream(*args, **kwargs):
+        in_flight[0] += 1
+        peak[0] = max(peak[0], in_flight[0])
+        await asyncio.sleep(0.01)
+        in_flight[0] -= 1
+
+        async def aiter_bytes(chunk_size=None):
+            yield b'{"tripsWithDictionary": []}'
+
+        yield MagicMock(status_code=200, aiter_bytes=aiter_bytes)
+
+    mock_async_http_client.stream = stream
+    departures = [(date.today() + timedelta(days=days)).isoformat() for days in range(1, 7)]
+    query = "\n".join(f"Rafina to Santorini on {departure}" for departure in departures)
+    with patch("salesgpt.tools.TRIP_SEARCH_CONCURRENCY", 2), patch("salesgpt.tools.acomplete_prompt") as mock_complete:
+        result = await afetch_trips_batch(query)
+    mock_complete.assert_not_called()
+    assert result.splitlines() == [f"Rafina -> Santorini {departure}: no trips found" for departure in departures]
+    assert peak[0] == 2
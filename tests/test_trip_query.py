@@ -0,0 +1,82 @@
+import json
+import os
+from datetime import date, timedelta
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from salesgpt.tools import aextract_trip_info_from_query, extract_trip_info_from_query
+from salesgpt.trip_query import benchmark, parse_trip_query
+
+TODAY = date(2026, 10, 18)  # a Sunday
+
+
+def _recorded_queries():
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_data")
+    with open(os.path.join(data_dir, "trip_queries.json"), encoding="utf-8") as f:
+        recorded = json.load(f)
+    return recorded["queries"], date.fromisoformat(recorded["today"])
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("Rafina to Andros tomorrow", {"departureDate": "2026-10-19"}),
+        ("Rafina to Andros on Sunday", {"departureDate": "2026-10-25"}),
+        ("Rafina to Andros on 3rd of January", {"departureDate": "2027-01-03"}),
+        ("Rafina to Andros at 9:15 pm", {"departureTime": "21:15"}),
+        ("Andros -> Rafina, 2 adults without a car", {"origin": "Andros", "passengers": 2, "vehicles": 0}),
+        ("to Andros with my dog and our car", {"origin": "Rafina", "pets": 1, "vehicles": 1}),
+    ],
+)
+def test_parse_trip_query(query, expected):
+    result = parse_trip_query(query, TODAY)
+    assert result is not None
+    assert {key: result[key] for key in expected} == expected
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "Rafina to Andros on 2026-02-30",
+        "Rafina to Andros on 2025-01-01",
+        "Rafina to Andros at 9:00 or 17:00",
+        "Andros to Andros tomorrow",
+        "from Andros tomorrow",
+        "ferry tomorrow for 2",
+        "Rafina to Andros, our group",
+        "Rafina to Andros in May, 2 adults",
+        "Rafina to Andros on the 5th",
+        "Rafina to Andros in 2 weeks",
+        "Rafina to Andros tomorrow, return on Sunday",
+        "Rafina to Andros tomorrow and back",
+        "Rafina to Andros tomorrow around 9",
+        "Rafina to Andros tomorrow late afternoon",
+    ],
+)
+def test_parse_trip_query_defers_ambiguous_queries(query):
+    assert parse_trip_query(query, TODAY) is None
+
+
+def test_benchmark_on_recorded_queries():
+    queries, today = _recorded_queries()
+    result = benchmark(queries, today)
+    assert result["wrong"] == 0
+    assert result["hit_rate"] >= 0.5
+
+
+def test_extract_trip_info_skips_llm_when_parsed():
+    with patch("salesgpt.tools.complete_prompt") as llm:
+        departure = (date.today() + timedelta(days=7)).isoformat()
+        trip_info = extract_trip_info_from_query(f"Rafina to Andros on {departure}, 2 people, 1 car")
+    llm.assert_not_called()
+    assert trip_info["passengers"] == 2 and trip_info["vehicles"] == 1
+
+
+@pytest.mark.asyncio
+async def test_aextract_trip_info_falls_back_to_llm():
+    llm_result = json.dumps({"origin": "Rafina", "destination": "Tinos"})
+    with patch("salesgpt.tools.acomplete_prompt", new_callable=AsyncMock, return_value=llm_result) as llm:
+        trip_info = await aextract_trip_info_from_query("Rafina to Tinos next weekend")
+    llm.assert_awaited_once()
+    assert trip_info["destination"] == "Tinos"
@@ -0,0 +1,91 @@
+import json
+from contextlib import nullcontext
+from unittest.mock import patch
+
+import pytest
+
+from salesgpt.tools import format_trips_response
+from salesgpt.trips import merge_trips, parse_trips, render_trips, trips_from_response_data
+
+
+def _trip(departure, price, vessel="CJ2", company="SJ", origin="RAF", destination="AND"):
+    return {
+        "departureDateTime": departure,
+        "arrivalDateTime": departure.replace("T07", "T09").replace("T18", "T20"),
+        "origin": {"idOrCode": origin},
+        "destination": {"idOrCode": destination},
+        "vessel": {"idOrCode": vessel, "company": {"abbreviation": company}},
+        "basicPrice": price,
+        "availability": {"passengers": 300, "vehicles": 40},
+    }
+
+
+# Dictionaries after the trips, as they may arrive in the stream.
+RESPONSE = {
+    "tripsWithDictionary": [
+        {
+            "trips": [
+                _trip("2026-11-03T18:00:00", 4550),
+                _trip("2026-11-03T07:30:00", 5200, vessel="SUP", company="GF"),
+            ],
+            "companies": {
+                "SJ": {"name": "Seajets", "vessels": {"CJ2": {"name": "Champion Jet 2"}}},
+                "GF": {"name": "Golden Star Ferries", "vessels": {"SUP": {"name": "Superferry"}}},
+            },
+            "locations": {"RAF": {"name": "Rafina"}, "AND": {"name": "Andros"}},
+        },
+        {"trips": [_trip("2026-11-03T12:00:00", None, vessel="X", company="ZZ")]},
+    ]
+}
+BODY = json.dumps(RESPONSE).encode("utf-8")
+
+
+def _chunks(body, size=7):
+    return [body[i : i + size] for i in range(0, len(body), size)]
+
+
+@pytest.mark.parametrize("streaming", [True, False])
+def test_parse_trips_from_chunks(streaming):
+    with nullcontext() if streaming else patch("salesgpt.trips.ijson", None):
+        result = parse_trips(_chunks(BODY))
+    assert result.found
+    assert [(t.company, t.vessel, t.origin, t.destination, t.price) for t in result.trips] == [
+        ("Seajets", "Champion Jet 2", "Rafina", "Andros", 4550),
+        ("Golden Star Ferries", "Superferry", "Rafina", "Andros", 5200),
+        ("ZZ", "X", "RAF", "AND", None),
+    ]
+
+
+@pytest.mark.parametrize("streaming", [True, False])
+def test_parse_trips_rejects_invalid_json(streaming):
+    with nullcontext() if streaming else patch("salesgpt.trips.ijson", None):
+        with pytest.raises(ValueError):
+            parse_trips([b'{"tripsWithDictionary": [{"trips": '])
+
+
+def test_render_is_compact_and_sorted_by_departure():
+    observation = render_trips(trips_from_response_data(RESPONSE), max_trips=2)
+    assert observation.splitlines() == [
+        "3 trips, the 2 earliest:",
+        "Company|Ferry|From|To|Departure|Arrival|Price",
+        "Golden Star Ferries|Superferry|Rafina|Andros|2026-11-03 07:30|2026-11-03 09:30|52.00€",
+        "ZZ|X|RAF|AND|2026-11-03 12:00|2026-11-03 12:00|N/A",
+    ]
+    assert len(observation) < len(json.dumps(RESPONSE, indent=2)) / 4
+
+
+def test_merged_trips_ranked_by_price():
+    other_day = {"tripsWithDictionary": [dict(RESPONSE["tripsWithDictionary"][0], trips=[_trip("2026-11-04T07:00:00", 3900)])]}
+    merged = merge_trips([trips_from_response_data(RESPONSE), trips_from_response_data(other_day)])
+    observation = render_trips(merged, max_trips=3, order="price")
+    assert observation.splitlines()[0] == "4 trips, the 3 cheapest:"
+    assert [line.split("|")[-1] for line in observation.splitlines()[2:]] == ["39.00€", "45.50€", "52.00€"]
+
+
+def test_empty_responses_keep_their_messages():
+    assert format_trips_response({}) == "No trips found for the given query."
+    assert format_trips_response({"tripsWithDictionary": []}) == "No trips found for the given query."
+    assert json.loads(format_trips_response({"tripsWithDictionary": [{"trips": []}]})) == {
+        "error": "No trips available for the selected criteria."
+    }
+    assert not parse_trips([b'{"tripsWithDictionary": []}']).found